@@ -4,21 +4,12 @@ import os
 import random
 
 
-def updater(loc, candidate):
-    """Modify the parameters in *loc* to match *candidate*"""
-    import os
-
-    ffloc = os.path.join(loc, 'force_field_mixing_rules.def')
-    with open(ffloc, 'r') as fh:
-        original = fh.readlines()
-    with open(ffloc, 'w') as fh:
-        for line in original:
-            if not line.startswith('Ar'):
-                fh.write(line)
-            else:
-                fh.write('Ar  lennard-jones {sig} {eps}\n'
-                         ''.format(sig=candidate[0],
-                                   eps=candidate[1]))
+# put the two values of each candidate into the argon parameters
+FF_MAPPING = [
+    {'file': 'force_field_mixing_rules.def',
+     'pattern': r'Ar\s',
+     'fields': [[2, 0], [3, 1]]},
+]
 
 
 PRESSURES = [val * 100000. for val in (1, 3, 5, 10, 20, 30)]
@@ -54,7 +45,7 @@ if __name__ == '__main__':
         template='input',
         initial_pop=generate_initial(POPSIZE, BOUNDS),
         conditions=CONDITIONS,
-        ff_updater=updater,
+        ff_updater=FF_MAPPING,
         bounds=BOUNDS,
         wf_name='GAargon',
     )
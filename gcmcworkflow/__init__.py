@@ -11,6 +11,9 @@ from . import fw_utils
 from . import utils
 from . import analysis
 from . import formats
+from . import template_store
+from . import population_store
+from . import instrument
 
 from . import hyd
 
@@ -27,6 +30,7 @@ from . import grids
 from . import workflow_creator
 from .workflow_creator import make_workflow
 
+from . import forcefield
 from . import genetics
 from . import make_genetics
 
@@ -46,15 +46,22 @@ SimFirework layout::
                      to IsothermCreate
 
 """
+from contextlib import ExitStack, contextmanager
 import fireworks as fw
 from fireworks.utilities.fw_utilities import explicit_serialize as xs
+import glob
 import hashlib
+import json
 import numpy as np
 import pandas as pd
 import os
 import shutil
+import socket
 import subprocess
 import tarfile
+import tempfile
+import time
+import zipfile
 try:
     import datreant as dtr
 except:
@@ -67,6 +74,8 @@ from . import formats
 from . import raspatools
 from . import utils
 from . import analysis
+from . import template_store
+from .instrument import instrumented, phase
 
 
 @xs
@@ -78,6 +87,13 @@ class InitTemplate(fw.FiretaskBase):
 
     Takes:
      - dictionary of files - "contents"
+       or list of packed files from utils.slurp_tree
+     or
+     - hash of the template and where it is stored - "template_hash" and
+       "template_store"
+    Optionally:
+     - "updaters" from utils.register_updater, which are written
+       alongside the template
 
     Does:
      - writes the template to the local work machine
@@ -86,16 +102,29 @@ class InitTemplate(fw.FiretaskBase):
        - tags this Treant as the template
      - adds path of template Treant to future Firework specs
     """
-    optional_params = ['contents', 'workdir']
+    optional_params = ['contents', 'workdir', 'template_hash',
+                       'template_store', 'updaters']
 
+    @instrumented
     def run_task(self, fw_spec):
         if self.get('workdir', ''):
             os.makedirs(self.get('workdir'), exist_ok=True)
 
-        if self.get('contents', None) is not None:
+        if self.get('template_hash', None) is not None:
+            contents = template_store.fetch_template(self['template_store'],
+                                                     self['template_hash'])
+        else:
+            contents = self.get('contents', None)
+
+        if contents is not None:
             # where the template can be found
-            target = utils.dump_directory(
-                os.path.join(self.get('workdir', ''), 'template'), self['contents'])
+            target = template_store.write_template(
+                os.path.join(self.get('workdir', ''), 'template'), contents)
+            if self.get('updaters', None):
+                store = template_store.FileStore(
+                    utils.template_updaters(target))
+                for updater in self['updaters'].values():
+                    store.put(updater)
 
             return fw.FWAction(
                 update_spec={
@@ -142,6 +171,7 @@ class CreatePassport(fw.FiretaskBase):
 
         return tarname
 
+    @instrumented
     def run_task(self, fw_spec):
         tarpath = self.write_tarball(fw_spec['template'].rstrip(os.path.sep),
                                      self.get('workdir', ''))
@@ -172,6 +202,9 @@ class CopyTemplate(fw.FiretaskBase):
      - creates new directory containing the Template
      - modifies the input files to this specification
 
+    If "template_cache" is in the spec, the template is first copied to
+    this node-local directory (once per node) and copied from there.
+
     Provides: simtree - path to the customised version of the template
     """
     required_params = ['temperature', 'pressure', 'ncycles']
@@ -225,6 +258,81 @@ class CopyTemplate(fw.FiretaskBase):
 
         return newdir
 
+    @staticmethod
+    @contextmanager
+    def cached_template(fw_spec, simhash):
+        """Find the copy of the template on this node, making it if needed
+
+        The copy won't be evicted from the cache until this is exited
+
+        Parameters
+        ----------
+        fw_spec : dict
+          spec of this Firework, contains the template_cache settings
+        simhash : str
+          7 digit hash of the simulation, used as key in the cache.  If
+          empty, as in GA Workflows, the "template_hash" in the spec is
+          used, or failing that a hash of the template's path
+
+        Yields
+        ------
+        path : str
+          path to the node-local copy of the template
+        """
+        if simhash:
+            key = simhash
+        elif fw_spec.get('template_hash', None):
+            key = fw_spec['template_hash']
+        else:
+            key = hashlib.sha1(
+                fw_spec['template'].encode('utf8')).hexdigest()[:7]
+        cache = template_store.TemplateCache(
+            fw_spec['template_cache'],
+            max_size=fw_spec.get('template_cache_size', None),
+        )
+
+        def populate(target):
+            if os.path.isdir(fw_spec['template']):
+                shutil.copytree(fw_spec['template'], target)
+            else:
+                # template isn't visible from this node, so go to the store
+                template_store.write_template(
+                    target,
+                    template_store.fetch_template(fw_spec['template_store'],
+                                                  fw_spec['template_hash']),
+                )
+
+        with cache.checkout(key, populate) as target:
+            yield target
+
+    @classmethod
+    @contextmanager
+    def source_template(cls, fw_spec, simhash):
+        """Template to copy simulations from on this node
+
+        Either the node-local copy, if "template_cache" is set, or the
+        "template" in the spec.  Copies must be made before this exits.
+
+        Parameters
+        ----------
+        fw_spec : dict
+          spec of this Firework
+        simhash : str
+          7 digit hash of the simulation
+
+        Yields
+        ------
+        path : str
+        """
+        with ExitStack() as stack:
+            if fw_spec.get('template_cache', None) is not None:
+                with phase('cache'):
+                    template = stack.enter_context(
+                        cls.cached_template(fw_spec, simhash))
+            else:
+                template = fw_spec['template']
+            yield template
+
     @staticmethod
     def set_as_restart(fmt, old, new):
         if fmt == 'raspa':
@@ -235,6 +343,7 @@ class CopyTemplate(fw.FiretaskBase):
         else:
             raise NotImplementedError
 
+    @instrumented
     def run_task(self, fw_spec):
         fmt = formats.detect_format(fw_spec['template'])
 
@@ -244,31 +353,35 @@ class CopyTemplate(fw.FiretaskBase):
         else:
             simhash = fw_spec['simhash']
 
-        sim_t = self.copy_template(
-            workdir=self.get('workdir', ''),
-            simhash=simhash,
-            template=fw_spec['template'],
-            P=self['pressure'],
-            T=self['temperature'],
-            p_id=self.get('parallel_id', 0),
-        )
+        with self.source_template(fw_spec, simhash) as template:
+            with phase('copy'):
+                sim_t = self.copy_template(
+                    workdir=self.get('workdir', ''),
+                    simhash=simhash,
+                    template=template,
+                    P=self['pressure'],
+                    T=self['temperature'],
+                    p_id=self.get('parallel_id', 0),
+                )
 
         # Modify input to match the spec
-        self.update_input(
-            target=sim_t,
-            fmt=fmt,
-            T=self['temperature'],
-            P=self['pressure'],
-            n=self['ncycles'],
-            use_grid=self.get('use_grid', False),
-        )
+        with phase('update_input'):
+            self.update_input(
+                target=sim_t,
+                fmt=fmt,
+                T=self['temperature'],
+                P=self['pressure'],
+                n=self['ncycles'],
+                use_grid=self.get('use_grid', False),
+            )
 
         if is_restart:
-            self.set_as_restart(
-                fmt,
-                old=self['previous_simdir'],
-                new=sim_t,
-            )
+            with phase('restart'):
+                self.set_as_restart(
+                    fmt,
+                    old=self['previous_simdir'],
+                    new=sim_t,
+                )
 
         return fw.FWAction(
             update_spec={
@@ -280,16 +393,86 @@ class CopyTemplate(fw.FiretaskBase):
 
 @xs
 class RunSimulation(fw.FiretaskBase):
-    """Take a simulation directory and run it"""
+    """Take a simulation directory and run it
+
+    If "scratch" is in the spec, the simulation is copied to this
+    node-local directory and run there.  Once finished, files matching
+    "stage_patterns" (defaults to DEFAULT_STAGE_PATTERNS) are copied
+    back to the simulation directory and the scratch copy is removed.
+
+    If "allow_fail" is set, a failed simulation doesn't stop the
+    Firework, so that a following PostProcess can restart it.
+
+    Provides: run_stats - wall and CPU seconds of the simulation, the
+    host it ran on and the error if it failed
+    """
+    optional_params = ['allow_fail']
     bin_name = {
         'raspa': 'simulate simulation.input',
     }
+    # files needed by PostProcess and any restart
+    DEFAULT_STAGE_PATTERNS = ['Output', 'Restart', '*.csv']
 
-    def run_task(self, fw_spec):
-        fmt = formats.detect_format(fw_spec['simtree'])
+    @staticmethod
+    def stage_in(simtree, scratch):
+        """Copy simulation into scratch space
+
+        Parameters
+        ----------
+        simtree : str
+          path to the simulation
+        scratch : str
+          node-local directory, environment variables are expanded
+
+        Returns
+        -------
+        rundir : str
+          path to the copy of the simulation to run
+        """
+        scratch = os.path.expanduser(os.path.expandvars(scratch))
+        os.makedirs(scratch, exist_ok=True)
+        # unique per run, in case the same simulation is rerun on this node
+        rundir = tempfile.mkdtemp(
+            prefix=os.path.basename(simtree.rstrip(os.path.sep)) + '_',
+            dir=scratch)
+        os.rmdir(rundir)
+        shutil.copytree(simtree, rundir)
+
+        return rundir
+
+    @staticmethod
+    def stage_out(rundir, simtree, patterns):
+        """Copy results from scratch back to the simulation directory
+
+        Parameters
+        ----------
+        rundir : str
+          where the simulation was run
+        simtree : str
+          original simulation directory
+        patterns : list of str
+          glob patterns relative to *rundir* of files and directories
+          to copy back, stdout and stderr are always copied
+        """
+        matches = set()
+        for pattern in list(patterns) + ['stdout', 'stderr']:
+            matches.update(glob.glob(os.path.join(rundir, pattern)))
+
+        for src in sorted(matches):
+            dst = os.path.join(simtree, os.path.relpath(src, rundir))
+            if os.path.isdir(src):
+                if os.path.exists(dst):
+                    shutil.rmtree(dst)
+                shutil.copytree(src, dst)
+            else:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(src, dst)
+
+    def run_simulation(self, rundir):
+        fmt = formats.detect_format(rundir)
 
         old_dir = os.getcwd()
-        os.chdir(fw_spec['simtree'])
+        os.chdir(rundir)
 
         cmd = self.bin_name[fmt]
         try:
@@ -315,6 +498,78 @@ class RunSimulation(fw.FiretaskBase):
         finally:
             os.chdir(old_dir)
 
+    def timed_simulation(self, rundir):
+        """Run simulation, measuring how long it took
+
+        Returns
+        -------
+        run_stats : dict
+          'walltime' and 'cputime' in seconds, 'host' and 'error'
+        """
+        start_wall = time.time()
+        start = os.times()
+        error = None
+        try:
+            with phase('simulate'):
+                self.run_simulation(rundir)
+        except ValueError as e:
+            if not self.get('allow_fail', False):
+                raise
+            error = str(e)
+        end = os.times()
+
+        return {
+            'walltime': time.time() - start_wall,
+            # simulation runs as a child process
+            'cputime': ((end.children_user + end.children_system) -
+                        (start.children_user + start.children_system)),
+            'host': socket.gethostname(),
+            'error': error,
+        }
+
+    def run(self, simtree, scratch=None, stage_patterns=None):
+        """Run the simulation at *simtree*, in *scratch* if given
+
+        Parameters
+        ----------
+        simtree : str
+          path to the simulation
+        scratch : str, optional
+          node-local directory to run in
+        stage_patterns : list of str, optional
+          files to copy back from scratch, defaults to
+          DEFAULT_STAGE_PATTERNS
+
+        Returns
+        -------
+        run_stats : dict
+          as per timed_simulation
+        """
+        if scratch is None:
+            return self.timed_simulation(simtree)
+        if stage_patterns is None:
+            stage_patterns = self.DEFAULT_STAGE_PATTERNS
+
+        with phase('stage_in'):
+            rundir = self.stage_in(simtree, scratch)
+        try:
+            return self.timed_simulation(rundir)
+        finally:
+            # stage back even on failure, so partial output can be
+            # checked
+            with phase('stage_out'):
+                self.stage_out(rundir, simtree, stage_patterns)
+                shutil.rmtree(rundir, ignore_errors=True)
+
+    @instrumented
+    def run_task(self, fw_spec):
+        run_stats = self.run(fw_spec['simtree'],
+                             scratch=fw_spec.get('scratch', None),
+                             stage_patterns=fw_spec.get('stage_patterns',
+                                                        None))
+
+        return fw.FWAction(update_spec={'run_stats': run_stats})
+
 
 @xs
 class PostProcess(fw.FiretaskBase):
@@ -325,6 +580,8 @@ class PostProcess(fw.FiretaskBase):
     Does:
      - checks simulation finished correctly (ie output was written ok)
      - creates results file for this simulation
+     - records how many cycles were run, how long this took and where,
+       these are passed to Analyse as "throughput"
     """
     required_params = ['temperature', 'pressure', 'parallel_id',
                        'workdir']
@@ -387,7 +644,7 @@ class PostProcess(fw.FiretaskBase):
                                       "".format(fmt))
 
     def prepare_restart(self, template, previous_simdir,
-                        current_result, wfname):
+                        current_result, wfname, fused=False):
         """Prepare a continuation of the same sampling point
 
         Parameters
@@ -400,11 +657,14 @@ class PostProcess(fw.FiretaskBase):
           results gathered so far
         wfname : str
           unique name of Workflow
+        fused : bool, optional
+          make a single Firework rather than three
 
         Returns
         -------
         new_fws : list of fw
-          contains Copy, Run and Analyse Fireworks
+          contains Copy, Run and Analyse Fireworks, or a single Firework
+          doing all three
         """
         # make run FW
         ncycles_left = self.calc_remainder(previous_simdir)
@@ -413,9 +673,9 @@ class PostProcess(fw.FiretaskBase):
         P = self['pressure']
         i = self['parallel_id']
 
-        from .workflow_creator import make_runstage
+        from .workflow_creator import make_runstage, make_fused_runstage
 
-        copy_fw, run_fw, analyse_fw = make_runstage(
+        settings = dict(
             parent_fw=None,
             temperature=self['temperature'],
             pressure=self['pressure'],
@@ -428,43 +688,93 @@ class PostProcess(fw.FiretaskBase):
             previous_result=current_result.to_csv(),
             use_grid=self.get('use_grid', False),
         )
+        if fused:
+            return [make_fused_runstage(**settings)]
+        else:
+            return list(make_runstage(**settings))
 
-        return [copy_fw, run_fw, analyse_fw]
+    @staticmethod
+    def throughput(results, run_stats):
+        """Performance of a single simulation
 
+        Parameters
+        ----------
+        results : pd.Series
+          timeseries from this simulation only, indexed by cycle
+        run_stats : dict or None
+          as provided by RunSimulation
+
+        Returns
+        -------
+        throughput : dict
+          'cycles' completed, 'walltime', 'cputime' and 'host'
+        """
+        run_stats = run_stats or {}
+
+        return {
+            'cycles': int(results.index.max()),
+            'walltime': run_stats.get('walltime', None),
+            'cputime': run_stats.get('cputime', None),
+            'host': run_stats.get('host', None),
+        }
+
+    @instrumented
     def run_task(self, fw_spec):
         simtree = fw_spec['simtree']
         fmt = formats.detect_format(simtree)
 
         # check exit
         # will raise Error if simulation didn't finish
-        finished = self.check_exit(fmt, simtree)
+        with phase('check_exit'):
+            finished = self.check_exit(fmt, simtree)
 
         # parse results
-        results = self.parse_results(fmt, simtree)
-        # save csv of results from *this* simulation
-        utils.save_csv(results, os.path.join(simtree, 'this_sim_results.csv'))
-
-        if self.get('previous_result', None) is not None:
-            results = self.prepend_previous(self['previous_result'], results)
-        # csv of results from all generations of this simulation
-        utils.save_csv(results, os.path.join(simtree, 'total_results.csv'))
+        with phase('parse'):
+            results = self.parse_results(fmt, simtree)
+        throughput = self.throughput(results, fw_spec.get('run_stats', None))
+        with phase('save'):
+            # save csv of results from *this* simulation
+            utils.save_csv(results,
+                           os.path.join(simtree, 'this_sim_results.csv'))
+
+            if self.get('previous_result', None) is not None:
+                results = self.prepend_previous(self['previous_result'],
+                                                results)
+            # csv of results from all generations of this simulation
+            utils.save_csv(results,
+                           os.path.join(simtree, 'total_results.csv'))
 
         if not finished:
+            from .workflow_creator import (base_priority, inherit_options,
+                                           set_priority, PRIORITY_RESTART)
+
             new_fws = self.prepare_restart(
                 template=fw_spec['template'],
                 previous_simdir=simtree,
                 current_result=results,
                 wfname=fw_spec['_category'],
+                fused=fw_spec.get('fused_runs', False),
             )
+            inherit_options(fw_spec, new_fws)
+            # finishing this point sooner lets the Analyse run
+            set_priority(new_fws, base_priority(fw_spec), PRIORITY_RESTART)
 
             return fw.FWAction(
-                detours=fw.Workflow(new_fws)
+                stored_data={'throughput': throughput},
+                detours=fw.Workflow(new_fws),
+                # the Analyse waiting on the restart still gets this
+                mod_spec=[{
+                    '_push': {'throughput': throughput}
+                }],
             )
         else:
             parallel_id = self['parallel_id']
 
             return fw.FWAction(
-                stored_data={'result': results.to_csv()},
+                stored_data={
+                    'result': results.to_csv(),
+                    'throughput': throughput,
+                },
                 update_spec={
                     'template': fw_spec['template'],
                 },
@@ -472,6 +782,7 @@ class PostProcess(fw.FiretaskBase):
                     '_push': {
                         'results': (parallel_id, results.to_csv()),
                         'simpaths': (parallel_id, simtree),
+                        'throughput': throughput,
                     }
                 }]
             )
@@ -496,7 +807,7 @@ class Analyse(fw.FiretaskBase):
     optional_params = ['use_grid']
 
     def prepare_resample(self, previous_simdirs, previous_results, ncycles,
-                         wfname, template):
+                         wfname, template, throughput=None, fused=False):
         """Prepare a new sampling stage
 
         Parameters
@@ -509,6 +820,10 @@ class Analyse(fw.FiretaskBase):
           unique name for this Workflow
         template : str
           path to sim template
+        throughput : list of dict, optional
+          performance of simulations so far, carried to the next Analyse
+        fused : bool, optional
+          use a single Firework for each run
 
         Returns
         -------
@@ -536,10 +851,35 @@ class Analyse(fw.FiretaskBase):
             g_req=self['g_req'],
             iteration=self['iteration'] + 1,
             max_iterations=self['max_iterations'],
+            fused=fused,
         )
+        if throughput:
+            pps.spec['throughput'] = list(throughput)
 
         return fw.Workflow(runs + [pps])
 
+    @staticmethod
+    def total_throughput(throughput):
+        """Sum performance of all simulations of this sampling point
+
+        Parameters
+        ----------
+        throughput : list of dict
+          from each PostProcess, see PostProcess.throughput
+
+        Returns
+        -------
+        cycles, walltime, cputime, hosts
+          total cycles run, wall and CPU seconds, and sorted list of hosts
+        """
+        cycles = sum(t['cycles'] for t in throughput)
+        walltime = sum(t['walltime'] or 0.0 for t in throughput)
+        cputime = sum(t['cputime'] or 0.0 for t in throughput)
+        hosts = sorted(set(t['host'] for t in throughput if t['host']))
+
+        return cycles, walltime, cputime, hosts
+
+    @instrumented
     def run_task(self, fw_spec):
         timeseries = {p_id: utils.make_series(ts)
                       for (p_id, ts) in fw_spec['results']}
@@ -554,18 +894,19 @@ class Analyse(fw.FiretaskBase):
         # starts True, turns false once a single sim wasn't equilibrated
         equilibrated = True
 
-        for p_id, ts in timeseries.items():
-            try:
-                eq = analysis.find_eq(ts)
-            except NotEquilibratedError:
-                equilibrated &= False
-            else:
-                production = ts.loc[eq:]
-                # how many eq periods have we sampled for?
-                g += (production.index[-1] - production.index[0]) / eq
-                means.append(production.mean())
-                stds.append(production.std())
-                eqs[p_id] = eq
+        with phase('find_eq'):
+            for p_id, ts in timeseries.items():
+                try:
+                    eq = analysis.find_eq(ts)
+                except NotEquilibratedError:
+                    equilibrated &= False
+                else:
+                    production = ts.loc[eq:]
+                    # how many eq periods have we sampled for?
+                    g += (production.index[-1] - production.index[0]) / eq
+                    means.append(production.mean())
+                    stds.append(production.std())
+                    eqs[p_id] = eq
 
         if equilibrated:
             mean = np.mean(means)
@@ -579,8 +920,19 @@ class Analyse(fw.FiretaskBase):
         timeout = (not finished and
                    self['iteration'] + 1 >= self['max_iterations'])
 
+        throughput = fw_spec.get('throughput', [])
+
         if finished or timeout:
+            cycles, walltime, cputime, hosts = self.total_throughput(
+                throughput)
+            # which simulations belong to this Workflow, for archiving
+            passed = {}
+            if fw_spec.get('simpaths', None):
+                _, simtree = fw_spec['simpaths'][0]
+                passed['simhash'] = utils.parse_sim_path(simtree).simhash
+
             return fw.FWAction(
+                update_spec=passed,
                 stored_data={
                     'result': (mean, std),
                     'equilibrated': equilibrated,
@@ -590,12 +942,21 @@ class Analyse(fw.FiretaskBase):
                 },
                 mod_spec=[{
                     # push the results of this condition to the Create task
-                    '_push': {'results_array': (self['temperature'],
-                                                self['pressure'],
-                                                mean, std, g)}
+                    '_push': {
+                        'results_array': (self['temperature'],
+                                          self['pressure'],
+                                          mean, std, g),
+                        'throughput_array': (self['temperature'],
+                                             self['pressure'],
+                                             cycles, walltime, cputime,
+                                             g, hosts),
+                    }
                 }],
             )
         else:
+            from .workflow_creator import (base_priority, inherit_options,
+                                           set_priority, PRIORITY_CONVERGENCE)
+
             # not finished, but more iterations allowed
             # perform more sampling
             if not equilibrated:
@@ -610,6 +971,23 @@ class Analyse(fw.FiretaskBase):
                 # how many steps for n+1 g?
                 nreq = int(total_steps_done / g * (g_req + 1))
 
+            detour = self.prepare_resample(
+                previous_simdirs={p_id: path
+                                  for (p_id, path) in fw_spec['simpaths']},
+                previous_results={p_id: ts.to_csv()
+                                  for (p_id, ts) in timeseries.items()},
+                ncycles=nreq,
+                wfname=fw_spec['_category'],
+                template=fw_spec['template'],
+                throughput=throughput,
+                fused=fw_spec.get('fused_runs', False),
+            )
+            inherit_options(fw_spec, detour.fws)
+            # points closest to converging are boosted most
+            progress = min(g / g_req, 1.0) if g_req else 1.0
+            boost = int(PRIORITY_CONVERGENCE * progress)
+            set_priority(detour.fws, base_priority(fw_spec), boost)
+
             return fw.FWAction(
                 stored_data={
                     'equilibrated': equilibrated,
@@ -617,23 +995,145 @@ class Analyse(fw.FiretaskBase):
                     'finished': finished,
                     'timed_out': timeout,
                 },
-                detours=self.prepare_resample(
-                    previous_simdirs={p_id: path
-                                      for (p_id, path) in fw_spec['simpaths']},
-                    previous_results={p_id: ts.to_csv()
-                                      for (p_id, ts) in timeseries.items()},
-                    ncycles=nreq,
-                    wfname=fw_spec['_category'],
-                    template=fw_spec['template'],
-                ),
+                detours=detour,
             )
 
 
+@xs
+class ExpandIsotherm(fw.FiretaskBase):
+    """Create the sampling of every condition once the template is ready
+
+    Used so that a submitted Workflow is only a few Fireworks
+
+    Takes:
+     - the settings for workflow_creator.make_isotherm_stages
+     - the template and simhash from the spec
+    Does:
+     - adds an ExpandSamplingPoint Firework for each condition, and the
+       IsothermCreate (and archive) Fireworks as a new branch of the
+       Workflow
+    """
+    required_params = ['conditions', 'ncycles', 'nparallel', 'wfname',
+                       'workdir', 'g_req', 'max_iterations']
+    optional_params = ['use_grid', 'fused', 'archive']
+
+    @instrumented
+    def run_task(self, fw_spec):
+        from .workflow_creator import make_isotherm_stages, inherit_options
+
+        fws = make_isotherm_stages(
+            parent_fw=None,
+            conditions=self['conditions'],
+            ncycles=self['ncycles'],
+            nparallel=self['nparallel'],
+            wfname=self['wfname'],
+            template=fw_spec['template'],
+            workdir=self['workdir'],
+            g_req=self['g_req'],
+            max_iterations=self['max_iterations'],
+            use_grid=self.get('use_grid', False),
+            fused=self.get('fused', False),
+            archive=self.get('archive', False),
+            lazy=True,
+        )
+        inherit_options(fw_spec, fws)
+        # additions don't receive update_spec, so pass these on directly
+        for new in fws:
+            new.spec['template'] = fw_spec['template']
+            new.spec['simhash'] = fw_spec['simhash']
+
+        return fw.FWAction(
+            stored_data={'nfireworks': len(fws)},
+            additions=fw.Workflow(fws),
+        )
+
+
+@xs
+class ExpandSamplingPoint(fw.FiretaskBase):
+    """Create the first sampling stage of a condition
+
+    Used by lazy Workflows, so that each condition's Fireworks are only
+    made once a worker is free to run them
+
+    Takes:
+     - the settings for workflow_creator.make_sampling_point
+     - priority : of the new Fireworks
+     - the template and simhash from the spec
+    Does:
+     - detours to the Copy, Run, PostProcess and Analyse Fireworks of
+       this condition, Analyse adds any further iterations
+    """
+    required_params = ['temperature', 'pressure', 'ncycles', 'nparallel',
+                       'wfname', 'workdir', 'g_req', 'max_iterations',
+                       'priority']
+    optional_params = ['use_grid', 'fused']
+
+    @instrumented
+    def run_task(self, fw_spec):
+        from .workflow_creator import (make_sampling_point, inherit_options,
+                                       set_priority)
+
+        runs, analysis = make_sampling_point(
+            parent_fw=None,
+            temperature=self['temperature'],
+            pressure=self['pressure'],
+            ncycles=self['ncycles'],
+            nparallel=self['nparallel'],
+            wfname=self['wfname'],
+            template=fw_spec['template'],
+            workdir=self['workdir'],
+            g_req=self['g_req'],
+            iteration=0,
+            max_iterations=self['max_iterations'],
+            use_grid=self.get('use_grid', False),
+            fused=self.get('fused', False),
+        )
+        fws = runs + [analysis]
+        inherit_options(fw_spec, fws)
+        set_priority(fws, self['priority'])
+        # detours don't receive update_spec, so pass these on directly
+        for new in fws:
+            new.spec['template'] = fw_spec['template']
+            new.spec['simhash'] = fw_spec['simhash']
+
+        return fw.FWAction(
+            stored_data={'nfireworks': len(fws)},
+            detours=fw.Workflow(fws),
+        )
+
+
 @xs
 class IsothermCreate(fw.FiretaskBase):
-    """From all results, create final answer of the isotherm"""
+    """From all results, create final answer of the isotherm
+
+    Also writes "efficiency.csv", the simulation throughput at each
+    condition, if this information was passed along
+    """
     optional_params = ['workdir']
 
+    @staticmethod
+    def write_efficiency(outfile, throughput):
+        """Write table of simulation throughput for each condition
+
+        Parameters
+        ----------
+        outfile : str
+          path to write csv to
+        throughput : list of tuples
+          (T, P, cycles, walltime, cputime, g, hosts) for each condition
+        """
+        with open(outfile, 'w') as out:
+            out.write('temperature,pressure,cycles,walltime,cputime,'
+                      'cycles_per_sec,cpu_per_g,hosts\n')
+            for T, P, cycles, walltime, cputime, g, hosts in sorted(
+                    throughput, key=lambda x: (x[0], x[1])):
+                rate = cycles / walltime if walltime else float('nan')
+                cpu_per_g = cputime / g if g else float('nan')
+                out.write('{},{},{},{},{},{},{},{}\n'.format(
+                    T, P, cycles, walltime, cputime, rate, cpu_per_g,
+                    ';'.join(hosts)))
+
+    @instrumented
     def run_task(self, fw_spec):
         # create sorted version
         results = sorted(fw_spec['results_array'],
@@ -646,6 +1146,130 @@ class IsothermCreate(fw.FiretaskBase):
                 out.write(','.join(str(val) for val in row))
                 out.write('\n')
 
+        if fw_spec.get('throughput_array', None):
+            self.write_efficiency(
+                os.path.join(self.get('workdir', ''), 'efficiency.csv'),
+                fw_spec['throughput_array'],
+            )
+
         return fw.FWAction(
             stored_data={'final_result': results}
         )
+
+
+@xs
+class ArchiveSimulations(fw.FiretaskBase):
+    """Pack all simulations of a finished sampling point into one archive
+
+    Takes:
+     - temperature, pressure and workdir of the sampling point
+     - optionally simhash, otherwise "simhash" from the spec
+    Does:
+     - writes every generation and parallel run of this simhash at this
+       point into "sim_<simhash>_T<T>_P<P>.zip" in workdir, zip allows
+       random access to individual members.  If this archive already
+       exists, the simulations are added to it.
+     - writes an index of which files came from which simulation to
+       the same name with ".index.json"
+     - removes the original simulation directories
+    """
+    required_params = ['temperature', 'pressure', 'workdir']
+    optional_params = ['simhash']
+
+    @staticmethod
+    def find_simulations(workdir, simhash, T, P):
+        """Find all simulation directories for a given condition
+
+        Only simulations of this *simhash* are found, as other Workflows
+        may share the same workdir
+
+        Returns
+        -------
+        simpaths : list of SimPath
+        """
+        pattern = utils.gen_sim_path(simhash, T, P, '*', '*')
+
+        return [utils.parse_sim_path(path)
+                for path in glob.glob(os.path.join(workdir, pattern))
+                if os.path.isdir(path)]
+
+    @staticmethod
+    def write_archive(archive, workdir, simpaths):
+        """Write a compressed archive of many simulations
+
+        An existing archive is never replaced, instead the simulations
+        are added to it (skipping any already archived)
+
+        Parameters
+        ----------
+        archive : str
+          path of zip file to create or add to
+        workdir : str
+          paths within the archive are relative to this
+        simpaths : list of SimPath
+          simulations to include
+
+        Returns
+        -------
+        index : dict
+          mapping of simulation directory name to list of members, for
+          every simulation in the archive
+        """
+        index = {}
+        tmp = archive + '.tmp'
+        if os.path.exists(archive):
+            with open(archive + '.index.json', 'r') as inf:
+                index = json.load(inf)
+            shutil.copyfile(archive, tmp)
+            mode = 'a'
+        else:
+            mode = 'w'
+        with zipfile.ZipFile(tmp, mode,
+                             compression=zipfile.ZIP_DEFLATED) as zf:
+            for sim in sorted(simpaths, key=lambda x: (x.gen_id,
+                                                       x.parallel_id)):
+                name = os.path.basename(sim.path)
+                if name in index:
+                    continue
+                members = index.setdefault(name, [])
+                for root, _, filenames in os.walk(sim.path):
+                    for fn in sorted(filenames):
+                        full = os.path.join(root, fn)
+                        arcname = os.path.relpath(full, workdir)
+                        zf.write(full, arcname)
+                        members.append(arcname)
+        # only appears once complete, and holds everything the old one did
+        os.replace(tmp, archive)
+
+        with open(archive + '.index.json', 'w') as out:
+            json.dump(index, out, indent=1, sort_keys=True)
+
+        return index
+
+    @instrumented
+    def run_task(self, fw_spec):
+        workdir = self['workdir']
+        T, P = self['temperature'], self['pressure']
+        simhash = self.get('simhash', None)
+        if simhash is None:
+            simhash = fw_spec['simhash']
+
+        archives = []
+        nfiles = 0
+        simpaths = self.find_simulations(workdir, simhash, T, P)
+        if simpaths:
+            archive = os.path.join(
+                workdir, 'sim_{}_T{}_P{}.zip'.format(simhash, T, P))
+            with phase('archive'):
+                index = self.write_archive(archive, workdir, simpaths)
+            nfiles += sum(len(index[os.path.basename(sim.path)])
+                          for sim in simpaths)
+
+            with phase('cleanup'):
+                for sim in simpaths:
+                    shutil.rmtree(sim.path)
+            archives.append(archive)
+
+        return fw.FWAction(
+            stored_data={'archives': archives, 'nfiles': nfiles},
+        )
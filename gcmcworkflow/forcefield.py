@@ -0,0 +1,175 @@
+"""Declarative mapping of GA candidates onto forcefield files
+
+Instead of writing a Python function to update the forcefield, a
+mapping can describe where each parameter of a candidate goes::
+
+    mapping = [
+        {'file': 'force_field_mixing_rules.def',
+         'pattern': r'Ar\s',
+         'fields': [[2, 0], [3, 1]]},
+    ]
+
+Each rule applies to every line in 'file' which 'pattern' matches (using
+``re.match``), replacing the whitespace separated fields (counting from
+zero) with the values of the candidate at the given index.  The example
+puts the first value of the candidate into the epsilon, and the
+second into the sigma of argon.
+
+The mapping is compiled against the template once per worker process,
+into a format string for each file.  Applying a candidate is then only
+a call to ``str.format`` and a write, with no reading or searching of
+the file.  A mapping is plain data, so unlike an updater function it
+doesn't need to be pickled into the Workflow.
+"""
+import json
+import os
+import re
+
+
+# compiled mappings, keyed by template location, mapping and the state
+# of the mapped files
+_COMPILED = {}
+
+
+def compile_file(contents, rules):
+    """Turn the contents of a file into a format string
+
+    Parameters
+    ----------
+    contents : str
+      original contents of the file
+    rules : list of dict
+      rules which apply to this file
+
+    Returns
+    -------
+    fmt : str
+      format string, formatting with the candidate values recreates
+      the file with these values substituted in
+
+    Raises
+    ------
+    ValueError
+      if a rule doesn't match any line, a line has too few fields, or
+      rules map a field to two different values
+    """
+    lines = contents.splitlines(True)
+    # field -> candidate index, for every line any rule matches
+    placements = {}
+
+    for rule in rules:
+        pattern = re.compile(rule['pattern'])
+        matched = False
+        for i, line in enumerate(lines):
+            if not pattern.match(line):
+                continue
+            matched = True
+            fields = placements.setdefault(i, {})
+            for field, idx in rule['fields']:
+                if fields.get(field, idx) != idx:
+                    raise ValueError("Field {} of line '{}' in '{}' is "
+                                     "mapped to more than one value"
+                                     "".format(field, line.strip(),
+                                               rule['file']))
+                fields[field] = idx
+        if not matched:
+            raise ValueError("Pattern '{}' matched nothing in '{}'"
+                             "".format(rule['pattern'], rule['file']))
+
+    # escape everything, then substitute fields into matching lines
+    out = [line.replace('{', '{{').replace('}', '}}') for line in lines]
+    for i, fields in placements.items():
+        line = lines[i]
+        spans = [m.span() for m in re.finditer(r'\S+', line)]
+        new = line
+        # work backwards so earlier spans stay valid
+        for field, idx in sorted(fields.items(), reverse=True):
+            try:
+                start, stop = spans[field]
+            except IndexError:
+                raise ValueError("Line '{}' in '{}' has no field {}"
+                                 "".format(line.strip(), rules[0]['file'],
+                                           field))
+            new = new[:start] + '\0{}\0'.format(idx) + new[stop:]
+        # escape, then turn placeholders into replacement fields
+        new = new.replace('{', '{{').replace('}', '}}')
+        out[i] = re.sub('\0(\\d+)\0', r'{\1}', new)
+
+    return ''.join(out)
+
+
+def compile_mapping(template, mapping):
+    """Compile a mapping against the files in *template*
+
+    Parameters
+    ----------
+    template : str
+      path to the template (or a simulation made from it)
+    mapping : list of dict
+      rules with 'file', 'pattern' and 'fields', see module docstring
+
+    Returns
+    -------
+    formats : dict
+      mapping of filename to format string
+    """
+    byfile = {}
+    for rule in mapping:
+        byfile.setdefault(rule['file'], []).append(rule)
+
+    formats = {}
+    for fn, rules in byfile.items():
+        with open(os.path.join(template, fn), 'r') as inf:
+            formats[fn] = compile_file(inf.read(), rules)
+
+    return formats
+
+
+def _file_stamps(template, mapping):
+    """Modification time and size of each file *mapping* refers to"""
+    stamps = []
+    for fn in sorted(set(rule['file'] for rule in mapping)):
+        st = os.stat(os.path.join(template, fn))
+        stamps.append((fn, st.st_mtime_ns, st.st_size))
+    return tuple(stamps)
+
+
+def get_compiled(template, mapping):
+    """Compiled version of *mapping*, compiling only once per process
+
+    The template is recompiled if any of the mapped files have changed
+    since, so a template replaced at the same path isn't served stale.
+    """
+    key = (os.path.abspath(template), json.dumps(mapping, sort_keys=True),
+           _file_stamps(template, mapping))
+    try:
+        return _COMPILED[key]
+    except KeyError:
+        formats = _COMPILED[key] = compile_mapping(template, mapping)
+        return formats
+
+
+def apply_mapping(simtree, candidate, mapping, template=None):
+    """Write the values of *candidate* into the simulation at *simtree*
+
+    Parameters
+    ----------
+    simtree : str
+      path to the simulation to modify
+    candidate : tuple of float
+      parameters to write
+    mapping : list of dict
+      the forcefield mapping
+    template : str, optional
+      path to the template the simulation was copied from, if given the
+      compiled mapping is reused for every simulation from this
+      template, otherwise the simulation itself is used
+    """
+    if template is None:
+        formats = compile_mapping(simtree, mapping)
+    else:
+        formats = get_compiled(template, mapping)
+
+    for fn, fmt in formats.items():
+        with open(os.path.join(simtree, fn), 'w') as out:
+            out.write(fmt.format(*candidate))
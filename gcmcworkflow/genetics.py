@@ -4,10 +4,16 @@ Persistent Data structures(
 parents:
   - list of parameters and fitness
     eg: ((0.5, 2.0, 1.5), 4.5)
+  - if using a population store (see population_store module) this is
+    kept in the store, and only "generation_id" is passed along
 candidates:
   - list of parameters, initially without fitness
     eg: ((0.5, 2.0, 1.5), None)
   - later gets given fitness values
+fitness:
+  - (candidate_id, fitness) for each candidate, lower is better
+  - with "objectives", fitness is a list with a value per objective and
+    individuals are ranked by Pareto front and crowding (NSGA-II)
 candidate results:
   - assigns results to candidates
     eg: (0, (4.5, 4.6, 4.6))  # candidate 0 has results
@@ -16,6 +22,15 @@ simulation template:
  - contains the template for a simulation?
 template:
   - path to where the template was saved to
+fitness_cache:
+  - every evaluation so far, so that candidates which have already
+    been simulated aren't simulated again
+  - dict keyed by cache_index of the candidate, T and P
+    eg: {'10000_20000_200000000_10000000':
+         [[10000, 20000], 200.0, 10.0, 0.1, 4.5]}
+    ie: quantised candidate, T, P, error, result
+  - if using a population store this is kept in the store instead, and
+    isn't passed along
 )
 
 VVVV
@@ -55,13 +70,42 @@ PreGAFW: (one)
   - create candidates from parents
 VaryCandidates
   - replace candidates
-PassAlong(parents, template)
+SurrogateScreen(ncandidates) (optional)
+  - uses fitness_cache to train a model of fitness
+  - keeps only the most promising of an oversized batch of candidates
+PassAlong(parents, template, fitness_cache)
 
 VVVV
-Parents, Candidates, Template
+Parents, Candidates, Template, fitness_cache
+VVVV
+
+ScreenFW: (optional, for each screening condition and candidate)
+  CheckFitnessCache(candidate id, screening)
+  - if this was already evaluated, use its full length error and stop here
+  CopyTemplate, ManipulateForcefield, RunSimulation as below, but shorter
+  EvaluateResult(reference, screening)
+  - creates screening
+
+VVVV
+screening
+VVVV
+
+PromoteFW: (optional, one)
+  Promote(fraction)
+  - uses screening to rank candidates
+  - creates promoted
+
+VVVV
+promoted
 VVVV
 
 SimFW: (for each condition and candidate)
+  CheckFitnessCache(candidate id)
+  - uses fitness_cache
+  - if this was already evaluated, repeat its results and stop here
+  CheckPromoted(candidate id) (only if screening)
+  - uses promoted
+  - if this candidate wasn't promoted, give it infinite error and stop here
   CopyTemplate
   - uses template
   ManipulateForcefield(candidate id)
@@ -70,9 +114,10 @@ SimFW: (for each condition and candidate)
   EvaluateResult(reference)
   - creates error
   - creates results_array
+  - creates evaluations
 
 VVVV
-error, results_array
+error, results_array, evaluations
 VVVV
 
 ResultsFW: (for each candidate)
@@ -80,30 +125,48 @@ ResultsFW: (for each candidate)
    - uses results_array
   AssignFitness(candidate_id)
    - uses error to create fitness
+   - passes on evaluations
 
 VVVV
-Parents, Candidates, fitness, Template
+Parents, Candidates, fitness, evaluations, Template
 VVVV
 
 PostGAFW: (one)
   Replacement
   - uses candidates and fitness
   - replaces parents
-  PassAlong(template)
+  UpdateFitnessCache
+  - adds evaluations to fitness_cache
+  PassAlong(template, fitness_cache)
 
 VVVV
-Parents, Template
+Parents, Template, fitness_cache
 VVVV
 )
 
 """
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import fcntl
 import fireworks as fw
 from fireworks.utilities.fw_utilities import explicit_serialize as xs
+import json
+import numpy as np
 import os
-import random
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import (
+    ConstantKernel, Matern, WhiteKernel,
+)
 
+from . import DEFAULT_NCYCLES
+from . import firetasks
+from . import formats
+from . import forcefield
 from . import raspatools
 from . import utils
+from .instrument import instrumented, phase
+from .population_store import get_population_store
 
 
 @xs
@@ -111,6 +174,7 @@ class InitPopulation(fw.FiretaskBase):
     """Receieve the initial seeding for the GA"""
     required_params = ['initial_population']
 
+    @instrumented
     def run_task(self, fw_spec):
         return fw.FWAction(
             update_spec={
@@ -125,45 +189,279 @@ class PassAlong(fw.FiretaskBase):
     """Pass along to next Firework"""
     required_params = ['keys']
 
+    @instrumented
     def run_task(self, fw_spec):
         return fw.FWAction(
             update_spec={k: fw_spec[k] for k in self['keys']}
         )
 
 
+# candidates within this of each other in every parameter share a fitness
+FITNESS_TOLERANCE = 1e-6
+
+
+def cache_key(candidate):
+    """Quantise a candidate so that near identical candidates match
+
+    Returns
+    -------
+    key : list of int
+      list rather than tuple, so it survives storage in MongoDB
+    """
+    return [int(round(val / FITNESS_TOLERANCE)) for val in candidate]
+
+
+def cache_index(candidate, T, P):
+    """Key of an evaluation in the fitness cache
+
+    Returns
+    -------
+    index : str
+      quantised candidate, T and P joined with underscores, a string
+      without '.' so that it can be a MongoDB key
+    """
+    return '_'.join(str(v) for v in cache_key(candidate) + cache_key((T, P)))
+
+
+def get_fitness_cache(task, fw_spec):
+    """The fitness cache, from wherever *task* is told it is kept
+
+    Either the population store given by the "population_store" and
+    "wf_name" of *task*, or "fitness_cache" in the spec
+
+    Returns
+    -------
+    cache : dict
+    """
+    if task.get('population_store', None) is not None:
+        return get_population_store(task['population_store']).fitness_cache(
+            task['wf_name'])
+    return fw_spec.get('fitness_cache', {})
+
+
+def make_rng(seed=None):
+    """Random number generator for GA operators
+
+    Parameters
+    ----------
+    seed : int or list of int, optional
+      seed for reproducible results, eg ``[seed, generation_id]``
+
+    Returns
+    -------
+    rng : numpy.random.Generator
+    """
+    return np.random.default_rng(seed)
+
+
+def objective_values(evaluations, objectives):
+    """Fitness of a candidate for each objective
+
+    Parameters
+    ----------
+    evaluations : list of tuples
+      (T, P, error, result) at each condition
+    objectives : list of tuples
+      (T, P, objective index) for each condition
+
+    Returns
+    -------
+    fitness : list of float
+      sum of squared errors of the conditions in each objective
+    """
+    which = {(T, P): k for T, P, k in objectives}
+    fitness = [0.0] * (max(which.values()) + 1)
+    for T, P, error, _ in evaluations:
+        fitness[which[(T, P)]] += error ** 2
+
+    return fitness
+
+
+def non_dominated_sort(fitness):
+    """Rank of the Pareto front each individual belongs to
+
+    Parameters
+    ----------
+    fitness : numpy array
+      (N, M) values of M objectives for N individuals, lower is better
+
+    Returns
+    -------
+    ranks : numpy array
+      front of each individual, 0 being the non-dominated front
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n = len(fitness)
+    # dominates[i, j] if i is no worse than j everywhere and better somewhere
+    le = (fitness[:, None, :] <= fitness[None, :, :]).all(axis=2)
+    lt = (fitness[:, None, :] < fitness[None, :, :]).any(axis=2)
+    dominates = le & lt
+
+    ranks = np.full(n, -1, dtype=int)
+    ndominating = dominates.sum(axis=0)
+    rank = 0
+    while (ranks < 0).any():
+        front = (ndominating == 0) & (ranks < 0)
+        ranks[front] = rank
+        # remove this front
+        ndominating -= dominates[front].sum(axis=0)
+        rank += 1
+
+    return ranks
+
+
+def crowding_distance(fitness):
+    """Crowding distance of individuals within a single front
+
+    Parameters
+    ----------
+    fitness : numpy array
+      (N, M) values of M objectives for N individuals
+
+    Returns
+    -------
+    distance : numpy array
+      crowding of each individual, larger is less crowded, with the
+      boundaries of the front infinite
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n, m = fitness.shape
+    distance = np.zeros(n)
+    if n < 3:
+        distance[:] = np.inf
+        return distance
+
+    order = np.argsort(fitness, axis=0, kind='stable')
+    ordered = np.take_along_axis(fitness, order, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        span = ordered[-1] - ordered[0]
+        gaps = (ordered[2:] - ordered[:-2]) / np.where(span > 0, span, 1.0)
+    gaps = np.nan_to_num(gaps, nan=0.0)
+
+    cols = np.arange(m)
+    np.add.at(distance, order[1:-1], gaps)
+    distance[order[0, cols]] = np.inf
+    distance[order[-1, cols]] = np.inf
+
+    return distance
+
+
+def crowded_key(fitness):
+    """Scalar ranking of multi-objective fitness, lower is better
+
+    Orders by Pareto front, then by crowding distance within a front,
+    as in NSGA-II.  Single objective fitness is returned unchanged.
+
+    Parameters
+    ----------
+    fitness : numpy array
+      (N,) or (N, M) fitness values
+
+    Returns
+    -------
+    key : numpy array
+      (N,) values which sort individuals from best to worst
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    if fitness.ndim == 1:
+        return fitness
+
+    ranks = non_dominated_sort(fitness)
+    crowding = np.zeros(len(fitness))
+    for rank in np.unique(ranks):
+        front = ranks == rank
+        crowding[front] = crowding_distance(fitness[front])
+
+    # crowding maps into (0, 1], so never changes the order of fronts
+    return ranks + 1.0 / (1.0 + crowding)
+
+
+def as_candidates(population):
+    """Convert a 2D array of candidates into a list of tuples"""
+    return [tuple(row) for row in np.asarray(population).tolist()]
+
+
 @xs
 class Tournament(fw.FiretaskBase):
-    """Return a list of candidates from parents"""
+    """Return a list of candidates from parents
+
+    Optionally:
+     - k : size of each tournament, defaults to 2
+     - n : number of candidates to select, defaults to number of parents
+     - seed : for reproducible selection
+     - population_store, wf_name : read parents from this store, using
+       "generation_id" from the spec, rather than "parents"
+    """
+    optional_params = ['k', 'n', 'seed', 'population_store', 'wf_name']
+
     @staticmethod
-    def tournament(parents):
+    def tournament(parents, k=2, rng=None, n=None):
         """Return candidates from parents
 
+        Each candidate is the fittest (lowest) of *k* parents drawn at
+        random, by default with one tournament per member of the population.
+        Consecutive candidates, which are later paired for crossover, are
+        never the same parent.
+
         Parameters
         ----------
         parents : list of tuples
           current population of the GA
+        k : int, optional
+          number of parents in each tournament
+        rng : numpy.random.Generator, optional
+        n : int, optional
+          number of candidates to select, defaults to population size
 
         Returns
         -------
         candidates : list of tuples
           parameter sets for the chosen solutions to propagate
         """
+        if rng is None:
+            rng = make_rng()
         popsize = len(parents)
-
-        selected = []
-        previous = None
-        current = None
-        while len(selected) < popsize:
-            while previous == current:
-                current = min(random.sample(parents, 2),
-                              key=lambda x: x[1])  # .fitness
-            selected.append(current[0])  # .parameters
-            previous = current
-
-        return selected
-
+        if n is None:
+            n = popsize
+
+        params = np.array([p[0] for p in parents], dtype=float)
+        fitness = crowded_key([p[1] for p in parents])
+
+        # each row is one tournament
+        entrants = rng.integers(0, popsize, size=(n, k))
+        winners = entrants[np.arange(n),
+                           np.argmin(fitness[entrants], axis=1)]
+
+        if popsize > 1:
+            # rerun tournaments which repeat the previous winner, without
+            # that parent.  The first repeat is always fixed, so this ends
+            repeats = np.nonzero(winners[1:] == winners[:-1])[0] + 1
+            while repeats.size:
+                previous = winners[repeats - 1]
+                entrants = rng.integers(0, popsize - 1,
+                                        size=(repeats.size, k))
+                # skip over the previous winner
+                entrants += entrants >= previous[:, None]
+                winners[repeats] = entrants[
+                    np.arange(repeats.size),
+                    np.argmin(fitness[entrants], axis=1)]
+                repeats = np.nonzero(winners[1:] == winners[:-1])[0] + 1
+
+        return as_candidates(params[winners])
+
+    @instrumented
     def run_task(self, fw_spec):
-        candidates = self.tournament(fw_spec['parents'])
+        if self.get('population_store', None) is not None:
+            parents = get_population_store(
+                self['population_store']).get_population(
+                    self['wf_name'], fw_spec['generation_id'])
+        else:
+            parents = fw_spec['parents']
+
+        candidates = self.tournament(parents,
+                                     k=self.get('k', 2),
+                                     rng=make_rng(self.get('seed', None)),
+                                     n=self.get('n', None))
 
         return fw.FWAction(
             update_spec={'candidates': candidates}
@@ -184,6 +482,7 @@ class VaryCandidates(fw.FiretaskBase):
         # bounds for candidate values
         'bounds',
     ]
+    optional_params = ['seed']
     default_params = dict(
         blend_probability=0.9,
         blend_alpha=0.1,
@@ -192,97 +491,456 @@ class VaryCandidates(fw.FiretaskBase):
     )
 
     @staticmethod
-    def clamp(val, lower, upper):
+    def clamp(vals, lower, upper):
         """He's champin' for a clampin'!"""
-        val = max(val, lower)
-        val = min(val, upper)
-        return val
-
-    def blend_crossover(self, candidates):
-        # split candidates into pairs
-        # vary each candidate in pairs
-        # self['blend_probability']
-        new_candidates = []
-
-        for mother, father in zip(candidates[::2], candidates[1::2]):
-            brother, sister = [], []
-            for a, b, (min_bound, max_bound) in zip(mother, father,
-                                                    self['bounds']):
-                if random.random() < self['blend_probability']:
-                    smallest, largest = min(a, b), max(a, b)
-                    # range between parents
-                    width = largest - smallest
-                    # amount we go out of bounds from natural range
-                    extra = width * self['blend_alpha']
-
-                    # start point is (smallest - delta)
-                    # we then move up to (width + 2 * extra) from this point
-                    a = ((smallest - extra) +
-                         random.random() * (width + 2 * extra))
-                    b = ((smallest - extra) +
-                         random.random() * (width + 2 * extra))
-                    a = self.clamp(a, min_bound, max_bound)
-                    b = self.clamp(b, min_bound, max_bound)
-
-                brother.append(a)
-                sister.append(b)
-
-            new_candidates.append(tuple(brother))
-            new_candidates.append(tuple(sister))
-
-        return new_candidates
-
-    def gaussian_mutation(self, candidates):
-        # for each variable, calculate current range, then define sigma
-        n_params = len(candidates[0])
-        sigmas = []
-        for i in range(n_params):
-            maxval = max(c[i] for c in candidates)
-            minval = min(c[i] for c in candidates)
-            sigmas.append((maxval - minval) / self['sigma_factor'])
-
-        # perform mutations using these sigmasx
-        def mutate(candidate):
-            new = []
-            for sigma, val, (min_bound, max_bound) in zip(sigmas, candidate,
-                                                          self['bounds']):
-                if random.random() < self['mutation_probability']:
-                    val += random.gauss(0, sigma)
-                    val = self.clamp(val, min_bound, max_bound)
-
-                new.append(val)
-            return tuple(new)
-        candidates = [mutate(c) for c in candidates]
-
-        return candidates
+        return np.clip(vals, lower, upper)
+
+    @classmethod
+    def blend_crossover(cls, population, bounds, probability, alpha, rng):
+        """Blend (BLX-alpha) crossover of pairs of candidates
+
+        Parameters
+        ----------
+        population : numpy.ndarray
+          (ncandidates, nparams) array, consecutive rows are paired.
+          If there is an odd candidate out it is left unchanged
+        bounds : numpy.ndarray
+          (nparams, 2) array of minimum and maximum of each parameter
+        probability : float
+          chance of each allele being blended
+        alpha : float
+          fraction to extrapolate from the range between parents
+        rng : numpy.random.Generator
+
+        Returns
+        -------
+        children : numpy.ndarray
+          same shape as population
+        """
+        children = population.copy()
+        npairs = len(population) // 2
+        mother = population[0:2 * npairs:2]
+        father = population[1:2 * npairs:2]
+
+        smallest = np.minimum(mother, father)
+        # range between parents
+        width = np.abs(mother - father)
+        # amount we go out of bounds from natural range
+        extra = width * alpha
+
+        # start point is (smallest - delta)
+        # we then move up to (width + 2 * extra) from this point
+        def blend():
+            return cls.clamp(
+                (smallest - extra) +
+                rng.random(mother.shape) * (width + 2 * extra),
+                bounds[:, 0], bounds[:, 1])
+
+        brother, sister = blend(), blend()
+        mask = rng.random(mother.shape) < probability
+
+        children[0:2 * npairs:2] = np.where(mask, brother, mother)
+        children[1:2 * npairs:2] = np.where(mask, sister, father)
+
+        return children
+
+    @classmethod
+    def gaussian_mutation(cls, population, bounds, probability,
+                          sigma_factor, rng):
+        """Add gaussian noise to some alleles
+
+        Sigma for each parameter is its current range across the
+        population divided by *sigma_factor*
+
+        Parameters
+        ----------
+        population : numpy.ndarray
+          (ncandidates, nparams) array
+        bounds : numpy.ndarray
+          (nparams, 2) array of minimum and maximum of each parameter
+        probability : float
+          chance of each allele being mutated
+        sigma_factor : float
+        rng : numpy.random.Generator
+
+        Returns
+        -------
+        mutated : numpy.ndarray
+        """
+        sigmas = ((population.max(axis=0) - population.min(axis=0)) /
+                  sigma_factor)
+
+        mask = rng.random(population.shape) < probability
+        mutated = cls.clamp(
+            population + rng.standard_normal(population.shape) * sigmas,
+            bounds[:, 0], bounds[:, 1])
 
+        return np.where(mask, mutated, population)
+
+    @instrumented
     def run_task(self, fw_spec):
-        candidates = self.blend_crossover(fw_spec['candidates'])
-        candidates = self.gaussian_mutation(candidates)
+        rng = make_rng(self.get('seed', None))
+        population = np.array(fw_spec['candidates'], dtype=float)
+        bounds = np.array(self['bounds'], dtype=float)
+
+        population = self.blend_crossover(
+            population, bounds,
+            self['blend_probability'], self['blend_alpha'], rng)
+        population = self.gaussian_mutation(
+            population, bounds,
+            self['mutation_probability'], self['sigma_factor'], rng)
 
         return fw.FWAction(
-            update_spec={'candidates': candidates}
+            update_spec={'candidates': as_candidates(population)}
+        )
+
+
+@xs
+class SurrogateScreen(fw.FiretaskBase):
+    """Keep only the most promising candidates, as judged by a model
+
+    The model maps candidate parameters to fitness and is trained on
+    every fully evaluated candidate in the fitness cache.  Used after
+    an oversized batch of candidates has been bred, so that only
+    "ncandidates" of them need simulating.
+
+    Takes:
+     - ncandidates : number of candidates to keep
+     - bounds : bounds for candidate values, used to scale parameters
+    Optionally:
+     - model : either 'gp' (gaussian process, default) or 'forest'
+       (random forest)
+     - kappa : how much to favour uncertain candidates, defaults to 1.0
+     - min_samples : number of evaluated candidates required before
+       the model is used, defaults to 5.  Before this, candidates are
+       kept in the order they were bred.
+     - seed : for reproducible models
+     - population_store, wf_name : read the fitness cache from this
+       store, rather than the spec
+    """
+    required_params = ['ncandidates', 'bounds']
+    optional_params = ['model', 'kappa', 'min_samples', 'seed',
+                       'population_store', 'wf_name']
+
+    @staticmethod
+    def training_data(cache):
+        """Fitness of each fully evaluated candidate in the fitness cache
+
+        Parameters
+        ----------
+        cache : dict
+          fitness cache, with entries of [key, T, P, error, result]
+
+        Returns
+        -------
+        X, y : numpy arrays
+          candidate parameters and their fitness
+        """
+        conditions = {(T, P) for _, T, P, _, _ in cache.values()}
+        errors = {}
+        for key, T, P, error, _ in cache.values():
+            errors.setdefault(tuple(key), {})[(T, P)] = error
+
+        keys = [k for k, v in errors.items() if len(v) == len(conditions)]
+        X = np.array(keys, dtype=float).reshape(len(keys), -1 if keys else 0)
+        # same as AssignFitness
+        y = np.array([sum(e ** 2 for e in errors[k].values()) for k in keys])
+
+        return X * FITNESS_TOLERANCE, y
+
+    @staticmethod
+    def make_model(model, seed=None):
+        """Create an unfitted regressor of type *model*"""
+        if seed is not None:
+            # seeds here may be lists, which sklearn doesn't accept
+            seed = int(make_rng(seed).integers(2 ** 31))
+
+        if model == 'gp':
+            kernel = (ConstantKernel() * Matern(nu=2.5)
+                      + WhiteKernel(noise_level=1e-3))
+            return GaussianProcessRegressor(kernel=kernel,
+                                            normalize_y=True,
+                                            random_state=seed)
+        elif model == 'forest':
+            return RandomForestRegressor(n_estimators=100,
+                                         random_state=seed)
+        else:
+            raise ValueError("Unknown surrogate model '{}', must be 'gp' or "
+                             "'forest'".format(model))
+
+    @staticmethod
+    def predict(model, X):
+        """Mean and standard deviation of predicted fitness"""
+        if hasattr(model, 'estimators_'):
+            # spread of trees in the forest
+            per_tree = np.array([t.predict(X) for t in model.estimators_])
+            return per_tree.mean(axis=0), per_tree.std(axis=0)
+        return model.predict(X, return_std=True)
+
+    @classmethod
+    def screen(cls, candidates, cache, ncandidates, bounds, model='gp',
+               kappa=1.0, min_samples=5, seed=None):
+        """Choose the most promising candidates
+
+        Candidates are ranked on a lower confidence bound of fitness,
+        ``mean - kappa * std``, so that both candidates predicted to be
+        fit and those the model knows little about are simulated.
+
+        Returns
+        -------
+        candidates : list of tuples
+          the chosen *ncandidates* candidates, best first
+        """
+        if len(candidates) <= ncandidates:
+            return list(candidates)
+
+        X, y = cls.training_data(cache)
+        if len(y) < min_samples:
+            return list(candidates[:ncandidates])
+
+        bounds = np.array(bounds, dtype=float)
+        lower, span = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+        Xnew = np.array(candidates, dtype=float)
+
+        surrogate = cls.make_model(model, seed)
+        with phase('fit'):
+            surrogate.fit((X - lower) / span, y)
+        with phase('predict'):
+            mean, std = cls.predict(surrogate, (Xnew - lower) / span)
+
+        best = np.argsort(mean - kappa * std, kind='stable')[:ncandidates]
+
+        return [candidates[i] for i in best]
+
+    @instrumented
+    def run_task(self, fw_spec):
+        candidates = self.screen(
+            fw_spec['candidates'], get_fitness_cache(self, fw_spec),
+            self['ncandidates'], self['bounds'],
+            model=self.get('model', 'gp'),
+            kappa=self.get('kappa', 1.0),
+            min_samples=self.get('min_samples', 5),
+            seed=self.get('seed', None),
+        )
+
+        return fw.FWAction(
+            stored_data={'screened': len(fw_spec['candidates'])},
+            update_spec={'candidates': as_candidates(candidates)},
+        )
+
+
+@xs
+class CheckFitnessCache(fw.FiretaskBase):
+    """Skip simulating a candidate which has already been evaluated
+
+    If this candidate was simulated at this condition in a previous
+    generation, its results are passed on exactly as EvaluateResult would
+    and the rest of the Firework is skipped
+
+    Optionally:
+     - population_file : steady state population file to read the
+       cache from, rather than "fitness_cache" in the spec
+     - population_store, wf_name : look up the evaluation in this store
+     - screening : if True this is a screening simulation, the previous
+       full length error is instead pushed as "screening" for Promote
+    """
+    required_params = ['candidate_id', 'temperature', 'pressure']
+    optional_params = ['population_file', 'population_store', 'wf_name',
+                       'screening']
+
+    @staticmethod
+    def lookup(cache, candidate, T, P):
+        """Find a previous evaluation
+
+        Returns
+        -------
+        error, result : float or None
+          previous results, or None if not found
+        """
+        try:
+            _, _, _, error, result = cache[cache_index(candidate, T, P)]
+        except KeyError:
+            return None
+        return error, result
+
+    @instrumented
+    def run_task(self, fw_spec):
+        candidate = fw_spec['candidates'][self['candidate_id']]
+        T, P = self['temperature'], self['pressure']
+
+        if self.get('population_store', None) is not None:
+            # indexed lookup of only this entry
+            index = cache_index(candidate, T, P)
+            entry = get_population_store(self['population_store']).lookup(
+                self['wf_name'], index)
+            cache = {} if entry is None else {index: entry}
+        elif self.get('population_file', None) is not None:
+            # always replaced whole, so safe to read without the lock
+            with open(self['population_file'], 'r') as inf:
+                cache = json.load(inf)['fitness_cache']
+        else:
+            cache = fw_spec.get('fitness_cache', {})
+
+        found = self.lookup(cache, candidate, T, P)
+        if found is None:
+            return fw.FWAction()
+
+        error, result = found
+        if self.get('screening', False):
+            push = {'screening': (self['candidate_id'], T, P, error, result)}
+        else:
+            push = EvaluateResult.results_push(T, P, error, result)
+        return fw.FWAction(
+            stored_data={'error': error, 'cached': True},
+            mod_spec=[{'_push': push}],
+            exit=True,
+        )
+
+
+@xs
+class Promote(fw.FiretaskBase):
+    """Choose which candidates go on to full length simulations
+
+    Successive halving: every candidate is first given a short
+    simulation at some conditions, and only the fittest "fraction"
+    of them are then simulated fully at every condition.
+
+    Takes:
+     - fraction : fraction of candidates to promote, at least one
+       candidate is always promoted
+    """
+    required_params = ['fraction']
+
+    @staticmethod
+    def rank(screening, fraction):
+        """Choose the candidates to promote
+
+        Parameters
+        ----------
+        screening : list of tuples
+          (candidate_id, T, P, error, result) from each screening run
+        fraction : float
+          fraction of candidates to promote
+
+        Returns
+        -------
+        promoted : list of int
+          candidate_ids to promote, sorted
+        screen_fitness : dict
+          mapping of candidate_id to fitness from the screening runs
+        """
+        screen_fitness = {}
+        for candidate_id, _, _, error, _ in screening:
+            screen_fitness[candidate_id] = (
+                screen_fitness.get(candidate_id, 0.0) + error ** 2)
+
+        ids = np.array(sorted(screen_fitness), dtype=int)
+        if not len(ids):
+            return [], screen_fitness
+        fitness = np.array([screen_fitness[i] for i in ids])
+        npromote = max(1, int(np.ceil(fraction * len(ids))))
+        best = ids[np.argsort(fitness, kind='stable')[:npromote]]
+
+        return sorted(best.tolist()), screen_fitness
+
+    @instrumented
+    def run_task(self, fw_spec):
+        promoted, screen_fitness = self.rank(fw_spec.get('screening', []),
+                                             self['fraction'])
+
+        return fw.FWAction(
+            stored_data={
+                'promoted': promoted,
+                # MongoDB keys must be strings
+                'screen_fitness': {str(k): v
+                                   for k, v in screen_fitness.items()},
+            },
+            update_spec={'promoted': promoted},
+        )
+
+
+@xs
+class CheckPromoted(fw.FiretaskBase):
+    """Skip full simulations of candidates which weren't promoted
+
+    Candidates which weren't promoted get an infinite error, so that
+    they never replace any simulated candidate, and nothing is added to
+    the fitness cache
+    """
+    required_params = ['candidate_id', 'temperature', 'pressure']
+
+    @instrumented
+    def run_task(self, fw_spec):
+        if self['candidate_id'] in fw_spec['promoted']:
+            return fw.FWAction()
+
+        T, P = self['temperature'], self['pressure']
+        return fw.FWAction(
+            stored_data={'error': float('inf'), 'promoted': False},
+            mod_spec=[{
+                '_push': {
+                    'error': float('inf'),
+                    'results_array': (T, P, float('nan'), 1, 1),
+                },
+            }],
+            exit=True,
         )
 
 
 @xs
 class ManipulateForcefield(fw.FiretaskBase):
-    """Change the forcefield parameters according to the candidate"""
+    """Change the forcefield parameters according to the candidate
+
+    "updater" is either a reference from utils.register_updater, or
+    a forcefield mapping (see forcefield module)
+    """
     required_params = ['candidate_id', 'updater']
 
+    @staticmethod
+    def update(simtree, candidate, updater, template=None):
+        """Apply *candidate* to the simulation at *simtree*
+
+        Parameters
+        ----------
+        simtree : str
+          path to the simulation
+        candidate : tuple
+          parameters of the candidate
+        updater : str or list
+          updater reference or forcefield mapping
+        template : str, optional
+          path to the template, allows mappings to be compiled once
+        """
+        if isinstance(updater, list):
+            if template is not None and not os.path.isdir(template):
+                # template isn't visible on this node
+                template = None
+            forcefield.apply_mapping(simtree, candidate, updater,
+                                     template=template)
+        else:
+            utils.load_updater(updater, template)(simtree, candidate)
+
+    @instrumented
     def run_task(self, fw_spec):
         my_candidate = fw_spec['candidates'][self['candidate_id']]
 
-        updater = utils.unpickle_func(self['updater'])
-        updater(fw_spec['simtree'], my_candidate)
+        self.update(fw_spec['simtree'], my_candidate, self['updater'],
+                    template=fw_spec.get('template', None))
 
         return fw.FWAction()
 
 
 @xs
 class EvaluateResult(fw.FiretaskBase):
-    """Calculate error of result"""
+    """Calculate error of result
+
+    Optionally:
+     - screening : if True this is a short screening simulation, the
+       error is instead pushed as "screening" for Promote, along with
+       "candidate_id", and isn't used for the fitness or fitness cache
+    """
     required_params = ['reference', 'temperature', 'pressure']
+    optional_params = ['candidate_id', 'screening']
 
     @staticmethod
     def grab_result(loc):
@@ -305,48 +963,390 @@ class EvaluateResult(fw.FiretaskBase):
             raise NotImplementedError
 
 
+    @staticmethod
+    def results_push(T, P, error, result):
+        """What is pushed to the candidate's ResultsFW"""
+        return {
+            'error': error,
+            'results_array': (T, P, result, 1, 1),
+            'evaluations': (T, P, error, result),
+        }
+
+    @instrumented
     def run_task(self, fw_spec):
         result = self.grab_result(fw_spec['simtree'])
 
         ref = self['reference']
         my_fitness = abs(result - ref) / ref
 
+        if self.get('screening', False):
+            return fw.FWAction(
+                stored_data={'error': my_fitness, 'screening': True},
+                mod_spec=[{
+                    '_push': {'screening': (self['candidate_id'],
+                                            self['temperature'],
+                                            self['pressure'],
+                                            my_fitness, result)},
+                }],
+            )
+
         return fw.FWAction(
             stored_data={'error': my_fitness},
             mod_spec=[{
-                '_push': {
-                    'error': my_fitness,
-                    'results_array': (self['temperature'],
-                                      self['pressure'],
-                                      result, 1, 1),
-                }
+                '_push': self.results_push(self['temperature'],
+                                           self['pressure'],
+                                           my_fitness, result),
+            }],
+        )
+
+
+def evaluate_job(job):
+    """Simulate one candidate at one condition, used by EvaluateBatch
+
+    Parameters
+    ----------
+    job : dict
+      with 'candidate_id', 'candidate', 'temperature', 'pressure',
+      'reference', 'ncycles', 'updater', 'template', 'simhash',
+      'scratch', 'stage_patterns' and 'allow_fail'
+
+    Returns
+    -------
+    candidate_id, T, P, error, result, failure
+      if the simulation failed, error is infinite, result is nan and
+      failure is the reason, otherwise failure is None
+    """
+    T, P = job['temperature'], job['pressure']
+    # each candidate in its own directory, as all share one launch dir
+    workdir = 'candidate_{}'.format(job['candidate_id'])
+
+    try:
+        os.makedirs(workdir, exist_ok=True)
+        fmt = formats.detect_format(job['template'])
+        sim_t = firetasks.CopyTemplate.copy_template(
+            workdir=workdir, simhash=job['simhash'],
+            template=job['template'], T=T, P=P, p_id=0)
+        firetasks.CopyTemplate.update_input(sim_t, fmt, T, P,
+                                            job['ncycles'])
+        ManipulateForcefield.update(sim_t, job['candidate'], job['updater'],
+                                    template=job['template'])
+        firetasks.RunSimulation(allow_fail=job['allow_fail']).run(
+            sim_t, scratch=job['scratch'],
+            stage_patterns=job['stage_patterns'])
+
+        result = EvaluateResult.grab_result(sim_t)
+    except Exception as e:
+        # one failure shouldn't lose the rest of the batch
+        return (job['candidate_id'], T, P, float('inf'), float('nan'),
+                '{}: {}'.format(type(e).__name__, e))
+
+    error = abs(result - job['reference']) / job['reference']
+
+    return job['candidate_id'], T, P, error, result, None
+
+
+@xs
+class EvaluateBatch(fw.FiretaskBase):
+    """Evaluate many candidates at every condition within one Firework
+
+    For short simulations, the overhead of a Firework for every
+    candidate and condition can be larger than the simulation itself.
+    This runs a block of candidates with a pool of local processes,
+    and replaces their Sims and PostSims, pushing the fitness and
+    evaluations of every candidate at once to PostGA.
+
+    The template, scratch and stage_patterns in the spec are used as
+    per CopyTemplate and RunSimulation.  A simulation which fails gives
+    its candidate an infinite error, rather than stopping the batch,
+    and isn't added to the fitness cache.
+
+    Takes:
+     - candidate_ids : which candidates to evaluate
+     - conditions : (T, P, ref) for each condition
+     - updater : updater reference or forcefield mapping
+    Optionally:
+     - ncycles : length of each simulation
+     - nprocs : number of processes, defaults to number of CPUs
+     - objectives : as per AssignFitness
+     - population_store, wf_name : read the fitness cache from this
+       store, rather than the spec
+     - allow_fail : as per RunSimulation
+    """
+    required_params = ['candidate_ids', 'conditions', 'updater']
+    optional_params = ['ncycles', 'nprocs', 'objectives',
+                       'population_store', 'wf_name', 'allow_fail']
+
+    @staticmethod
+    def collate(candidate_ids, evaluated, objectives=None):
+        """Turn results of each simulation into fitness of each candidate
+
+        Parameters
+        ----------
+        candidate_ids : list of int
+        evaluated : list of tuples
+          (candidate_id, T, P, error, result) for each simulation
+        objectives : list of tuples, optional
+          (T, P, objective index) for each condition
+
+        Returns
+        -------
+        fitness, evaluations : list, list
+          (candidate_id, fitness) and (candidate_id, [(T, P, error,
+          result), ...]) for each candidate, as AssignFitness gives.
+          Failed simulations count towards the fitness, but aren't in
+          the evaluations.
+        """
+        results = {cid: [] for cid in candidate_ids}
+        for cid, T, P, error, result in evaluated:
+            results[cid].append((T, P, error, result))
+
+        if objectives is None:
+            fitness = [(cid, sum(r[2] ** 2 for r in results[cid]))
+                       for cid in candidate_ids]
+        else:
+            fitness = [(cid, objective_values(results[cid], objectives))
+                       for cid in candidate_ids]
+        evaluations = [(cid, [r for r in results[cid] if np.isfinite(r[2])])
+                       for cid in candidate_ids]
+
+        return fitness, evaluations
+
+    @instrumented
+    def run_task(self, fw_spec):
+        cache = get_fitness_cache(self, fw_spec)
+        simhash = fw_spec.get('simhash', '')
+        updater = self['updater']
+        if isinstance(updater, str):
+            # may be kept with the original template, not the cached copy
+            updater = utils.locate_updater(updater, fw_spec['template'])
+
+        evaluated = []
+        jobs = []
+        for cid in self['candidate_ids']:
+            candidate = fw_spec['candidates'][cid]
+            for T, P, ref in self['conditions']:
+                found = CheckFitnessCache.lookup(cache, candidate, T, P)
+                if found is not None:
+                    evaluated.append((cid, T, P) + tuple(found))
+                    continue
+                jobs.append({
+                    'candidate_id': cid,
+                    'candidate': candidate,
+                    'temperature': T,
+                    'pressure': P,
+                    'reference': ref,
+                    'ncycles': self.get('ncycles', DEFAULT_NCYCLES),
+                    'updater': updater,
+                    'simhash': simhash,
+                    'scratch': fw_spec.get('scratch', None),
+                    'stage_patterns': fw_spec.get('stage_patterns', None),
+                    'allow_fail': self.get('allow_fail', False),
+                })
+
+        failed = []
+        if jobs:
+            nprocs = self.get('nprocs', None) or os.cpu_count() or 1
+            # once for the whole batch, rather than in every process
+            with firetasks.CopyTemplate.source_template(
+                    fw_spec, simhash) as template, phase('simulate'):
+                for job in jobs:
+                    job['template'] = template
+                with ProcessPoolExecutor(
+                        max_workers=min(nprocs, len(jobs))) as pool:
+                    for *done, failure in pool.map(evaluate_job, jobs):
+                        evaluated.append(tuple(done))
+                        if failure is not None:
+                            failed.append(done[:3] + [failure])
+
+        fitness, evaluations = self.collate(
+            self['candidate_ids'], evaluated,
+            objectives=self.get('objectives', None))
+
+        return fw.FWAction(
+            stored_data={'fitness': fitness, 'ncached': len(evaluated) -
+                         len(jobs), 'failed': failed},
+            mod_spec=[{
+                '_push_all': {
+                    'fitness': fitness,
+                    'evaluations': evaluations,
+                },
             }],
         )
 
+
 @xs
 class AssignFitness(fw.FiretaskBase):
-    """After all Simulations of a candidate done, assign Fitness"""
+    """After all Simulations of a candidate done, assign Fitness
+
+    Optionally:
+     - objectives : (T, P, objective index) for each condition, the
+       fitness is then a list of the sum of squared errors of each
+       objective, rather than a single sum
+     - steady_state : if True, the fitness and evaluations are instead
+       pushed together as "assigned" for SteadyStateUpdate
+    """
     required_params = ['candidate_id']
+    optional_params = ['objectives', 'steady_state']
 
+    @instrumented
     def run_task(self, fw_spec):
         my_id = self['candidate_id']
-        # final fitness is sum of square of errors
-        my_fitness = sum(v ** 2 for v in fw_spec['error'])
+        if self.get('objectives', None) is None:
+            # final fitness is sum of square of errors
+            my_fitness = sum(v ** 2 for v in fw_spec['error'])
+        elif any(np.isinf(v) for v in fw_spec['error']):
+            # wasn't promoted, see CheckPromoted
+            my_fitness = [float('inf')] * (
+                max(k for _, _, k in self['objectives']) + 1)
+        else:
+            my_fitness = objective_values(fw_spec.get('evaluations', []),
+                                          self['objectives'])
 
         f = (my_id, my_fitness)
 
+        if self.get('steady_state', False):
+            # kept apart from the evaluations of each condition
+            push = {'assigned': (my_fitness, fw_spec.get('evaluations', []))}
+        else:
+            push = {
+                'fitness': f,
+                'evaluations': (my_id, fw_spec.get('evaluations', [])),
+            }
+
         return fw.FWAction(
             stored_data={'fitness': f},
-            mod_spec=[{
-                '_push': {'fitness': f}
-            }],
+            mod_spec=[{'_push': push}],
+        )
+
 
+@xs
+class UpdateFitnessCache(fw.FiretaskBase):
+    """Add this generation's evaluations to the fitness cache
+
+    Optionally:
+     - population_store, wf_name, generation_id : add the evaluations
+       to this store, rather than passing on "fitness_cache"
+    """
+    optional_params = ['population_store', 'wf_name', 'generation_id']
+
+    @staticmethod
+    def update(cache, candidates, evaluations):
+        """Add new evaluations to the cache
+
+        Parameters
+        ----------
+        cache : dict
+          existing cache, modified in place
+        candidates : list of tuples
+          candidates of this generation, in candidate_id order
+        evaluations : list of tuples
+          (candidate_id, [(T, P, error, result), ...]) for each candidate
+
+        Returns
+        -------
+        cache : dict
+          the updated cache
+        """
+        for candidate_id, results in evaluations:
+            candidate = candidates[candidate_id]
+            key = cache_key(candidate)
+            for T, P, error, result in results:
+                # first evaluation is kept
+                cache.setdefault(cache_index(candidate, T, P),
+                                 [key, T, P, error, result])
+        return cache
+
+    @instrumented
+    def run_task(self, fw_spec):
+        if self.get('population_store', None) is not None:
+            # only this generation's entries, the store keeps the first
+            entries = self.update({}, fw_spec['candidates'],
+                                  fw_spec.get('evaluations', []))
+            store = get_population_store(self['population_store'])
+            with phase('store'):
+                store.add_evaluations(self['wf_name'],
+                                      self['generation_id'], entries)
+
+            return fw.FWAction(
+                stored_data={'fitness_cache_added': len(entries)},
+            )
+
+        cache = self.update(dict(fw_spec.get('fitness_cache', {})),
+                            fw_spec['candidates'],
+                            fw_spec.get('evaluations', []))
+
+        return fw.FWAction(
+            stored_data={'fitness_cache_size': len(cache)},
+            update_spec={'fitness_cache': cache},
+        )
+
+
+@xs
+class SpawnGeneration(fw.FiretaskBase):
+    """Create the next generation of the GA once this one has finished
+
+    Used so that only one generation is on the LaunchPad at a time.
+    Must follow Replacement, so that "parents" (or "generation_id")
+    is in the spec.
+    The new generation ends with another SpawnGeneration, until
+    "ngens" generations have been run.
+    """
+    required_params = ['generation_id', 'ngens', 'ncandidates', 'bounds',
+                       'conditions', 'ff_updater', 'wf_name']
+    optional_params = ['seed', 'surrogate', 'oversample', 'screening',
+                       'batch_size', 'population_store', 'objectives']
+
+    @instrumented
+    def run_task(self, fw_spec):
+        if self['generation_id'] > self['ngens']:
+            return fw.FWAction()
+
+        from .make_genetics import DEFAULT_OVERSAMPLE, make_generation_n
+        from .workflow_creator import inherit_options
+
+        fws = make_generation_n(
+            ncandidates=self['ncandidates'],
+            conditions=self['conditions'],
+            bounds=self['bounds'],
+            ff_updater=self['ff_updater'],
+            parent=None,
+            generation_id=self['generation_id'],
+            wf_name=self['wf_name'],
+            seed=self.get('seed', None),
+            surrogate=self.get('surrogate', None),
+            oversample=self.get('oversample', DEFAULT_OVERSAMPLE),
+            screening=self.get('screening', None),
+            batch_size=self.get('batch_size', None),
+            population_store=self.get('population_store', None),
+            objectives=self.get('objectives', None),
         )
+        inherit_options(fw_spec, fws)
+        # additions don't receive update_spec, so pass these on directly
+        pre, post = fws[0], fws[-1]
+        # one of these, depending on if there is a population store
+        for key in ('parents', 'generation_id'):
+            if key in fw_spec:
+                pre.spec[key] = fw_spec[key]
+        pre.spec['template'] = fw_spec['template']
+        if self.get('population_store', None) is None:
+            pre.spec['fitness_cache'] = fw_spec.get('fitness_cache', {})
+        settings = dict(self)
+        settings['generation_id'] = self['generation_id'] + 1
+        post.tasks.append(SpawnGeneration(**settings))
+
+        return fw.FWAction(additions=fw.Workflow(fws))
 
 
 @xs
 class Replacement(fw.FiretaskBase):
-    """Merge children and parents"""
+    """Merge children and parents
+
+    Optionally:
+     - population_store, wf_name, generation_id : keep the population in
+       this store rather than passing it on in the spec, only the
+       "generation_id" is passed on
+    """
+    optional_params = ['population_store', 'wf_name', 'generation_id']
     @staticmethod
     def collate(candidates, fitness):
         """Merge fitnesses and candidates into tuple Individuals
@@ -373,24 +1373,252 @@ class Replacement(fw.FiretaskBase):
 
     @staticmethod
     def replace(parents, candidates):
+        """Fittest of parents and candidates, sorted by fitness
+
+        With multiple objectives, individuals are ranked by Pareto front
+        and then crowding distance (NSGA-II)
+
+        Returns
+        -------
+        population : list
+          the best individuals, as many as there are candidates
+        """
         # final population size shouldn't change over time
         popsize = len(candidates)
 
         # parents is empty list in zeroth generation
-        together = sorted(parents + candidates, key=lambda x: x[1])  # .fitness
+        together = parents + candidates
+        if not together:
+            return []
+        # multi-objective fitness is ranked as in NSGA-II
+        fitness = crowded_key([x[1] for x in together])
+
+        # only the top popsize need sorting
+        if popsize < len(together):
+            best = np.argpartition(fitness, popsize - 1)[:popsize]
+        else:
+            best = np.arange(len(together))
+        best = best[np.argsort(fitness[best], kind='stable')]
 
-        # just return the top half
-        return together[:popsize]
+        return [together[i] for i in best]
 
+    @instrumented
     def run_task(self, fw_spec):
         # merge candidates and fitness
         children = self.collate(fw_spec['candidates'], fw_spec['fitness'])
-        new_parents = self.replace(fw_spec['parents'], children)
+
+        if self.get('population_store', None) is None:
+            new_parents = self.replace(fw_spec['parents'], children)
+
+            return fw.FWAction(
+                stored_data={
+                    'candidates': children,
+                    'population': new_parents,
+                },
+                update_spec={'parents': new_parents},
+            )
+
+        store = get_population_store(self['population_store'])
+        wf_name, gen_id = self['wf_name'], self['generation_id']
+        if fw_spec.get('generation_id', None) is not None:
+            parents = store.get_population(wf_name, fw_spec['generation_id'])
+        else:
+            # zeroth generation
+            parents = fw_spec.get('parents', [])
+        new_parents = self.replace(parents, children)
+
+        with phase('store'):
+            store.add_history(wf_name, gen_id, children)
+            store.put_population(wf_name, gen_id, new_parents)
 
         return fw.FWAction(
             stored_data={
-                'candidates': children,
-                'population': new_parents,
+                'best': new_parents[0] if new_parents else None,
             },
-            update_spec={'parents': new_parents},
+            update_spec={'generation_id': gen_id},
+        )
+
+
+@contextmanager
+def locked_population(path):
+    """Exclusive access to a steady state population file
+
+    Uses a POSIX lock on "<path>.lock", so works across nodes on
+    filesystems which support this (eg NFS with lockd)
+
+    Yields
+    ------
+    state : dict
+      contents of the population file, changes are written back
+    """
+    with open(path + '.lock', 'a') as lockfile:
+        fcntl.lockf(lockfile, fcntl.LOCK_EX)
+        try:
+            with open(path, 'r') as inf:
+                state = json.load(inf)
+
+            yield state
+
+            # write then move, so the file is never half written
+            with open(path + '.tmp', 'w') as out:
+                json.dump(state, out)
+            os.replace(path + '.tmp', path)
+        finally:
+            fcntl.lockf(lockfile, fcntl.LOCK_UN)
+
+
+@xs
+class InitSteadyState(fw.FiretaskBase):
+    """Create the population file for a steady state GA
+
+    Takes:
+     - population_file : path to create
+     - popsize : number of individuals kept in the population
+     - nstarted : number of candidates already launched
+    """
+    required_params = ['population_file', 'popsize', 'nstarted']
+
+    @instrumented
+    def run_task(self, fw_spec):
+        state = {
+            'popsize': self['popsize'],
+            'nstarted': self['nstarted'],
+            'nfinished': 0,
+            # [candidate, fitness] of the current population
+            'population': [],
+            # [candidate, fitness] of every evaluation, in order finished
+            'history': [],
+            'fitness_cache': {},
+        }
+        dirname = os.path.dirname(self['population_file'])
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(self['population_file'], 'w') as out:
+            json.dump(state, out)
+
+        return fw.FWAction()
+
+
+@xs
+class SteadyStateUpdate(fw.FiretaskBase):
+    """Add a finished candidate to the population and launch a new one
+
+    Used instead of generations, so that there is no barrier waiting
+    for every candidate to finish.  Must follow AssignFitness with
+    "steady_state" set.
+
+    Does:
+     - inserts this candidate into the population in the population
+       file, replacing the least fit if it is fitter
+     - unless "max_evaluations" candidates have been launched, breeds a
+       new candidate from the population and adds its Fireworks, ending
+       with another SteadyStateUpdate
+    """
+    required_params = ['population_file', 'candidate', 'max_evaluations',
+                       'bounds', 'conditions', 'ff_updater', 'wf_name']
+    optional_params = ['seed']
+
+    @staticmethod
+    def insert(population, popsize, candidate, fitness):
+        """Add an individual, keeping only the *popsize* fittest
+
+        Returns
+        -------
+        population : list
+          new list of [candidate, fitness]
+        """
+        population = population + [[list(candidate), fitness]]
+        population.sort(key=lambda x: x[1])
+
+        return population[:popsize]
+
+    @staticmethod
+    def breed(population, bounds, rng):
+        """Create a single new candidate from the population
+
+        Until there are two individuals to breed from, candidates are
+        chosen uniformly within the bounds
+
+        Returns
+        -------
+        candidate : list of float
+        """
+        bounds = np.array(bounds, dtype=float)
+        if len(population) < 2:
+            return rng.uniform(bounds[:, 0], bounds[:, 1]).tolist()
+
+        settings = VaryCandidates.default_params
+        parents = np.array(Tournament.tournament(population, rng=rng, n=2))
+        children = VaryCandidates.blend_crossover(
+            parents, bounds, settings['blend_probability'],
+            settings['blend_alpha'], rng)
+        children = VaryCandidates.gaussian_mutation(
+            children, bounds, settings['mutation_probability'],
+            settings['sigma_factor'], rng)
+
+        return children[0].tolist()
+
+    def launch(self, candidate, eval_id, fw_spec):
+        """Make Fireworks to evaluate a new candidate"""
+        from .make_genetics import make_sampling_stage
+        from .workflow_creator import inherit_options
+
+        sim_fws, final_fw = make_sampling_stage(
+            conditions=self['conditions'],
+            generation_id=eval_id,
+            candidate_id=0,
+            ff_updater=self['ff_updater'],
+            parent=None,
+            wf_name=self['wf_name'],
+            population_file=self['population_file'],
+        )
+        settings = dict(self)
+        settings['candidate'] = candidate
+        final_fw.tasks.append(SteadyStateUpdate(**settings))
+
+        fws = sim_fws + [final_fw]
+        inherit_options(fw_spec, fws)
+        # additions don't receive update_spec, so pass these on directly
+        for new in fws:
+            new.spec['candidates'] = [candidate]
+            new.spec['template'] = fw_spec['template']
+
+        return fws
+
+    @instrumented
+    def run_task(self, fw_spec):
+        # pushed by AssignFitness earlier in this Firework
+        fitness, evaluations = fw_spec['assigned'][-1]
+
+        with locked_population(self['population_file']) as state:
+            state['population'] = self.insert(
+                state['population'], state['popsize'],
+                self['candidate'], fitness)
+            state['history'].append([list(self['candidate']), fitness])
+            state['nfinished'] += 1
+            state['fitness_cache'] = UpdateFitnessCache.update(
+                state['fitness_cache'], [self['candidate']],
+                [(0, evaluations)])
+
+            if state['nstarted'] < self['max_evaluations']:
+                eval_id = state['nstarted']
+                seed = self.get('seed', None)
+                rng = make_rng(None if seed is None else [seed, eval_id])
+                child = self.breed(state['population'], self['bounds'], rng)
+                state['nstarted'] += 1
+            else:
+                child = None
+            stored = {
+                'nfinished': state['nfinished'],
+                'best': state['population'][0],
+            }
+
+        if child is None:
+            return fw.FWAction(stored_data=stored)
+
+        fws = self.launch(child, eval_id, fw_spec)
+
+        return fw.FWAction(
+            stored_data=stored,
+            additions=fw.Workflow(fws),
         )
@@ -9,6 +9,7 @@ import shutil
 import subprocess
 
 from . import raspatools
+from .instrument import instrumented
 
 
 @xs
@@ -95,6 +96,7 @@ class PrepareGridInput(fw.FiretaskBase):
         with open('stderr', 'wb') as outf:
             outf.write(p.stderr)
 
+    @instrumented
     def run_task(self, fw_spec):
         if not self.grid_exists(fw_spec):
             target = self.create_grid_input(fw_spec)
@@ -106,6 +108,7 @@ class RmGrid(fw.FiretaskBase):
     # at end of workflow, get rid of grid to save space
     required_params = ['raspa_dir', 'structure_name']
 
+    @instrumented
     def run_task(self, fw_spec):
         grid_dir = os.path.join(self['raspa_dir'], 'share', 'raspa', 'grids')
 
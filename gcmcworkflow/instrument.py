@@ -0,0 +1,301 @@
+"""Recording where time and resources go within Firetasks
+
+Decorating ``run_task`` with ``instrumented`` measures the whole task,
+and ``phase`` can be used within a task to break this down further::
+
+    @xs
+    class MyTask(fw.FiretaskBase):
+        @instrumented
+        def run_task(self, fw_spec):
+            with phase('copy'):
+                ...
+            with phase('parse'):
+                ...
+
+For each phase the wall time, CPU time (including any subprocesses),
+peak resident memory and bytes read and written are recorded.  The
+peak memory is that of this process (not subprocesses) while the phase
+ran, found by resetting the kernel's high water mark on Linux.  Where
+this can't be reset only the resident memory at the start and end of
+the phase is seen, and elsewhere it is not recorded.  These
+are added to the ``stored_data`` of the returned FWAction under
+"timings_<TaskName>", so each task in a Firework keeps its own entry,
+and can be gathered across a Workflow with
+``launchpad_utils.get_workflow_timings``.
+
+If "profile" is set in the Firework spec, instrumented tasks are also
+run under cProfile.  The profile is written next to the simulation (or
+into the workdir) as "profile_<TaskName>_<time>_<pid>.prof" and can be
+read with ``pstats`` or viewers such as snakeviz.
+"""
+from contextlib import contextmanager
+import cProfile
+import functools
+import os
+import threading
+import time
+
+import fireworks as fw
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = False
+
+
+# prefix of stored_data keys holding timings
+TIMINGS_KEY = 'timings_'
+# prefix of stored_data keys holding path to profile
+PROFILE_KEY = 'profile_'
+
+_active = threading.local()
+
+
+def _io_counters():
+    """Bytes read and written by this process and reaped children"""
+    try:
+        with open('/proc/self/io', 'r') as inf:
+            counters = dict(line.split(':') for line in inf if ':' in line)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource:
+        # fall back to block operations, assumed to be 512 bytes
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return ((self_usage.ru_inblock + child_usage.ru_inblock) * 512,
+                (self_usage.ru_oublock + child_usage.ru_oublock) * 512)
+    return 0, 0
+
+
+def _memory_status():
+    """Current and peak resident memory of this process, in kB
+
+    Returns (None, None) where /proc is not available
+    """
+    try:
+        with open('/proc/self/status', 'r') as inf:
+            status = dict(line.split(':', 1) for line in inf if ':' in line)
+        return (int(status['VmRSS'].split()[0]),
+                int(status['VmHWM'].split()[0]))
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _reset_peak():
+    """Reset the peak resident memory of this process to its current value
+
+    Returns
+    -------
+    success : bool
+      if False, VmHWM remains the peak over the lifetime of the process
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as out:
+            out.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _open_peaks():
+    """Peak memory (kB) of each phase currently running in this thread"""
+    if not hasattr(_active, 'peaks'):
+        _active.peaks = []
+    return _active.peaks
+
+
+def _update_peaks(peak):
+    peaks = _open_peaks()
+    for i, p in enumerate(peaks):
+        if p is not None:
+            peaks[i] = max(p, peak)
+
+
+def _start_peak():
+    """Begin tracking peak memory for a new phase
+
+    The kernel's high water mark is folded into any enclosing phases
+    before being reset, so that nested phases don't hide their peaks.
+    """
+    rss, hwm = _memory_status()
+    if rss is None:
+        _open_peaks().append(None)
+        return
+    if _reset_peak():
+        _update_peaks(hwm)
+    else:
+        # can't isolate the peak, use current usage as a lower bound
+        hwm = rss
+    _open_peaks().append(hwm)
+
+
+def _end_peak():
+    """Finish tracking the innermost phase
+
+    Returns
+    -------
+    peak : float or None
+      largest resident memory of this process during the phase in MB,
+      or None if this couldn't be measured
+    """
+    rss, hwm = _memory_status()
+    if rss is not None:
+        _update_peaks(hwm if _reset_peak() else rss)
+    peak = _open_peaks().pop()
+    if peak is None:
+        return None
+    return peak / 1024.
+
+
+def snapshot():
+    """Current resource counters
+
+    Returns
+    -------
+    usage : dict
+      wall and cpu time in seconds, bytes read and written
+    """
+    t = os.times()
+    read, written = _io_counters()
+
+    return {
+        'wall': time.perf_counter(),
+        'cpu': t.user + t.system + t.children_user + t.children_system,
+        'read': read,
+        'written': written,
+    }
+
+
+class Recorder(object):
+    """Resource usage of each phase of a task
+
+    Attributes
+    ----------
+    timings : dict
+      mapping of phase name to dict of 'wall', 'cpu' (seconds),
+      'peak_rss_mb', 'read_bytes', 'written_bytes' and 'count'.
+      Repeated phases are summed together, except for 'peak_rss_mb'
+      which is the largest seen.
+    """
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = snapshot()
+        _start_peak()
+        try:
+            yield
+        finally:
+            peak = _end_peak()
+            end = snapshot()
+            record = self.timings.setdefault(name, {
+                'wall': 0.0, 'cpu': 0.0, 'peak_rss_mb': None,
+                'read_bytes': 0, 'written_bytes': 0, 'count': 0,
+            })
+            record['wall'] += end['wall'] - start['wall']
+            record['cpu'] += end['cpu'] - start['cpu']
+            record['read_bytes'] += end['read'] - start['read']
+            record['written_bytes'] += end['written'] - start['written']
+            if peak is not None:
+                record['peak_rss_mb'] = max(record['peak_rss_mb'] or 0.0,
+                                            peak)
+            record['count'] += 1
+
+
+def _stack():
+    if not hasattr(_active, 'stack'):
+        _active.stack = []
+    return _active.stack
+
+
+@contextmanager
+def phase(name):
+    """Record resource usage of a block within the running task
+
+    Does nothing if no instrumented task is running
+    """
+    stack = _stack()
+    if not stack:
+        yield
+    else:
+        with stack[-1].phase(name):
+            yield
+
+
+def wants_profile(setting, taskname):
+    """Check if the "profile" spec setting applies to a task
+
+    Parameters
+    ----------
+    setting : bool or list of str
+      either True to profile every task, or names of tasks to profile
+    taskname : str
+      name of the Firetask class
+    """
+    if isinstance(setting, (list, tuple)):
+        return taskname in setting
+    return bool(setting)
+
+
+def profile_path(task, fw_spec):
+    """Where to write the profile of *task*
+
+    Next to the simulation if there is one, otherwise in the task's
+    workdir or the launch directory.
+    """
+    simtree = fw_spec.get('simtree', None)
+    if simtree is not None and os.path.isdir(simtree):
+        outdir = simtree
+    else:
+        outdir = task.get('workdir', None) or os.getcwd()
+
+    filename = '{}{}_{}_{}.prof'.format(
+        PROFILE_KEY, type(task).__name__,
+        time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+
+    return os.path.join(os.path.abspath(outdir), filename)
+
+
+def instrumented(run_task):
+    """Decorate a Firetask's run_task to record its resource usage
+
+    The usage of the entire task is recorded as the "total" phase.
+    If requested in the spec, the task is also profiled.
+    """
+    @functools.wraps(run_task)
+    def wrapper(self, fw_spec):
+        taskname = type(self).__name__
+        stack = _stack()
+        # only one profiler can run at once, so nested tasks aren't profiled
+        if not stack and wants_profile(fw_spec.get('profile', False),
+                                       taskname):
+            profiler = cProfile.Profile()
+        else:
+            profiler = None
+
+        recorder = Recorder()
+        stack.append(recorder)
+        try:
+            with recorder.phase('total'):
+                if profiler is None:
+                    action = run_task(self, fw_spec)
+                else:
+                    action = profiler.runcall(run_task, self, fw_spec)
+        finally:
+            stack.pop()
+            if profiler is not None:
+                # written even on failure, as that is when it's needed
+                path = profile_path(self, fw_spec)
+                profiler.dump_stats(path)
+
+        if action is None:
+            action = fw.FWAction()
+        action.stored_data[TIMINGS_KEY + taskname] = recorder.timings
+        if profiler is not None:
+            action.stored_data[PROFILE_KEY + taskname] = path
+
+        return action
+
+    return wrapper
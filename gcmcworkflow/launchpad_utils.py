@@ -1,10 +1,15 @@
 # functions for querying the launchpad
 from collections import defaultdict
+import datetime
 import fireworks as fw
+import inspect
+import pymongo
 import re
+import time
 import yaml
 
-from .utils import NAME_PATTERN, SIM_GRAB, parse_sim_path
+from .instrument import TIMINGS_KEY
+from .utils import NAME_PATTERN, SIM_GRAB
 
 
 def read_lpad_spec(path):
@@ -46,23 +51,91 @@ def get_lpad(spec=None):
     return fw.LaunchPad(**lpad_spec)
 
 
+def ensure_indexes(lp):
+    """Create the index used to look up GCMCWorkflows by name
+
+    The index is unique, so two GCMCWorkflows can't share a name,
+    other Workflows on the LaunchPad are not affected.
+    """
+    lp.workflows.create_index(
+        [('name', pymongo.ASCENDING),
+         ('metadata.GCMCWorkflow', pymongo.ASCENDING)],
+        unique=True,
+        partialFilterExpression={'metadata.GCMCWorkflow': True},
+        name='gcmcworkflow_name',
+    )
+
+
+def workflow_exists(wfname, lp=None, lpspec=None):
+    """Check if a GCMCWorkflow called *wfname* is on the LaunchPad"""
+    if lp is None:
+        lp = get_lpad(lpspec)
+
+    return lp.workflows.find_one(
+        {'name': wfname, 'metadata.GCMCWorkflow': True},
+        {'_id': True},
+    ) is not None
+
+
 def submit_workflow(workflow, lp=None, lpspec=None):
     """Add a Workflow to LaunchPad, checking for duplicate names"""
     if lp is None:
         lp = get_lpad(lpspec)
 
-    if not workflow.name in get_workflow_names(lp):
+    ensure_indexes(lp)
+
+    if not workflow_exists(workflow.name, lp):
         lp.add_wf(workflow)
     else:
         raise ValueError("Duplicate workflow name")
 
 
+def submit_workflows(workflows, lp=None, lpspec=None, batch_size=100):
+    """Add many Workflows to LaunchPad, checking for duplicate names
+
+    Workflows are inserted *batch_size* at a time, with all of their
+    Fireworks written together rather than one at a time.
+
+    Parameters
+    ----------
+    workflows : list of fw.Workflow
+      Workflows to add
+    batch_size : int, optional
+      number of Workflows to insert in each write
+
+    Raises
+    ------
+    ValueError
+      if any names are repeated or already on the LaunchPad, in which
+      case nothing is added
+    """
+    if lp is None:
+        lp = get_lpad(lpspec)
+
+    ensure_indexes(lp)
+
+    names = [wf.name for wf in workflows]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate workflow name")
+    existing = lp.workflows.find(
+        {'name': {'$in': names}, 'metadata.GCMCWorkflow': True},
+        {'name': True},
+    )
+    existing = sorted(entry['name'] for entry in existing)
+    if existing:
+        raise ValueError("Duplicate workflow name(s): {}"
+                         "".format(', '.join(existing)))
+
+    for i in range(0, len(workflows), batch_size):
+        lp.bulk_add_wfs(workflows[i:i + batch_size])
+
+
 def get_workflow_names(lp=None, lpspec=None):
     """Return list of defined wf names"""
     if lp is None:
         lp = get_lpad(lpspec)
 
-    wfs = lp.workflows.find({'metadata': {'GCMCWorkflow': True}},
+    wfs = lp.workflows.find({'metadata.GCMCWorkflow': True},
                             {'name': True})  # retrieve only names
 
     return [entry['name'] for entry in wfs]
@@ -73,47 +146,312 @@ def get_workflow(wfname, lp=None, lpspec=None):
     if lp is None:
         lp = get_lpad(lpspec)
 
-    return lp.workflows.find_one({'metadata': {'GCMCWorkflow': True},
+    return lp.workflows.find_one({'metadata.GCMCWorkflow': True,
                                   'name': wfname})
 
 
-def get_workflow_report(wfname, lp=None, lpspec=None):
-    if lp is None:
-        lp = get_lpad(lpspec)
+# Fireworks which belong to a single sampling point
+POINT_PATTERN = re.compile(r'^(?:Sim|PostProcess|Analyse) ')
+POINT_GRAB = re.compile(r'^(Sim|PostProcess|Analyse) T=(\S+) P=(\S+)')
 
-    wf = get_workflow(wfname, lp)
 
-    # make report for check cli
-    # grab sim fireworks from this workflow
-    sims = lp.fireworks.find(
-        {'fw_id': {'$in': wf['nodes']}, 'name': NAME_PATTERN},
-        {'spec': True, 'state': True, 'fw_id': True},
-    )
+def _latest_sims(lp, fw_ids, since=None):
+    """Find the last generation of Sim Firework for each (T, P, v)
 
-    # find the last generation for each (T, P, v)
-    finals = dict()
-    for sim in sims:
-        details = parse_sim_path(sim['spec']['simtree'])
-        key = (details.T, details.P, details.parallel_id)
+    Restarts are added later so always have a larger fw_id
 
-        if not key in finals:
-            finals[key] = sim
-        else:
-            other = finals[key]
+    Parameters
+    ----------
+    lp : fw.LaunchPad
+    fw_ids : list of int
+      Fireworks to search within
+    since : datetime, optional
+      only consider Fireworks updated at or after this time
+
+    Returns
+    -------
+    sims : list of dict
+      with the Sim name as '_id', and fw_id, state and updated_on
+    """
+    match = {'fw_id': {'$in': fw_ids}, 'name': NAME_PATTERN}
+    if since is not None:
+        match['updated_on'] = {'$gte': since}
+
+    return list(lp.fireworks.aggregate([
+        {'$match': match},
+        {'$project': {'_id': False, 'fw_id': True, 'name': True,
+                      'state': True, 'updated_on': True}},
+        {'$sort': {'fw_id': -1}},
+        {'$group': {'_id': '$name',
+                    'fw_id': {'$first': '$fw_id'},
+                    'state': {'$first': '$state'},
+                    'updated_on': {'$first': '$updated_on'}}},
+    ]))
+
+
+def _find_lost(lp, sims):
+    """Return fw_ids of lost runs amongst *sims*"""
+    # only running Fireworks can be lost, so only check those
+    running = [sim['fw_id'] for sim in sims if sim['state'] == 'RUNNING']
+    if not running:
+        return []
+
+    if 'query' in inspect.signature(lp.detect_lostruns).parameters:
+        _, lost_ids, _ = lp.detect_lostruns(
+            query={'fw_id': {'$in': running}})
+    else:
+        # Fireworks < 1.8.0 can only check the entire LaunchPad
+        _, lost_ids, _ = lp.detect_lostruns()
+        running = set(running)
+        lost_ids = [fw_id for fw_id in lost_ids if fw_id in running]
+
+    return lost_ids
 
-            finals[key] = max(
-                sim, other,
-                key=lambda x: parse_sim_path(x['spec']['simtree']).gen_id)
 
+def _build_status(sims, lost_ids):
+    """Collect states of *sims* according to their conditions"""
     status = defaultdict(list)
 
-    _, lost_ids, _ = lp.detect_lostruns()
+    for sim in sims:
+        match = SIM_GRAB.match(sim['_id'])
+        if match is None:
+            continue
+        T, P, _ = match.groups()
 
-    for (T, P, v), sim in finals.items():
         if sim['fw_id'] in lost_ids:
             state = 'LOST'
         else:
             state = sim['state']
-        status[T, P].append(state)
+        status[float(T), float(P)].append(state)
 
     return status
+
+
+def get_workflow_report(wfname, lp=None, lpspec=None):
+    """Get the state of every simulation in a Workflow
+
+    Parameters
+    ----------
+    wfname : str
+      name of the GCMCWorkflow
+
+    Returns
+    -------
+    status : dict
+      mapping of (T, P) to list of states for each parallel simulation
+    """
+    if lp is None:
+        lp = get_lpad(lpspec)
+
+    wf = lp.workflows.find_one({'metadata.GCMCWorkflow': True,
+                                'name': wfname},
+                               {'nodes': True})
+
+    finals = _latest_sims(lp, wf['nodes'])
+
+    return _build_status(finals, _find_lost(lp, finals))
+
+
+def follow_workflow_report(wfname, lp=None, lpspec=None, interval=10.0):
+    """Follow the state of every simulation in a Workflow
+
+    After the first full report, only Fireworks updated since the
+    previous check are fetched, so following a Workflow is cheap.
+
+    Parameters
+    ----------
+    wfname : str
+      name of the GCMCWorkflow
+    interval : float, optional
+      seconds to wait between checking for changes
+
+    Yields
+    ------
+    status : dict
+      mapping of (T, P) to list of states for each parallel simulation,
+      yielded initially and then each time a state changes
+    """
+    if lp is None:
+        lp = get_lpad(lpspec)
+
+    query = {'metadata.GCMCWorkflow': True, 'name': wfname}
+    wf = lp.workflows.find_one(query, {'nodes': True, 'updated_on': True})
+
+    latest = {sim['_id']: sim for sim in _latest_sims(lp, wf['nodes'])}
+    lost_ids = _find_lost(lp, latest.values())
+    yield _build_status(latest.values(), lost_ids)
+
+    while True:
+        time.sleep(interval)
+
+        # pick up Fireworks added by restarts since we last looked
+        newer = lp.workflows.find_one(
+            dict(query, updated_on={'$gt': wf['updated_on']}),
+            {'nodes': True, 'updated_on': True})
+        if newer is not None:
+            wf = newer
+
+        changed = False
+        since = max((sim['updated_on'] for sim in latest.values()),
+                    default=None)
+        for sim in _latest_sims(lp, wf['nodes'], since=since):
+            old = latest.get(sim['_id'], None)
+            # either a new generation, or this generation changed state
+            if (old is None or sim['fw_id'] > old['fw_id'] or
+                (sim['fw_id'] == old['fw_id'] and
+                 sim['state'] != old['state'])):
+                latest[sim['_id']] = sim
+                changed = True
+
+        new_lost = _find_lost(lp, latest.values())
+        if changed or set(new_lost) != set(lost_ids):
+            lost_ids = new_lost
+            yield _build_status(latest.values(), lost_ids)
+
+
+def get_campaign_summary(lp=None, lpspec=None, now=None):
+    """Summarise the progress of every GCMCWorkflow on the LaunchPad
+
+    Uses three queries regardless of the number of Workflows.  Fireworks
+    are found by their "_category" rather than by listing every fw_id,
+    which would exceed the size limit of a query on a large campaign.
+
+    Parameters
+    ----------
+    now : datetime, optional
+      current time, used for estimating time to completion
+
+    Returns
+    -------
+    summary : list of dict
+      one entry per Workflow, with the number of sampling points which are
+      completed, running, fizzled and waiting, the CPU hours used so far
+      (assuming one core per Firework) and an estimate of the hours until
+      completion (None until a point has completed)
+    """
+    if lp is None:
+        lp = get_lpad(lpspec)
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    wfs = list(lp.workflows.find({'metadata.GCMCWorkflow': True},
+                                 {'name': True, 'created_on': True}))
+    wfnames = [wf['name'] for wf in wfs]
+
+    # latest generation of each Sim, PostProcess and Analyse
+    latest = lp.fireworks.aggregate([
+        {'$match': {'spec._category': {'$in': wfnames},
+                    'name': POINT_PATTERN}},
+        {'$project': {'_id': False, 'fw_id': True, 'name': True,
+                      'state': True, 'wfname': '$spec._category'}},
+        {'$sort': {'fw_id': -1}},
+        {'$group': {'_id': {'wfname': '$wfname', 'name': '$name'},
+                    'state': {'$first': '$state'}}},
+    ])
+    # states of each kind of Firework for each point
+    points = defaultdict(lambda: defaultdict(list))
+    for entry in latest:
+        match = POINT_GRAB.match(entry['_id']['name'])
+        if match is None:
+            continue
+        kind, T, P = match.groups()
+        points[entry['_id']['wfname'], T, P][kind].append(entry['state'])
+
+    runtimes = lp.fireworks.aggregate([
+        {'$match': {'spec._category': {'$in': wfnames}}},
+        {'$project': {'_id': False, 'fw_id': True,
+                      'wfname': '$spec._category'}},
+        {'$lookup': {'from': lp.launches.name, 'localField': 'fw_id',
+                     'foreignField': 'fw_id', 'as': 'launch'}},
+        {'$unwind': '$launch'},
+        {'$group': {'_id': '$wfname',
+                    'runtime': {'$sum': '$launch.runtime_secs'}}},
+    ])
+    cpu_secs = defaultdict(float)
+    for entry in runtimes:
+        cpu_secs[entry['_id']] += entry['runtime'] or 0.0
+
+    counts = {wf['name']: dict(completed=0, running=0, fizzled=0, waiting=0)
+              for wf in wfs}
+    for (wfname, T, P), kinds in points.items():
+        if wfname not in counts:
+            continue
+        if 'COMPLETED' in kinds['Analyse']:
+            state = 'completed'
+        elif 'FIZZLED' in kinds['Analyse'] + kinds['PostProcess']:
+            state = 'fizzled'
+        elif not kinds['PostProcess'] and 'FIZZLED' in kinds['Sim']:
+            # fused runs do their own PostProcess, so can't fail quietly
+            state = 'fizzled'
+        elif 'RUNNING' in kinds['Sim']:
+            state = 'running'
+        else:
+            state = 'waiting'
+        counts[wfname][state] += 1
+
+    summary = []
+    for wf in wfs:
+        c = counts[wf['name']]
+        total = sum(c.values())
+        if c['completed'] and wf.get('created_on', None) is not None:
+            # assume remaining points take as long as those done so far
+            elapsed = (now - wf['created_on']).total_seconds() / 3600.
+            eta = elapsed * (total - c['completed']) / c['completed']
+        else:
+            eta = None
+        summary.append(dict(
+            name=wf['name'],
+            points=total,
+            cpu_hours=cpu_secs[wf['name']] / 3600.,
+            eta_hours=eta,
+            **c
+        ))
+
+    return sorted(summary, key=lambda x: x['name'])
+
+
+def get_workflow_timings(wfname, lp=None, lpspec=None):
+    """Resource usage of each phase of each task in a Workflow
+
+    Gathers the timings recorded by instrumented Firetasks
+
+    Returns
+    -------
+    timings : list of dict
+      one entry per (task, phase), with the number of times this was run,
+      total 'wall' and 'cpu' seconds, largest 'peak_rss_mb' and total
+      'read_bytes' and 'written_bytes'.  Sorted by wall time, largest first
+    """
+    if lp is None:
+        lp = get_lpad(lpspec)
+
+    wf = lp.workflows.find_one({'metadata.GCMCWorkflow': True,
+                                'name': wfname}, {'nodes': True})
+    if wf is None:
+        raise ValueError("Workflow '{}' not found".format(wfname))
+
+    launches = lp.launches.find({'fw_id': {'$in': wf['nodes']}},
+                                {'action.stored_data': True})
+
+    totals = {}
+    for launch in launches:
+        stored = (launch.get('action', None) or {}).get('stored_data', {})
+        for key, phases in stored.items():
+            if not key.startswith(TIMINGS_KEY):
+                continue
+            task = key[len(TIMINGS_KEY):]
+            for name, record in phases.items():
+                entry = totals.setdefault((task, name), {
+                    'task': task, 'phase': name, 'count': 0,
+                    'wall': 0.0, 'cpu': 0.0, 'peak_rss_mb': 0.0,
+                    'read_bytes': 0, 'written_bytes': 0,
+                })
+                entry['count'] += record['count']
+                entry['wall'] += record['wall']
+                entry['cpu'] += record['cpu']
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'],
+                                           record['peak_rss_mb'] or 0.0)
+                entry['read_bytes'] += record['read_bytes']
+                entry['written_bytes'] += record['written_bytes']
+
+    return sorted(totals.values(), key=lambda x: x['wall'], reverse=True)
@@ -1,7 +1,11 @@
 """Functions for creating GAFW Fireworks"""
 import fireworks as fw
+import os
 
+from . import DEFAULT_NCYCLES
 from . import utils
+from .template_store import get_store
+from .workflow_creator import apply_options
 from .firetasks import (
     InitTemplate,
     CopyTemplate,
@@ -10,18 +14,86 @@ from .firetasks import (
 )
 from .genetics import (
     AssignFitness,
+    CheckFitnessCache,
+    CheckPromoted,
+    EvaluateBatch,
     InitPopulation,
+    InitSteadyState,
     PassAlong,
+    Promote,
     Tournament,
     VaryCandidates,
     ManipulateForcefield,
     EvaluateResult,
     Replacement,
+    SpawnGeneration,
+    SteadyStateUpdate,
+    SurrogateScreen,
+    UpdateFitnessCache,
 )
 
 
+# how many more candidates are bred than simulated when pre-screening
+DEFAULT_OVERSAMPLE = 4
+# defaults for successive halving, see make_screening_stage
+DEFAULT_SCREENING = dict(
+    # fraction of candidates promoted to full simulations
+    fraction=0.5,
+    # length of screening simulations
+    ncycles=DEFAULT_NCYCLES // 10,
+)
+
+
+def objective_settings(objectives, conditions):
+    """Assign each condition to an objective
+
+    Parameters
+    ----------
+    objectives : str or list of int
+      either 'temperature', so that each isotherm is an objective, or
+      the index of the objective of each condition
+    conditions : tuple of tuples
+      (T, P, ref) of each condition
+
+    Returns
+    -------
+    objectives : list of tuples
+      (T, P, objective index) for each condition, as AssignFitness takes
+    """
+    if objectives == 'temperature':
+        temperatures = sorted({T for T, _, _ in conditions})
+        objectives = [temperatures.index(T) for T, _, _ in conditions]
+    elif len(objectives) != len(conditions):
+        raise ValueError("Need an objective for each of the {} conditions"
+                         "".format(len(conditions)))
+
+    return [(T, P, int(k)) for (T, P, _), k in zip(conditions, objectives)]
+
+
+def screening_settings(screening, conditions):
+    """Fill in defaults for successive halving
+
+    Parameters
+    ----------
+    screening : dict
+      any of 'fraction', 'ncycles' and 'conditions' (the subset of
+      conditions to screen at, defaults to all)
+    conditions : tuple of tuples
+      all conditions of the optimisation
+
+    Returns
+    -------
+    settings : dict
+    """
+    settings = dict(DEFAULT_SCREENING, conditions=conditions)
+    settings.update(screening)
+
+    return settings
+
+
 # run once at start of GA
-def Firstgen_PreGA_FW(template, pop, wf_name):
+def Firstgen_PreGA_FW(template, pop, wf_name, template_store=None,
+                      updaters=None):
     """Variant of PreGA for the zeroth generation
 
     Parameters
@@ -32,18 +104,34 @@ def Firstgen_PreGA_FW(template, pop, wf_name):
       description of the initial population
     wf_name : str
       unique key to refer to this workflow by
+    template_store : str, optional
+      location of a template store, if given only the hash of the template
+      is kept in the Firework
+    updaters : dict, optional
+      pickled updaters from utils.register_updater, to write alongside
+      the template
 
     Returns
     -------
     firstgen_prega : fireworks.Firework
       Firework for the setup of GA
     """
-    stuff = utils.slurp_directory(template)
+    stuff = utils.slurp_tree(template)
+
+    if template_store is not None:
+        init = InitTemplate(
+            template_hash=get_store(template_store).put(stuff),
+            template_store=template_store,
+        )
+    else:
+        init = InitTemplate(contents=stuff)
+    if updaters:
+        init['updaters'] = updaters
 
     return fw.Firework(
         [
         # creates template
-        InitTemplate(contents=stuff),
+        init,
         # creates candidates and population
         InitPopulation(initial_population=pop),
         ],
@@ -54,7 +142,9 @@ def Firstgen_PreGA_FW(template, pop, wf_name):
     )
 
 
-def PreGA_FW(parent, idx, bounds, wf_name):
+def PreGA_FW(parent, idx, bounds, wf_name, seed=None, ncandidates=None,
+             surrogate=None, oversample=DEFAULT_OVERSAMPLE,
+             population_store=None):
     """Operations to set up candidates
 
     Parameters
@@ -68,19 +158,55 @@ def PreGA_FW(parent, idx, bounds, wf_name):
       eg `((1.0, 2.0), (10.0, 20.0))` clamps the first value between 1.0 and 2.0
     wf_name : str
       unique key to refer to this workflow by
+    seed : int, optional
+      seed for the random number generators of the GA operators
+    ncandidates : int, optional
+      number of candidates to create, required if using a surrogate
+    surrogate : str, optional
+      if given, breed *oversample* times too many candidates and use
+      this type of model ('gp' or 'forest') to keep the most promising
+    oversample : int, optional
+      how many candidates are bred for each one kept by the surrogate
+    population_store : str, optional
+      location of the population store to read parents (and the fitness
+      cache) from
 
     Returns
     -------
     prega : fireworks.Firework
     """
+    tournament_settings = {}
     settings = VaryCandidates.default_params.copy()
     settings['bounds'] = bounds
+    screen_settings = dict(ncandidates=ncandidates, bounds=bounds,
+                           model=surrogate)
+    if seed is not None:
+        # different, reproducible, streams for each generation and task
+        tournament_settings['seed'] = [seed, idx, 0]
+        settings['seed'] = [seed, idx, 1]
+        screen_settings['seed'] = [seed, idx, 2]
+    if surrogate is not None:
+        tournament_settings['n'] = ncandidates * oversample
+    if population_store is not None:
+        tournament_settings['population_store'] = population_store
+        tournament_settings['wf_name'] = wf_name
+        screen_settings['population_store'] = population_store
+        screen_settings['wf_name'] = wf_name
+        # fitness cache is in the store too
+        passed = ['template', 'generation_id']
+    else:
+        passed = ['template', 'parents', 'fitness_cache']
+
+    tasks = [
+        Tournament(**tournament_settings),
+        VaryCandidates(**settings),
+    ]
+    if surrogate is not None:
+        tasks.append(SurrogateScreen(**screen_settings))
+    tasks.append(PassAlong(keys=passed))
+
     return fw.Firework(
-        [
-            Tournament(),
-            VaryCandidates(**settings),
-            PassAlong(keys=['template', 'parents']),
-        ],
+        tasks,
         spec={
             '_category': wf_name,
         },
@@ -89,8 +215,20 @@ def PreGA_FW(parent, idx, bounds, wf_name):
     )
 
 
+def _cache_settings(wf_name, population_file=None, population_store=None):
+    """Where CheckFitnessCache should find the fitness cache"""
+    settings = {}
+    if population_file is not None:
+        settings['population_file'] = population_file
+    if population_store is not None:
+        settings['population_store'] = population_store
+        settings['wf_name'] = wf_name
+    return settings
+
+
 def Sim_FW(temperature, pressure, ref, generation_id, candidate_id, ff_updater,
-           parent, wf_name):
+           parent, wf_name, screened=False, population_file=None,
+           population_store=None):
     """Generate a single simulation Firework
 
     Parameters
@@ -105,25 +243,50 @@ def Sim_FW(temperature, pressure, ref, generation_id, candidate_id, ff_updater,
       id of the generation
     candidate_id : int
       which candidate this simulation refers to
-    ff_updater : function
-      function which does the manipulation of forcefield files
+    ff_updater : function or str
+      function which does the manipulation of forcefield files, or a
+      reference to one from utils.register_updater
     parent : fw.Firework
       the preceeding Firework to this Firework
     wf_name : str
       unique key to refer to this workflow by
+    screened : bool, optional
+      if the candidate was screened, in which case this is only run
+      if it was promoted
+    population_file : str, optional
+      steady state population file holding the fitness cache
+    population_store : str, optional
+      location of the population store holding the fitness cache
 
     Returns
     -------
     sim : fireworks.Firework
     """
-    # convert python function to pickle form
-    ff_updater = utils.pickle_func(ff_updater)
+    # convert python function to a reference, if not already
+    ff_updater = utils.register_updater(ff_updater)
+
+    tasks = [
+        # skips the rest if this candidate has been done before
+        CheckFitnessCache(
+            candidate_id=candidate_id,
+            temperature=temperature,
+            pressure=pressure,
+            **_cache_settings(wf_name, population_file, population_store)
+        ),
+    ]
+    if screened:
+        tasks.append(CheckPromoted(
+            candidate_id=candidate_id,
+            temperature=temperature,
+            pressure=pressure,
+        ))
 
     return fw.Firework(
-        [
+        tasks + [
             CopyTemplate(
                 temperature=temperature,
                 pressure=pressure,
+                ncycles=DEFAULT_NCYCLES,
                 parallel_id=generation_id,
             ),
             ManipulateForcefield(
@@ -145,7 +308,90 @@ def Sim_FW(temperature, pressure, ref, generation_id, candidate_id, ff_updater,
     )
 
 
-def PostSim_FW(generation_id, candidate_id, parents, wf_name):
+def Screen_FW(temperature, pressure, ref, generation_id, candidate_id,
+              ff_updater, parent, wf_name, ncycles, population_store=None):
+    """Generate a short screening simulation Firework
+
+    Parameters
+    ----------
+    temperature, pressure, ref, generation_id, candidate_id, ff_updater,
+    parent, wf_name, population_store
+      as per Sim_FW
+    ncycles : int
+      length of the screening simulation
+
+    Returns
+    -------
+    screen : fireworks.Firework
+    """
+    return fw.Firework(
+        [
+            # previous full length results are better than screening
+            CheckFitnessCache(
+                candidate_id=candidate_id,
+                temperature=temperature,
+                pressure=pressure,
+                screening=True,
+                **_cache_settings(wf_name, population_store=population_store)
+            ),
+            CopyTemplate(
+                temperature=temperature,
+                pressure=pressure,
+                ncycles=ncycles,
+                parallel_id=generation_id,
+            ),
+            ManipulateForcefield(
+                candidate_id=candidate_id,
+                updater=utils.register_updater(ff_updater),
+            ),
+            RunSimulation(),
+            EvaluateResult(
+                reference=ref,
+                temperature=temperature,
+                pressure=pressure,
+                candidate_id=candidate_id,
+                screening=True,
+            ),
+        ],
+        spec={
+            '_category': wf_name,
+        },
+        parents=parent,
+        name='Screen T={} P={} C={}'.format(temperature, pressure,
+                                            candidate_id),
+    )
+
+
+def Promote_FW(generation_id, parents, wf_name, fraction):
+    """Choose candidates to fully simulate from screening results
+
+    Parameters
+    ----------
+    generation_id : int
+      id of the generation
+    parents : list of fw.Firework
+      the screening Fireworks
+    wf_name : str
+      unique key to refer to this workflow by
+    fraction : float
+      fraction of candidates to promote
+
+    Returns
+    -------
+    promote : fireworks.Firework
+    """
+    return fw.Firework(
+        [Promote(fraction=fraction)],
+        spec={
+            '_category': wf_name,
+        },
+        parents=parents,
+        name='Promote G={}'.format(generation_id),
+    )
+
+
+def PostSim_FW(generation_id, candidate_id, parents, wf_name,
+               objectives=None, steady_state=False):
     """Collects Sims from different conditions in one candidate fitness
 
     Parameters
@@ -158,15 +404,27 @@ def PostSim_FW(generation_id, candidate_id, parents, wf_name):
       references to the preceeding Fireworks for this candidate
     wf_name : str
       unique key to refer to this workflow by
+    objectives : list of tuples, optional
+      (T, P, objective index) of each condition, see objective_settings
+    steady_state : bool, optional
+      if the fitness is for a SteadyStateUpdate added to this Firework
 
     Returns
     -------
     postsim : fireworks.Firework
     """
+    if objectives is not None:
+        assign = AssignFitness(candidate_id=candidate_id,
+                               objectives=objectives)
+    else:
+        assign = AssignFitness(candidate_id=candidate_id)
+    if steady_state:
+        assign['steady_state'] = True
+
     return fw.Firework(
         [
             IsothermCreate(),
-            AssignFitness(candidate_id=candidate_id),
+            assign,
         ],
         spec={
             '_category': wf_name,
@@ -176,7 +434,7 @@ def PostSim_FW(generation_id, candidate_id, parents, wf_name):
     )
 
 
-def PostGA_FW(generation_id, parents, wf_name):
+def PostGA_FW(generation_id, parents, wf_name, population_store=None):
     """Operations to finish the GA generation
 
     Parameters
@@ -187,15 +445,27 @@ def PostGA_FW(generation_id, parents, wf_name):
       references to PostSim Fireworks
     wf_name : str
       unique key to refer to this workflow by
+    population_store : str, optional
+      location of a store to keep the population and fitness cache in
 
     Returns
     -------
     postga : fireworks.Firework
     """
+    if population_store is not None:
+        store_settings = dict(population_store=population_store,
+                              wf_name=wf_name,
+                              generation_id=generation_id)
+        passed = ['template']
+    else:
+        store_settings = {}
+        passed = ['template', 'fitness_cache']
+
     return fw.Firework(
         [
-            Replacement(),
-            PassAlong(keys=['template'])
+            Replacement(**store_settings),
+            UpdateFitnessCache(**store_settings),
+            PassAlong(keys=passed)
         ],
         spec = {
             '_category': wf_name,
@@ -206,7 +476,9 @@ def PostGA_FW(generation_id, parents, wf_name):
 
 
 def make_sampling_stage(conditions, generation_id, candidate_id,
-                        ff_updater, parent, wf_name):
+                        ff_updater, parent, wf_name, promote=None,
+                        objectives=None, population_file=None,
+                        population_store=None):
     """Make a sampling stage for a single candidate
 
     Parameters
@@ -223,11 +495,23 @@ def make_sampling_stage(conditions, generation_id, candidate_id,
       reference to preceeding Firework
     wf_name : str
       unique key to refer to this workflow by
+    promote : fw.Firework, optional
+      Promote Firework from make_screening_stage, if given simulations
+      only run if this candidate is promoted
+    objectives : list of tuples, optional
+      (T, P, objective index) of each condition, see objective_settings
+    population_file : str, optional
+      steady state population file holding the fitness cache, the
+      gather_fw is then ready for a SteadyStateUpdate
+    population_store : str, optional
+      location of the population store holding the fitness cache
 
     Returns
     -------
     sim_fws, gather_fw : list, fw.Firework
     """
+    if promote is not None:
+        parent = [parent, promote]
     sim_fws = []
     for T, P, ref in conditions:
         sim_fws.append(
@@ -240,6 +524,9 @@ def make_sampling_stage(conditions, generation_id, candidate_id,
                 ff_updater=ff_updater,
                 parent=parent,
                 wf_name=wf_name,
+                screened=promote is not None,
+                population_file=population_file,
+                population_store=population_store,
             ),
         )
     final_fw = PostSim_FW(
@@ -247,63 +534,289 @@ def make_sampling_stage(conditions, generation_id, candidate_id,
         candidate_id=candidate_id,
         parents=sim_fws,
         wf_name=wf_name,
+        objectives=objectives,
+        steady_state=population_file is not None,
     )
 
     return sim_fws, final_fw
 
 
-def make_first_generation(template, ncandidates, initial_pop,
-                          conditions, ff_updater, wf_name):
-    """Make the first generation of a GA
+def BatchSim_FW(conditions, generation_id, candidate_ids, ff_updater, parent,
+                wf_name, objectives=None, population_store=None):
+    """Evaluate a block of candidates at every condition in one Firework
+
+    Replaces the Sim and PostSim Fireworks of these candidates
+
+    Parameters
+    ----------
+    conditions : tuple of tuples
+      tuple of (T, P, ref) for each condition
+    generation_id : int
+      id of the generation
+    candidate_ids : list of int
+      which candidates to evaluate
+    ff_updater : function, str or list
+      as per Sim_FW
+    parent : fw.Firework
+      the preceeding Firework to this Firework
+    wf_name : str
+      unique key to refer to this workflow by
+    objectives : list of tuples, optional
+      (T, P, objective index) of each condition, see objective_settings
+    population_store : str, optional
+      location of the population store holding the fitness cache
+
+    Returns
+    -------
+    batch : fireworks.Firework
+    """
+    settings = dict(
+        candidate_ids=list(candidate_ids),
+        conditions=conditions,
+        updater=utils.register_updater(ff_updater),
+        ncycles=DEFAULT_NCYCLES,
+    )
+    if objectives is not None:
+        settings['objectives'] = objectives
+    if population_store is not None:
+        settings['population_store'] = population_store
+        settings['wf_name'] = wf_name
+
+    return fw.Firework(
+        [
+            EvaluateBatch(**settings),
+        ],
+        spec={
+            '_category': wf_name,
+        },
+        parents=parent,
+        name='BatchSim G={} C={}-{}'.format(generation_id, candidate_ids[0],
+                                             candidate_ids[-1]),
+    )
+
+
+def make_screening_stage(ncandidates, generation_id, ff_updater, parent,
+                         wf_name, fraction, ncycles, conditions,
+                         population_store=None):
+    """Make short simulations of every candidate, to choose which to promote
+
+    Together with make_sampling_stage this forms a successive halving
+    evaluation, where only the most promising candidates from the
+    screening are simulated fully.
 
     Parameters
     ----------
-    template : str
-      path to template
     ncandidates : int
       number of candidates in the generation
-    initial_pop : tuple
-      tuple describing initial population
+    generation_id : int
+      id of the generation
+    ff_updater : function
+      function which does the manipulation of forcefield files
+    parent : fw.Firework
+      reference to preceeding Firework
+    wf_name : str
+      unique key to refer to this workflow by
+    fraction : float
+      fraction of candidates to promote
+    ncycles : int
+      length of screening simulations
     conditions : tuple of tuples
-      tuple of (T, P, reference_result) for each condition
+      (T, P, ref) for each condition to screen at
+    population_store : str, optional
+      location of the population store holding the fitness cache
+
+    Returns
+    -------
+    screen_fws, promote_fw : list, fw.Firework
+      promote_fw is passed to make_sampling_stage
+    """
+    screen_fws = []
+    for i in range(ncandidates):
+        for T, P, ref in conditions:
+            screen_fws.append(
+                Screen_FW(
+                    temperature=T,
+                    pressure=P,
+                    ref=ref,
+                    generation_id=generation_id,
+                    candidate_id=i,
+                    ff_updater=ff_updater,
+                    parent=parent,
+                    wf_name=wf_name,
+                    ncycles=ncycles,
+                    population_store=population_store,
+                ),
+            )
+    promote_fw = Promote_FW(
+        generation_id=generation_id,
+        parents=screen_fws,
+        wf_name=wf_name,
+        fraction=fraction,
+    )
+
+    return screen_fws, promote_fw
+
+
+def make_candidate_stages(ncandidates, conditions, generation_id, ff_updater,
+                          parent, wf_name, screening=None, batch_size=None,
+                          objectives=None, population_store=None):
+    """Make the evaluation of every candidate in a generation
+
+    Parameters
+    ----------
+    ncandidates : int
+      number of candidates in the generation
+    conditions : tuple of tuples
+      tuple of (T, P, ref) for each condition
+    generation_id : int
+      id of the generation
     ff_updater : function
       function which does the manipulation of forcefield files
+    parent : fw.Firework
+      reference to preceeding Firework
     wf_name : str
       unique key to refer to this workflow by
+    screening : dict, optional
+      settings for successive halving, see screening_settings
+    batch_size : int, optional
+      evaluate this many candidates in each Firework, see BatchSim_FW
+    objectives : str or list of int, optional
+      optimise each objective separately, see objective_settings
+    population_store : str, optional
+      location of the population store holding the fitness cache
 
     Returns
     -------
-    list of Fireworks
-      ordered so that final FW is the post GA FW
+    sim_fws, final_fws : list, list
+      all simulation Fireworks, and the Fireworks which give the
+      fitness of each candidate to PostGA
     """
-    # make initial population
-    pre = Firstgen_PreGA_FW(template=template, pop=initial_pop, wf_name=wf_name)
+    if objectives is not None:
+        objectives = objective_settings(objectives, conditions)
+
+    if batch_size is not None:
+        if screening is not None:
+            raise ValueError("Batches of candidates can't also be screened")
+        batches = [
+            BatchSim_FW(
+                conditions=conditions,
+                generation_id=generation_id,
+                candidate_ids=list(range(i, min(i + batch_size,
+                                                ncandidates))),
+                ff_updater=ff_updater,
+                parent=parent,
+                wf_name=wf_name,
+                objectives=objectives,
+                population_store=population_store,
+            )
+            for i in range(0, ncandidates, batch_size)
+        ]
+        return [], batches
 
     sims = []
+    promote = None
+    if screening is not None:
+        screen_fws, promote = make_screening_stage(
+            ncandidates=ncandidates,
+            generation_id=generation_id,
+            ff_updater=ff_updater,
+            parent=parent,
+            wf_name=wf_name,
+            population_store=population_store,
+            **screening_settings(screening, conditions)
+        )
+        sims.extend(screen_fws + [promote])
+
     final_fws = []
     for i in range(ncandidates):
         sim_fws, final_fw = make_sampling_stage(
             conditions=conditions,
-            generation_id=0,
+            generation_id=generation_id,
             candidate_id=i,
             ff_updater=ff_updater,
-            parent=pre,
+            parent=parent,
             wf_name=wf_name,
+            promote=promote,
+            objectives=objectives,
+            population_store=population_store,
         )
         sims.extend(sim_fws)
         final_fws.append(final_fw)
 
+    return sims, final_fws
+
+
+def make_first_generation(template, ncandidates, initial_pop,
+                          conditions, ff_updater, wf_name,
+                          template_store=None, screening=None,
+                          batch_size=None, population_store=None,
+                          objectives=None, updaters=None):
+    """Make the first generation of a GA
+
+    Parameters
+    ----------
+    template : str
+      path to template
+    ncandidates : int
+      number of candidates in the generation
+    initial_pop : tuple
+      tuple describing initial population
+    conditions : tuple of tuples
+      tuple of (T, P, reference_result) for each condition
+    ff_updater : function
+      function which does the manipulation of forcefield files
+    wf_name : str
+      unique key to refer to this workflow by
+    template_store : str, optional
+      location of a template store to keep the template in
+    screening : dict, optional
+      settings for successive halving, see screening_settings
+    batch_size : int, optional
+      number of candidates evaluated in each Firework
+    population_store : str, optional
+      location of a store to keep the population in
+    objectives : str or list of int, optional
+      optimise each objective separately, see objective_settings
+    updaters : dict, optional
+      pickled updaters to write alongside the template
+
+    Returns
+    -------
+    list of Fireworks
+      ordered so that final FW is the post GA FW
+    """
+    # make initial population
+    pre = Firstgen_PreGA_FW(template=template, pop=initial_pop, wf_name=wf_name,
+                            template_store=template_store, updaters=updaters)
+
+    sims, final_fws = make_candidate_stages(
+        ncandidates=ncandidates,
+        conditions=conditions,
+        generation_id=0,
+        ff_updater=ff_updater,
+        parent=pre,
+        wf_name=wf_name,
+        screening=screening,
+        batch_size=batch_size,
+        objectives=objectives,
+        population_store=population_store,
+    )
+
     post = PostGA_FW(
         generation_id=0,
         parents=final_fws + [pre],
         wf_name=wf_name,
+        population_store=population_store,
     )
 
     return [pre] + sims + final_fws + [post]
 
 
 def make_generation_n(ncandidates, conditions, bounds, ff_updater, parent,
-                      generation_id, wf_name):
+                      generation_id, wf_name, seed=None, surrogate=None,
+                      oversample=DEFAULT_OVERSAMPLE, screening=None,
+                      batch_size=None, population_store=None,
+                      objectives=None):
     """Make the nth generation of a GA
 
     Parameters
@@ -323,6 +836,20 @@ def make_generation_n(ncandidates, conditions, bounds, ff_updater, parent,
       index of the generation
     wf_name : str
       unique key to refer to this workflow by
+    seed : int, optional
+      seed for the GA operators
+    surrogate : str, optional
+      model used to pre-screen candidates, see PreGA_FW
+    oversample : int, optional
+      candidates bred for each one simulated when pre-screening
+    screening : dict, optional
+      settings for successive halving, see screening_settings
+    batch_size : int, optional
+      number of candidates evaluated in each Firework
+    population_store : str, optional
+      location of a store to keep the population in
+    objectives : str or list of int, optional
+      optimise each objective separately, see objective_settings
 
     Returns
     -------
@@ -334,33 +861,43 @@ def make_generation_n(ncandidates, conditions, bounds, ff_updater, parent,
         idx=generation_id,
         bounds=bounds,
         wf_name=wf_name,
+        seed=seed,
+        ncandidates=ncandidates,
+        surrogate=surrogate,
+        oversample=oversample,
+        population_store=population_store,
     )
 
-    sims = []
-    final_fws = []
-    for i in range(ncandidates):
-        sim_fws, final_fw = make_sampling_stage(
-            conditions=conditions,
-            generation_id=generation_id,
-            candidate_id=i,
-            ff_updater=ff_updater,
-            parent=pre,
-            wf_name=wf_name,
-        )
-        sims.extend(sim_fws)
-        final_fws.append(final_fw)
+    sims, final_fws = make_candidate_stages(
+        ncandidates=ncandidates,
+        conditions=conditions,
+        generation_id=generation_id,
+        ff_updater=ff_updater,
+        parent=pre,
+        wf_name=wf_name,
+        screening=screening,
+        batch_size=batch_size,
+        objectives=objectives,
+        population_store=population_store,
+    )
 
     post = PostGA_FW(
         generation_id=generation_id,
         parents=final_fws + [pre],
         wf_name=wf_name,
+        population_store=population_store,
     )
 
     return [pre] + sims + final_fws + [post]
 
 
 def make_genetic_workflow(ngens, ncandidates, template, initial_pop, bounds,
-                          conditions, ff_updater, wf_name):
+                          conditions, ff_updater, wf_name,
+                          template_store=None, profile=False, lazy=False,
+                          seed=None, surrogate=None,
+                          oversample=DEFAULT_OVERSAMPLE, screening=None,
+                          batch_size=None, population_store=None,
+                          objectives=None):
     """Make a genetic alg. forcefield optimisation workflow
 
     Parameters
@@ -378,37 +915,218 @@ def make_genetic_workflow(ngens, ncandidates, template, initial_pop, bounds,
       eg `((1.0, 2.0), (10.0, 20.0))` clamps the first value between 1.0 and 2.0
     conditions : tuple of tuples
       tuple of (T, P, reference result) for each point to match
-    ff_updater : function
-      function which does the manipulation of forcefield files
+    ff_updater : function, str or list
+      function which does the manipulation of forcefield files, it is
+      pickled once, into *template_store* if given, otherwise alongside
+      the template.  Alternatively a
+      'package.module:function' string, if the function is importable
+      on every worker, or a forcefield mapping, see forcefield module.
     wf_name : str
       unique key to refer to this workflow by
+    template_store : str, optional
+      location of a template store (path or MongoDB uri) to keep the
+      template (and updater) in, rather than inside the Workflow
+    profile : bool or list of str, optional
+      profile every task, or the named tasks, see instrument module
+    lazy : bool, optional
+      only create each generation once the previous has finished,
+      rather than every generation up front
+    seed : int, optional
+      seed for the GA operators, for reproducible optimisations
+    surrogate : str, optional
+      pre-screen candidates with a model of fitness trained on every
+      candidate simulated so far, either 'gp' (gaussian process) or
+      'forest' (random forest).  Only the most promising candidates
+      of a batch *oversample* times larger are then simulated.
+    oversample : int, optional
+      size of the batch screened by the surrogate, relative to
+      *ncandidates*
+    screening : dict, optional
+      evaluate candidates by successive halving: every candidate is
+      first simulated briefly and only the best are simulated fully.
+      Keys are 'fraction' of candidates to promote, 'ncycles' of the
+      screening simulations and the 'conditions' to screen at, see
+      DEFAULT_SCREENING for defaults.  Use an empty dict for defaults.
+    batch_size : int, optional
+      evaluate this many candidates, at every condition, within a single
+      Firework using a pool of processes.  Useful when simulations are
+      so short that the overhead of a Firework for each is significant.
+    population_store : str, optional
+      location (path or MongoDB uri) of a store to keep the population,
+      history of every individual and fitness cache in, rather than
+      passing these through the Workflow, see population_store module
+    objectives : str or list of int, optional
+      treat groups of conditions as separate objectives, rather than
+      summing every error into one fitness, and select candidates as
+      in NSGA-II, by Pareto front and then crowding distance.  Either
+      'temperature' to make each isotherm an objective, or the index of
+      the objective of each condition.
 
     Returns
     -------
     workflow : fw.Workflow
       the Workflow ready to be put on launchpad
     """
+    # store the updater once, rather than pickled into every Firework
+    updaters = {}
+    ff_updater = utils.register_updater(ff_updater, template_store, updaters)
+
     first = make_first_generation(template=template,
                                   initial_pop=initial_pop,
                                   ncandidates=ncandidates,
                                   conditions=conditions,
                                   ff_updater=ff_updater,
                                   wf_name=wf_name,
+                                  template_store=template_store,
+                                  screening=screening,
+                                  batch_size=batch_size,
+                                  population_store=population_store,
+                                  objectives=objectives,
+                                  updaters=updaters,
     )
     gen = first
 
     fws = first
-    for gen_id in range(ngens):
-        # the parent FW for next generation is last FW in previous gen
-        parent = gen[-1]
-        gen = make_generation_n(ncandidates=ncandidates,
-                                bounds=bounds,
-                                conditions=conditions,
-                                parent=parent,
-                                generation_id=gen_id + 1,
-                                ff_updater=ff_updater,
-                                wf_name=wf_name,
+    if lazy:
+        # end of each generation creates the next
+        first[-1].tasks.append(SpawnGeneration(
+            generation_id=1,
+            ngens=ngens,
+            ncandidates=ncandidates,
+            bounds=bounds,
+            conditions=conditions,
+            ff_updater=ff_updater,
+            wf_name=wf_name,
+            seed=seed,
+            surrogate=surrogate,
+            oversample=oversample,
+            screening=screening,
+            batch_size=batch_size,
+            population_store=population_store,
+            objectives=objectives,
+        ))
+    else:
+        for gen_id in range(ngens):
+            # the parent FW for next generation is last FW in previous gen
+            parent = gen[-1]
+            gen = make_generation_n(ncandidates=ncandidates,
+                                    bounds=bounds,
+                                    conditions=conditions,
+                                    parent=parent,
+                                    generation_id=gen_id + 1,
+                                    ff_updater=ff_updater,
+                                    wf_name=wf_name,
+                                    seed=seed,
+                                    surrogate=surrogate,
+                                    oversample=oversample,
+                                    screening=screening,
+                                    batch_size=batch_size,
+                                    population_store=population_store,
+                                    objectives=objectives,
+            )
+            fws.extend(gen)
+
+    if profile:
+        apply_options(fws, {'profile': profile})
+
+    return fw.Workflow(fws, name=wf_name)
+
+
+def make_steady_state_workflow(template, initial_pop, bounds, conditions,
+                               ff_updater, wf_name, workdir, max_evaluations,
+                               popsize=None, template_store=None,
+                               profile=False, seed=None):
+    """Make an asynchronous, steady state, GA optimisation workflow
+
+    Rather than waiting for every candidate of a generation to finish,
+    each candidate as it finishes joins the population (replacing the
+    least fit) and breeds a single new candidate.  This keeps as many
+    candidates running as were in the initial population, with no
+    barrier between generations.
+
+    Parameters
+    ----------
+    template : str
+      path to the template
+    initial_pop : tuple of tuples
+      description of initial candidates, also sets how many candidates
+      are evaluated at once
+    bounds : tuple
+      tuple containing the minimum and maximum bounds for each parameter
+    conditions : tuple of tuples
+      tuple of (T, P, reference result) for each point to match
+    ff_updater : function
+      function which does the manipulation of forcefield files
+    wf_name : str
+      unique key to refer to this workflow by
+    workdir : str
+      shared directory to keep the population file in, must be
+      reachable (and lockable) by every worker
+    max_evaluations : int
+      total number of candidates to evaluate, including initial ones
+    popsize : int, optional
+      number of individuals kept in the population, defaults to size
+      of the initial population
+    template_store : str, optional
+      location of a template store to keep the template in
+    profile : bool or list of str, optional
+      profile every task, or the named tasks, see instrument module
+    seed : int, optional
+      seed for the GA operators, for reproducible candidates
+
+    Returns
+    -------
+    workflow : fw.Workflow
+      the Workflow ready to be put on launchpad
+    """
+    if popsize is None:
+        popsize = len(initial_pop)
+    updaters = {}
+    ff_updater = utils.register_updater(ff_updater, template_store, updaters)
+    population_file = os.path.join(os.path.abspath(workdir),
+                                   '{}_population.json'.format(wf_name))
+
+    pre = Firstgen_PreGA_FW(template=template, pop=initial_pop,
+                            wf_name=wf_name, template_store=template_store,
+                            updaters=updaters)
+    pre.tasks.append(InitSteadyState(
+        population_file=population_file,
+        popsize=popsize,
+        nstarted=len(initial_pop),
+    ))
+
+    update_settings = dict(
+        population_file=population_file,
+        max_evaluations=max_evaluations,
+        bounds=bounds,
+        conditions=conditions,
+        ff_updater=ff_updater,
+        wf_name=wf_name,
+    )
+    if seed is not None:
+        update_settings['seed'] = seed
+
+    sims = []
+    final_fws = []
+    for i, candidate in enumerate(initial_pop):
+        sim_fws, final_fw = make_sampling_stage(
+            conditions=conditions,
+            generation_id=0,
+            candidate_id=i,
+            ff_updater=ff_updater,
+            parent=pre,
+            wf_name=wf_name,
+            population_file=population_file,
         )
-        fws.extend(gen)
+        # also child of pre, to receive the template for new candidates
+        final_fw.parents = final_fw.parents + [pre]
+        final_fw.tasks.append(SteadyStateUpdate(candidate=list(candidate),
+                                                **update_settings))
+        sims.extend(sim_fws)
+        final_fws.append(final_fw)
+
+    fws = [pre] + sims + final_fws
+    if profile:
+        apply_options(fws, {'profile': profile})
 
     return fw.Workflow(fws, name=wf_name)
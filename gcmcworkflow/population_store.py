@@ -0,0 +1,307 @@
+"""Storage of GA populations outside of the Firework specs
+
+Without a store, the whole population is passed from generation to
+generation through the specs of the PreGA and PostGA Fireworks, and a
+copy is kept in the stored_data of every Replacement.  With a store,
+each generation's population is written once, along with every
+individual ever evaluated and the fitness cache, and the Fireworks only
+pass along the generation id.
+
+Two stores are available:
+ - FilePopulationStore, a directory on a filesystem visible to all workers
+ - MongoPopulationStore, collections on a MongoDB server
+
+``get_population_store`` chooses between these based on the location
+given, in the same way as ``template_store.get_store``.
+"""
+import json
+import os
+
+
+# MongoDB stores, kept so that each process connects once
+_MONGO_STORES = {}
+
+
+class FilePopulationStore(object):
+    """Population store held in a directory
+
+    Each workflow has a subdirectory, holding a file for the population
+    of each generation, and files per generation of every individual
+    evaluated in it and of their fitness cache entries.
+
+    Parameters
+    ----------
+    path : str
+      directory to keep populations in, created if necessary
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(self.path, exist_ok=True)
+
+    def _path(self, wf_name, kind, generation_id):
+        return os.path.join(self.path, wf_name,
+                            '{}_{}.json'.format(kind, generation_id))
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then move, so that a partial file is never seen
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'w') as out:
+            json.dump(data, out)
+        os.replace(tmp, path)
+
+    def _generations(self, wf_name, kind):
+        """Sorted ids of every generation with a *kind* file"""
+        prefix = kind + '_'
+        try:
+            fns = os.listdir(os.path.join(self.path, wf_name))
+        except FileNotFoundError:
+            return []
+        return sorted(int(fn[len(prefix):-len('.json')])
+                      for fn in fns
+                      if fn.startswith(prefix) and fn.endswith('.json'))
+
+    def put_population(self, wf_name, generation_id, population):
+        """Record the population after a generation
+
+        Parameters
+        ----------
+        wf_name : str
+          name of the workflow
+        generation_id : int
+          id of the generation
+        population : list
+          (candidate, fitness) of each individual
+        """
+        self._write(self._path(wf_name, 'population', generation_id),
+                    [[list(c), f] for c, f in population])
+
+    def get_population(self, wf_name, generation_id):
+        """Population after generation *generation_id*
+
+        Raises
+        ------
+        KeyError
+          if this generation isn't in the store
+        """
+        try:
+            with open(self._path(wf_name, 'population', generation_id),
+                      'r') as inf:
+                return [(tuple(c), f) for c, f in json.load(inf)]
+        except FileNotFoundError:
+            raise KeyError("No population for generation {} of '{}'"
+                           "".format(generation_id, wf_name))
+
+    def add_history(self, wf_name, generation_id, individuals):
+        """Record the individuals evaluated in a generation
+
+        Parameters
+        ----------
+        wf_name : str
+        generation_id : int
+        individuals : list
+          (candidate, fitness) in candidate_id order
+        """
+        self._write(self._path(wf_name, 'history', generation_id),
+                    [[list(c), f] for c, f in individuals])
+
+    def history(self, wf_name, generation_id=None):
+        """Every individual evaluated
+
+        Parameters
+        ----------
+        wf_name : str
+        generation_id : int, optional
+          only return individuals from this generation
+
+        Returns
+        -------
+        history : list of dict
+          with 'generation', 'candidate_id', 'candidate' and 'fitness',
+          ordered by generation and candidate_id
+        """
+        if generation_id is None:
+            generations = self._generations(wf_name, 'history')
+        else:
+            generations = [generation_id]
+
+        history = []
+        for gen in generations:
+            try:
+                with open(self._path(wf_name, 'history', gen), 'r') as inf:
+                    individuals = json.load(inf)
+            except FileNotFoundError:
+                continue
+            history.extend({'generation': gen, 'candidate_id': i,
+                            'candidate': tuple(c), 'fitness': f}
+                           for i, (c, f) in enumerate(individuals))
+
+        return history
+
+    def add_evaluations(self, wf_name, generation_id, entries):
+        """Add a generation's entries to the fitness cache
+
+        Parameters
+        ----------
+        wf_name : str
+        generation_id : int
+        entries : dict
+          fitness cache entries, keyed by genetics.cache_index.  Where
+          an entry is already in the store, the first is kept.
+        """
+        self._write(self._path(wf_name, 'evaluations', generation_id),
+                    entries)
+
+    def fitness_cache(self, wf_name):
+        """Every entry of the fitness cache
+
+        Returns
+        -------
+        cache : dict
+          as per genetics.UpdateFitnessCache
+        """
+        cache = {}
+        for gen in self._generations(wf_name, 'evaluations'):
+            try:
+                with open(self._path(wf_name, 'evaluations', gen),
+                          'r') as inf:
+                    entries = json.load(inf)
+            except FileNotFoundError:
+                continue
+            for index, entry in entries.items():
+                cache.setdefault(index, entry)
+
+        return cache
+
+    def lookup(self, wf_name, index):
+        """Fitness cache entry at *index*, or None if there isn't one"""
+        return self.fitness_cache(wf_name).get(index, None)
+
+
+class MongoPopulationStore(object):
+    """Population store held in MongoDB
+
+    Parameters
+    ----------
+    uri : str
+      MongoDB connection string, including the database name,
+      eg 'mongodb://localhost:27017/fireworks'
+    prefix : str, optional
+      prefix of the collection names
+    """
+    def __init__(self, uri, prefix='gcmc_'):
+        import pymongo
+
+        self.uri = uri
+        db = pymongo.MongoClient(uri).get_default_database()
+        self.populations = db[prefix + 'populations']
+        self.individuals = db[prefix + 'individuals']
+        self.evaluations = db[prefix + 'evaluations']
+        self.populations.create_index(
+            [('wf_name', pymongo.ASCENDING),
+             ('generation', pymongo.ASCENDING)], unique=True)
+        self.individuals.create_index(
+            [('wf_name', pymongo.ASCENDING),
+             ('generation', pymongo.ASCENDING),
+             ('candidate_id', pymongo.ASCENDING)], unique=True)
+        self.individuals.create_index(
+            [('wf_name', pymongo.ASCENDING),
+             ('fitness', pymongo.ASCENDING)])
+        self.evaluations.create_index(
+            [('wf_name', pymongo.ASCENDING),
+             ('index', pymongo.ASCENDING)], unique=True)
+
+    def put_population(self, wf_name, generation_id, population):
+        self.populations.replace_one(
+            {'wf_name': wf_name, 'generation': generation_id},
+            {'wf_name': wf_name, 'generation': generation_id,
+             'population': [[list(c), f] for c, f in population]},
+            upsert=True,
+        )
+
+    def get_population(self, wf_name, generation_id):
+        doc = self.populations.find_one(
+            {'wf_name': wf_name, 'generation': generation_id})
+        if doc is None:
+            raise KeyError("No population for generation {} of '{}'"
+                           "".format(generation_id, wf_name))
+
+        return [(tuple(c), f) for c, f in doc['population']]
+
+    def add_history(self, wf_name, generation_id, individuals):
+        from pymongo import ReplaceOne
+
+        requests = [
+            ReplaceOne(
+                {'wf_name': wf_name, 'generation': generation_id,
+                 'candidate_id': i},
+                {'wf_name': wf_name, 'generation': generation_id,
+                 'candidate_id': i, 'candidate': list(c), 'fitness': f},
+                upsert=True,
+            )
+            for i, (c, f) in enumerate(individuals)
+        ]
+        if requests:
+            self.individuals.bulk_write(requests, ordered=False)
+
+    def history(self, wf_name, generation_id=None):
+        query = {'wf_name': wf_name}
+        if generation_id is not None:
+            query['generation'] = generation_id
+
+        return [
+            {'generation': doc['generation'],
+             'candidate_id': doc['candidate_id'],
+             'candidate': tuple(doc['candidate']),
+             'fitness': doc['fitness']}
+            for doc in self.individuals.find(query).sort(
+                [('generation', 1), ('candidate_id', 1)])
+        ]
+
+    def add_evaluations(self, wf_name, generation_id, entries):
+        from pymongo import UpdateOne
+
+        requests = [
+            # first evaluation is kept
+            UpdateOne(
+                {'wf_name': wf_name, 'index': index},
+                {'$setOnInsert': {'generation': generation_id,
+                                  'entry': entry}},
+                upsert=True,
+            )
+            for index, entry in entries.items()
+        ]
+        if requests:
+            self.evaluations.bulk_write(requests, ordered=False)
+
+    def fitness_cache(self, wf_name):
+        return {doc['index']: doc['entry']
+                for doc in self.evaluations.find({'wf_name': wf_name})}
+
+    def lookup(self, wf_name, index):
+        doc = self.evaluations.find_one({'wf_name': wf_name, 'index': index})
+
+        return None if doc is None else doc['entry']
+
+
+def get_population_store(location):
+    """Get the population store at *location*
+
+    Parameters
+    ----------
+    location : str
+      either a MongoDB connection string or a path to a directory
+
+    Returns
+    -------
+    store : FilePopulationStore or MongoPopulationStore
+      MongoDB stores are reused, so only connect once per process
+    """
+    if location.startswith(('mongodb://', 'mongodb+srv://')):
+        try:
+            return _MONGO_STORES[location]
+        except KeyError:
+            store = _MONGO_STORES[location] = MongoPopulationStore(location)
+            return store
+    else:
+        return FilePopulationStore(location)
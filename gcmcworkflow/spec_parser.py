@@ -112,7 +112,49 @@ def read_spec(path):
     except KeyError:
         pass
 
+    try:
+        store = raw['template_store']
+    except KeyError:
+        pass
+    else:
+        if not store.startswith(('mongodb://', 'mongodb+srv://')):
+            store = os.path.abspath(store)
+        output['template_store'] = store
+
+    try:
+        # node-local path, so expanded on each worker rather than here
+        output['template_cache'] = raw['template_cache']
+    except KeyError:
+        pass
+    else:
+        try:
+            output['template_cache_size'] = utils.conv_to_number(
+                raw['template_cache_size'])
+        except KeyError:
+            pass
+
+    # scratch is node-local, so is expanded on each worker rather than here
+    for key in ('scratch', 'stage_patterns'):
+        try:
+            output[key] = raw[key]
+        except KeyError:
+            pass
+
     # kinda weird, but sometimes bool sometimes string, so force to string
     output['use_grid'] = str(raw.get('use_grid', False)).lower().startswith('t')
+    output['archive'] = str(raw.get('archive', False)).lower().startswith('t')
+    output['fused_runs'] = str(
+        raw.get('fused_runs', False)).lower().startswith('t')
+    output['lazy'] = str(raw.get('lazy', False)).lower().startswith('t')
+
+    try:
+        profile = raw['profile']
+    except KeyError:
+        pass
+    else:
+        # either list of task names or true/false for all tasks
+        if not isinstance(profile, list):
+            profile = str(profile).lower().startswith('t')
+        output['profile'] = profile
 
     return output
@@ -0,0 +1,362 @@
+"""Content-addressed storage of simulation templates
+
+Rather than embedding the entire template inside a Firework spec, a
+template can be put into a store once, keyed by the SHA1 hash of its
+contents.  Fireworks then only carry this hash, and workers fetch (and
+locally cache) the template when they need it.
+
+Two stores are available:
+ - FileStore, a directory on a filesystem visible to all workers
+ - GridFSStore, a GridFS bucket on a MongoDB server
+
+``get_store`` chooses between these based on the location given.
+
+TemplateCache keeps copies of templates on a worker's local disk, so
+that every simulation on that node can copy from there instead of from
+a shared filesystem.
+"""
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from . import utils
+
+
+# where workers keep templates they have fetched
+DEFAULT_CACHE = os.path.join('~', '.gcmcworkflow', 'templates')
+
+
+def hash_template(contents):
+    """Calculate the hash of a slurped template
+
+    Parameters
+    ----------
+    contents : dict or list
+      dictionary of filename: contents, or packed files from
+      utils.slurp_tree
+
+    Returns
+    -------
+    key, payload : str, bytes
+      SHA1 hexdigest of the template and the serialised template
+    """
+    payload = json.dumps(contents, sort_keys=True).encode('utf8')
+
+    return hashlib.sha1(payload).hexdigest(), payload
+
+
+class FileStore(object):
+    """Template store held in a directory
+
+    Parameters
+    ----------
+    path : str
+      directory to keep templates in, created if necessary
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(self.path, exist_ok=True)
+
+    def _blob_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def __contains__(self, key):
+        return os.path.exists(self._blob_path(key))
+
+    def put(self, contents):
+        """Add a template to the store
+
+        Parameters
+        ----------
+        contents : dict or list
+          dictionary of filename: contents, or packed files from
+          utils.slurp_tree
+
+        Returns
+        -------
+        key : str
+          hash which can be used to retrieve this template
+        """
+        key, payload = hash_template(contents)
+
+        if key not in self:
+            # write then move, so that a partial file is never seen
+            tmp = self._blob_path(key) + '.{}.tmp'.format(os.getpid())
+            with open(tmp, 'wb') as out:
+                out.write(payload)
+            os.replace(tmp, self._blob_path(key))
+
+        return key
+
+    def get(self, key):
+        """Retrieve a template from the store
+
+        Raises
+        ------
+        KeyError
+          if the template isn't in this store
+        """
+        try:
+            with open(self._blob_path(key), 'rb') as inf:
+                return json.loads(inf.read().decode('utf8'))
+        except FileNotFoundError:
+            raise KeyError("Template '{}' not found in store".format(key))
+
+
+class GridFSStore(object):
+    """Template store held in MongoDB using GridFS
+
+    Parameters
+    ----------
+    uri : str
+      MongoDB connection string, including the database name,
+      eg 'mongodb://localhost:27017/fireworks'
+    collection : str, optional
+      name of the GridFS bucket
+    """
+    def __init__(self, uri, collection='gcmc_templates'):
+        import gridfs
+        import pymongo
+
+        self.uri = uri
+        client = pymongo.MongoClient(uri)
+        self.fs = gridfs.GridFS(client.get_default_database(),
+                                collection=collection)
+
+    def __contains__(self, key):
+        return self.fs.exists(key)
+
+    def put(self, contents):
+        key, payload = hash_template(contents)
+
+        if key not in self:
+            self.fs.put(payload, _id=key)
+
+        return key
+
+    def get(self, key):
+        import gridfs
+
+        try:
+            payload = self.fs.get(key).read()
+        except gridfs.errors.NoFile:
+            raise KeyError("Template '{}' not found in store".format(key))
+
+        return json.loads(payload.decode('utf8'))
+
+
+def get_store(location):
+    """Get the template store at *location*
+
+    Parameters
+    ----------
+    location : str
+      either a MongoDB connection string or a path to a directory
+
+    Returns
+    -------
+    store : FileStore or GridFSStore
+    """
+    if location.startswith(('mongodb://', 'mongodb+srv://')):
+        return GridFSStore(location)
+    else:
+        return FileStore(location)
+
+
+def fetch_template(location, key, cache_dir=None):
+    """Get a template, using a copy cached on this machine if possible
+
+    Parameters
+    ----------
+    location : str
+      location of the template store
+    key : str
+      hash of the template to fetch
+    cache_dir : str, optional
+      local directory to cache templates in, defaults to the
+      GCMCWORKFLOW_CACHE environment variable or ~/.gcmcworkflow/templates
+
+    Returns
+    -------
+    contents : dict or list
+      the template as it was put into the store
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('GCMCWORKFLOW_CACHE', DEFAULT_CACHE)
+    cache = FileStore(cache_dir)
+
+    try:
+        return cache.get(key)
+    except KeyError:
+        pass
+
+    contents = get_store(location).get(key)
+    cache.put(contents)
+
+    return contents
+
+
+def write_template(target, contents):
+    """Write a template fetched from a store to *target*
+
+    Parameters
+    ----------
+    target : str
+      directory to create
+    contents : dict or list
+      either dictionary of filename: contents or packed files
+
+    Returns
+    -------
+    path : str
+      absolute path to the written template
+    """
+    if isinstance(contents, list):
+        return utils.dump_tree(target, contents)
+    else:
+        return utils.dump_directory(target, contents)
+
+
+def dir_size(path):
+    """Total size in bytes of files within *path*"""
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for fn in filenames:
+            total += os.path.getsize(os.path.join(root, fn))
+    return total
+
+
+class TemplateCache(object):
+    """Copies of templates kept on this node, evicted least recently used
+
+    Templates in use through ``checkout`` hold a shared lock on
+    ".locks/<key>", and are only evicted once nothing holds this lock.
+
+    Parameters
+    ----------
+    path : str
+      local directory to keep templates in, environment variables and
+      ~ are expanded so that eg '$TMPDIR/templates' resolves per node
+    max_size : float, optional
+      size budget in bytes, once exceeded the least recently used
+      templates are removed.  Defaults to no limit
+    """
+    def __init__(self, path, max_size=None):
+        self.path = os.path.abspath(
+            os.path.expanduser(os.path.expandvars(path)))
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def entries(self):
+        """All complete templates in the cache, oldest access first"""
+        names = [d for d in os.listdir(self.path)
+                 if not (d.startswith('.') or d.endswith('.tmp'))]
+        paths = [os.path.join(self.path, d) for d in names]
+
+        return sorted(paths, key=os.path.getmtime)
+
+    def _target(self, key):
+        if not key:
+            raise ValueError("Templates in the cache need a key")
+
+        return os.path.join(self.path, key)
+
+    def _lock_path(self, key):
+        lockdir = os.path.join(self.path, '.locks')
+        os.makedirs(lockdir, exist_ok=True)
+
+        return os.path.join(lockdir, key)
+
+    @contextmanager
+    def checkout(self, key, populate):
+        """Use a cached template, which can't be evicted until finished
+
+        Parameters
+        ----------
+        key, populate
+          as per get
+
+        Yields
+        ------
+        path : str
+          path to the local copy of the template
+        """
+        self._target(key)
+        with open(self._lock_path(key), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            try:
+                yield self.get(key, populate)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key, populate):
+        """Return path to cached template, creating it on first use
+
+        Parameters
+        ----------
+        key : str
+          identifier of the template, ie the simhash
+        populate : function
+          called with a directory path, must create the template there
+
+        Returns
+        -------
+        path : str
+          path to the local copy of the template
+        """
+        target = self._target(key)
+
+        if not os.path.isdir(target):
+            # build privately then rename, if another process on this
+            # node got there first the rename fails and we use theirs
+            tmp = '{}.{}.tmp'.format(target, os.getpid())
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+            populate(tmp)
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+        # mark as recently used
+        now = time.time()
+        os.utime(target, (now, now))
+
+        self.evict(keep=target)
+
+        return target
+
+    def evict(self, keep=None):
+        """Remove least recently used templates until within budget
+
+        Parameters
+        ----------
+        keep : str, optional
+          path of a template which must not be removed
+
+        Templates checked out by any process are also kept.
+        """
+        if self.max_size is None:
+            return
+
+        entries = self.entries()
+        sizes = {e: dir_size(e) for e in entries}
+        total = sum(sizes.values())
+
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            with open(self._lock_path(os.path.basename(entry)), 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # still being copied from, try again next time
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
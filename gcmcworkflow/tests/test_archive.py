@@ -0,0 +1,89 @@
+"""Tests for archiving finished sampling points
+
+"""
+import json
+import os
+import pytest
+import zipfile
+
+import gcmcworkflow as gcwf
+
+
+@pytest.fixture
+def finished_point(in_temp_dir):
+    # two generations of two parallel runs at one condition, plus another
+    for T, P, gen, v in [(200.0, 10.0, 1, 0), (200.0, 10.0, 1, 1),
+                         (200.0, 10.0, 2, 0), (200.0, 10.0, 2, 1),
+                         (200.0, 20.0, 1, 0)]:
+        path = gcwf.utils.gen_sim_path('abcdefg', T, P, gen, v)
+        os.makedirs(os.path.join(path, 'Output'))
+        with open(os.path.join(path, 'Output', 'output.data'), 'w') as out:
+            out.write('gen {} v{}\n'.format(gen, v))
+    # another workflow sharing the workdir
+    os.makedirs(gcwf.utils.gen_sim_path('1234567', 200.0, 10.0, 1, 0))
+    return os.path.abspath('.')
+
+
+def test_archive(finished_point):
+    task = gcwf.firetasks.ArchiveSimulations(
+        temperature=200.0, pressure=10.0, workdir=finished_point)
+    action = task.run_task({'simhash': 'abcdefg'})
+
+    archive = os.path.join(finished_point, 'sim_abcdefg_T200.0_P10.0.zip')
+    assert action.stored_data['archives'] == [archive]
+    assert action.stored_data['nfiles'] == 4
+
+    # raw directories for this point are gone, others are untouched
+    assert sorted(d for d in os.listdir(finished_point) if d.startswith('sim_')
+                  and os.path.isdir(d)) == ['sim_1234567_T200.0_P10.0_gen1_v0',
+                                            'sim_abcdefg_T200.0_P20.0_gen1_v0']
+
+    with open(archive + '.index.json') as inf:
+        index = json.load(inf)
+    assert len(index) == 4
+    member = index['sim_abcdefg_T200.0_P10.0_gen2_v1'][0]
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.read(member) == b'gen 2 v1\n'
+
+
+def test_archive_added_to(finished_point):
+    task = gcwf.firetasks.ArchiveSimulations(
+        temperature=200.0, pressure=10.0, workdir=finished_point,
+        simhash='abcdefg')
+    task.run_task({})
+    # a later generation appears after the first archive was made
+    path = gcwf.utils.gen_sim_path('abcdefg', 200.0, 10.0, 3, 0)
+    os.makedirs(path)
+    with open(os.path.join(path, 'output.data'), 'w') as out:
+        out.write('gen 3 v0\n')
+
+    action = task.run_task({})
+
+    assert action.stored_data['nfiles'] == 1
+    archive = os.path.join(finished_point, 'sim_abcdefg_T200.0_P10.0.zip')
+    with open(archive + '.index.json') as inf:
+        index = json.load(inf)
+    assert len(index) == 5
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.read(index['sim_abcdefg_T200.0_P10.0_gen1_v0'][0]) == (
+            b'gen 1 v0\n')
+        assert zf.read(index['sim_abcdefg_T200.0_P10.0_gen3_v0'][0]) == (
+            b'gen 3 v0\n')
+
+
+def test_archive_stage_created(sample_input):
+    spec = dict(
+        template={'simulation.input': 'sim\nsettings\n'},
+        workdir='',
+        name='Hurley',
+        conditions=[(204.5, [10.0, 20.0], 0)],
+        nparallel=1,
+        archive=True,
+    )
+    wf = gcwf.workflow_creator.make_workflow(spec)
+
+    archives = [f for f in wf.fws if f.name.startswith('Archive')]
+    assert len(archives) == 2
+    for f in archives:
+        parent, = wf.links.parent_links[f.fw_id]
+        assert wf.id_fw[parent].name.startswith('Analyse')
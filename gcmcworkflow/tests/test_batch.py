@@ -0,0 +1,165 @@
+"""Tests for evaluating batches of GA candidates in one Firework
+
+"""
+import os
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.genetics import EvaluateBatch, cache_index, cache_key
+from gcmcworkflow.template_store import TemplateCache
+
+
+MAPPING = [
+    {'file': 'force_field.def',
+     'pattern': r'C_co2 C_co2',
+     'fields': [[3, 0], [4, 1]]},
+]
+CONDITIONS = ((200.0, 10.0, 1.0), (200.0, 20.0, 2.0))
+
+
+def updater(simtree, candidate):
+    pass
+
+
+def test_collate():
+    evaluated = [
+        (1, 200.0, 10.0, 0.1, 1.1),
+        (0, 200.0, 10.0, 0.2, 1.2),
+        (1, 200.0, 20.0, 0.3, 2.6),
+        (0, 200.0, 20.0, 0.0, 2.0),
+    ]
+
+    fitness, evaluations = EvaluateBatch.collate([0, 1], evaluated)
+
+    assert fitness[0] == (0, pytest.approx(0.2 ** 2))
+    assert fitness[1] == (1, pytest.approx(0.1 ** 2 + 0.3 ** 2))
+    assert evaluations[1] == (1, [(200.0, 10.0, 0.1, 1.1),
+                                  (200.0, 20.0, 0.3, 2.6)])
+
+
+def test_all_cached():
+    candidates = [(1.0, 2.0), (3.0, 4.0)]
+    cache = {cache_index(c, T, P): [cache_key(c), T, P, 0.1, 1.0]
+             for c in candidates for T, P, _ in CONDITIONS}
+    task = EvaluateBatch(candidate_ids=[0, 1], conditions=CONDITIONS,
+                         updater=MAPPING)
+
+    action = task.run_task({'candidates': candidates,
+                            'fitness_cache': cache,
+                            'template': 'nowhere'})
+
+    push = action.mod_spec[0]['_push_all']
+    assert [f[0] for f in push['fitness']] == [0, 1]
+    assert push['fitness'][0][1] == pytest.approx(2 * 0.1 ** 2)
+    assert action.stored_data['ncached'] == 4
+
+
+def test_evaluate_job(sample_input, monkeypatch):
+    monkeypatch.setattr(gcwf.firetasks.RunSimulation, 'run_simulation',
+                        lambda self, rundir: None)
+    monkeypatch.setattr(gcwf.genetics.EvaluateResult, 'grab_result',
+                        staticmethod(lambda loc: 1.5))
+
+    result = gcwf.genetics.evaluate_job({
+        'candidate_id': 3,
+        'candidate': (12.5, 2.5),
+        'temperature': 200.0,
+        'pressure': 10.0,
+        'reference': 1.0,
+        'ncycles': 100,
+        'updater': MAPPING,
+        'template': os.path.abspath('template'),
+        'simhash': '',
+        'scratch': None,
+        'stage_patterns': None,
+        'allow_fail': False,
+    })
+
+    assert result == (3, 200.0, 10.0, 0.5, 1.5, None)
+    sims = os.listdir('candidate_3')
+    assert len(sims) == 1
+    with open(os.path.join('candidate_3', sims[0], 'force_field.def')) as inf:
+        assert 'C_co2 C_co2  lennard-jones 12.5   2.5' in inf.read()
+
+
+@pytest.fixture
+def fake_sims(sample_input, monkeypatch):
+    monkeypatch.setattr(gcwf.firetasks.RunSimulation, 'run_simulation',
+                        lambda self, rundir: None)
+
+    def grab_result(loc):
+        if loc.startswith('candidate_1'):
+            raise ValueError('RASPA fell over')
+        return 1.5
+    monkeypatch.setattr(gcwf.genetics.EvaluateResult, 'grab_result',
+                        staticmethod(grab_result))
+
+
+def test_failure_keeps_batch(fake_sims):
+    task = EvaluateBatch(candidate_ids=[0, 1], conditions=CONDITIONS,
+                         updater=MAPPING, nprocs=1)
+
+    action = task.run_task({'candidates': [(12.5, 2.5), (13.0, 2.5)],
+                            'template': os.path.abspath('template')})
+
+    push = action.mod_spec[0]['_push_all']
+    fitness = dict(push['fitness'])
+    assert fitness[0] == pytest.approx(0.5 ** 2 + 0.25 ** 2)
+    assert fitness[1] == float('inf')
+    evaluations = dict(push['evaluations'])
+    # failures aren't cached
+    assert len(evaluations[0]) == 2
+    assert evaluations[1] == []
+    assert len(action.stored_data['failed']) == 2
+    assert 'RASPA fell over' in action.stored_data['failed'][0][-1]
+
+
+def test_batch_template_cache(fake_sims):
+    task = EvaluateBatch(candidate_ids=[0], conditions=CONDITIONS[:1],
+                         updater=MAPPING, nprocs=1)
+    spec = {'candidates': [(12.5, 2.5)], 'template_cache': 'cache',
+            'template_hash': 'abcdef0'}
+
+    # GA specs have no simhash, so the template hash keys the cache
+    task.run_task(dict(spec, template=os.path.abspath('template')))
+    assert os.path.isdir(os.path.join('cache', 'abcdef0'))
+    # template isn't visible here, but is in the node's cache
+    action = task.run_task(dict(spec, template='/not/on/this/node'))
+
+    assert action.stored_data['failed'] == []
+
+
+def test_batch_template_cache_by_path(fake_sims):
+    task = EvaluateBatch(candidate_ids=[0], conditions=CONDITIONS[:1],
+                         updater=MAPPING, nprocs=1)
+
+    action = task.run_task({'candidates': [(12.5, 2.5)],
+                            'template': os.path.abspath('template'),
+                            'template_cache': 'cache'})
+
+    assert action.stored_data['failed'] == []
+    entry, = TemplateCache('cache').entries()
+    assert os.path.exists(os.path.join(entry, 'simulation.input'))
+
+
+def test_batched_workflow(sample_input):
+    wf = gcwf.make_genetics.make_genetic_workflow(
+        ngens=1, ncandidates=5, template='template',
+        initial_pop=[(1.0, 2.0)] * 5, bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=CONDITIONS, ff_updater=updater, wf_name='Hurley',
+        batch_size=2,
+    )
+
+    names = sorted(f.name for f in wf.fws)
+    assert names == sorted([
+        'Firstgen PreGA', 'PreGA G=1', 'PostGA G=0', 'PostGA G=1',
+        'BatchSim G=0 C=0-1', 'BatchSim G=0 C=2-3', 'BatchSim G=0 C=4-4',
+        'BatchSim G=1 C=0-1', 'BatchSim G=1 C=2-3', 'BatchSim G=1 C=4-4',
+    ])
+
+
+def test_batch_and_screening():
+    with pytest.raises(ValueError):
+        gcwf.make_genetics.make_candidate_stages(
+            4, CONDITIONS, 0, updater, None, 'Hurley',
+            screening={}, batch_size=2)
@@ -0,0 +1,93 @@
+"""Tests for skipping candidates which have already been simulated"""
+
+import pytest
+
+from gcmcworkflow.genetics import (
+    CheckFitnessCache,
+    UpdateFitnessCache,
+    cache_index,
+    cache_key,
+)
+
+
+@pytest.fixture
+def cache():
+    candidates = [(1.0, 2.0), (3.0, 4.0)]
+    evaluations = [
+        (0, [(200.0, 10.0, 0.1, 4.5), (200.0, 20.0, 0.2, 5.5)]),
+        (1, [(200.0, 10.0, 0.3, 6.5)]),
+    ]
+    return UpdateFitnessCache.update({}, candidates, evaluations)
+
+
+def test_key_tolerance():
+    assert cache_key((1.0, 2.0)) == cache_key((1.0 + 1e-9, 2.0 - 1e-9))
+    assert cache_key((1.0, 2.0)) != cache_key((1.001, 2.0))
+
+
+def test_index():
+    assert cache_index((1.0, 2.0), 200.0, 10.0) == cache_index(
+        (1.0 + 1e-9, 2.0), 200.0, 10.0)
+    assert cache_index((1.0, 2.0), 200.0, 10.0) != cache_index(
+        (1.0, 2.0), 200.0, 20.0)
+    assert '.' not in cache_index((1.5, 2.25), 200.0, 10.0)
+
+
+def test_update(cache):
+    assert len(cache) == 3
+    assert cache[cache_index((3.0, 4.0), 200.0, 10.0)] == [
+        cache_key((3.0, 4.0)), 200.0, 10.0, 0.3, 6.5]
+
+
+def test_update_no_duplicates(cache):
+    before = dict(cache)
+    again = UpdateFitnessCache.update(
+        cache, [(1.0, 2.0)], [(0, [(200.0, 10.0, 0.9, 9.9)])])
+
+    assert again == before
+
+
+def test_hit(cache):
+    task = CheckFitnessCache(candidate_id=1, temperature=200.0,
+                             pressure=20.0)
+    action = task.run_task({
+        'candidates': [(3.0, 4.0), (1.0 + 1e-9, 2.0)],
+        'fitness_cache': cache,
+    })
+
+    assert action.exit
+    pushed = action.mod_spec[0]['_push']
+    assert pushed['error'] == 0.2
+    assert pushed['results_array'] == (200.0, 20.0, 5.5, 1, 1)
+    assert pushed['evaluations'] == (200.0, 20.0, 0.2, 5.5)
+
+
+def test_screening_hit(cache):
+    task = CheckFitnessCache(candidate_id=1, temperature=200.0,
+                             pressure=20.0, screening=True)
+    action = task.run_task({
+        'candidates': [(3.0, 4.0), (1.0, 2.0)],
+        'fitness_cache': cache,
+    })
+
+    assert action.exit
+    # full length result takes the place of the screening run
+    assert action.mod_spec[0]['_push'] == {
+        'screening': (1, 200.0, 20.0, 0.2, 5.5)}
+
+
+@pytest.mark.parametrize('spec', [
+    # only evaluated at a different condition
+    {'candidates': [(3.0, 4.0)]},
+    # no cache yet
+    {'candidates': [(1.0, 2.0)], 'fitness_cache': {}},
+])
+def test_miss(cache, spec):
+    spec.setdefault('fitness_cache', cache)
+    task = CheckFitnessCache(candidate_id=0, temperature=200.0,
+                             pressure=20.0)
+
+    action = task.run_task(spec)
+
+    assert not action.exit
+    assert not action.mod_spec
@@ -0,0 +1,127 @@
+"""Tests for declarative forcefield mappings
+
+"""
+import os
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow import forcefield
+
+
+FF = """\
+# number of defined interactions
+2
+# type interaction
+O1  lennard-jones  700.0  2.98
+Ar  lennard-jones  119.80 3.40
+# {braces} are left alone
+"""
+
+MAPPING = [
+    {'file': 'ff.def',
+     'pattern': r'Ar\s',
+     'fields': [[2, 0], [3, 1]]},
+]
+
+
+@pytest.fixture
+def template(tmpdir):
+    path = tmpdir.mkdir('template')
+    path.join('ff.def').write(FF)
+    return str(path)
+
+
+def test_compile_file():
+    fmt = forcefield.compile_file(FF, MAPPING)
+
+    assert fmt.format(100.0, 3.5) == FF.replace(
+        '119.80 3.40', '100.0 3.5')
+
+
+def test_compile_rules_same_line():
+    rules = [{'file': 'ff.def', 'pattern': r'Ar\s', 'fields': [[2, 0]]},
+             {'file': 'ff.def', 'pattern': r'Ar\s', 'fields': [[3, 1]]}]
+
+    fmt = forcefield.compile_file(FF, rules)
+
+    assert 'Ar  lennard-jones  7.0 8.0\n' in fmt.format(7.0, 8.0)
+
+
+def test_compile_conflicting_rules():
+    rules = [{'file': 'ff.def', 'pattern': r'Ar\s', 'fields': [[2, 0]]},
+             {'file': 'ff.def', 'pattern': r'A', 'fields': [[2, 1]]}]
+
+    with pytest.raises(ValueError):
+        forcefield.compile_file(FF, rules)
+
+
+def test_compile_no_match():
+    with pytest.raises(ValueError):
+        forcefield.compile_file(FF, [{'file': 'ff.def', 'pattern': 'Xe',
+                                      'fields': [[2, 0]]}])
+
+
+def test_compile_no_field():
+    with pytest.raises(ValueError):
+        forcefield.compile_file(FF, [{'file': 'ff.def', 'pattern': 'Ar',
+                                      'fields': [[7, 0]]}])
+
+
+def test_apply_mapping(template, tmpdir):
+    sim = tmpdir.mkdir('sim')
+    sim.join('ff.def').write(FF)
+
+    forcefield.apply_mapping(str(sim), (100.0, 3.5), MAPPING,
+                             template=template)
+
+    assert 'Ar  lennard-jones  100.0 3.5\n' in sim.join('ff.def').read()
+
+
+def test_compiled_once(template, tmpdir, monkeypatch):
+    forcefield.get_compiled(template, MAPPING)
+    # would fail if the template was compiled again
+    monkeypatch.setattr(forcefield, 'compile_mapping', None)
+
+    for i in range(3):
+        sim = tmpdir.mkdir('sim{}'.format(i))
+        forcefield.apply_mapping(str(sim), (1.0 * i, 2.0), MAPPING,
+                                 template=template)
+        assert '{} 2.0'.format(1.0 * i) in sim.join('ff.def').read()
+
+
+def test_compiled_template_replaced(template, tmpdir):
+    forcefield.get_compiled(template, MAPPING)
+    # a new template at the same location
+    ff = os.path.join(template, 'ff.def')
+    with open(ff, 'w') as out:
+        out.write(FF.replace('Ar  lennard-jones  119.80 3.40',
+                             'Ar  lennard-jones  119.8 3.4 0.0'))
+    st = os.stat(ff)
+    os.utime(ff, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    sim = tmpdir.mkdir('sim')
+    forcefield.apply_mapping(str(sim), (1.0, 2.0), MAPPING,
+                             template=template)
+
+    assert 'Ar  lennard-jones  1.0 2.0 0.0\n' in sim.join('ff.def').read()
+
+
+def test_manipulate_forcefield(template, tmpdir):
+    sim = tmpdir.mkdir('sim')
+    sim.join('ff.def').write(FF)
+    task = gcwf.genetics.ManipulateForcefield(candidate_id=1,
+                                              updater=MAPPING)
+
+    task.run_task({'simtree': str(sim), 'template': template,
+                   'candidates': [(1.0, 2.0), (50.0, 4.0)]})
+
+    assert 'Ar  lennard-jones  50.0 4.0\n' in sim.join('ff.def').read()
+
+
+def test_mapping_in_sim_fw():
+    sim = gcwf.make_genetics.Sim_FW(200.0, 10.0, 1.0, 0, 0, MAPPING,
+                                    None, 'Hurley')
+
+    manip = [t for t in sim.tasks
+             if isinstance(t, gcwf.genetics.ManipulateForcefield)][0]
+    assert manip['updater'] == MAPPING
@@ -0,0 +1,128 @@
+"""Tests for recording resource usage of Firetasks
+
+"""
+import fireworks as fw
+from fireworks.utilities.fw_utilities import explicit_serialize as xs
+import os
+import pstats
+import pytest
+
+from gcmcworkflow import instrument
+
+
+@xs
+class SleepyTask(fw.FiretaskBase):
+    @instrument.instrumented
+    def run_task(self, fw_spec):
+        with instrument.phase('write'):
+            with open('data', 'wb') as out:
+                out.write(b'x' * 100000)
+        for _ in range(3):
+            with instrument.phase('spin'):
+                sum(range(10000))
+
+        return fw.FWAction(stored_data={'answer': 42})
+
+
+@xs
+class QuietTask(fw.FiretaskBase):
+    @instrument.instrumented
+    def run_task(self, fw_spec):
+        return None
+
+
+def test_stored_data(in_temp_dir):
+    action = SleepyTask().run_task({})
+
+    assert action.stored_data['answer'] == 42
+    timings = action.stored_data['timings_SleepyTask']
+    assert set(timings) == {'total', 'write', 'spin'}
+    assert timings['spin']['count'] == 3
+    assert timings['total']['wall'] >= timings['write']['wall']
+
+
+def test_bytes_written(in_temp_dir):
+    action = SleepyTask().run_task({})
+
+    written = action.stored_data['timings_SleepyTask']['write']
+    assert written['written_bytes'] >= 100000
+
+
+def test_no_action():
+    action = QuietTask().run_task({})
+
+    assert 'timings_QuietTask' in action.stored_data
+
+
+def test_phase_outside_task():
+    # no instrumented task running, so nothing to record into
+    with instrument.phase('lonely'):
+        pass
+
+
+def test_nested_tasks():
+    @xs
+    class OuterTask(fw.FiretaskBase):
+        @instrument.instrumented
+        def run_task(self, fw_spec):
+            QuietTask().run_task({})
+            with instrument.phase('after'):
+                pass
+            return None
+
+    timings = OuterTask().run_task({}).stored_data['timings_OuterTask']
+
+    assert set(timings) == {'total', 'after'}
+
+
+def test_no_profile_by_default(in_temp_dir):
+    action = SleepyTask().run_task({})
+
+    assert 'profile_SleepyTask' not in action.stored_data
+    assert not [fn for fn in os.listdir('.') if fn.endswith('.prof')]
+
+
+def test_profile_next_to_simtree(in_temp_dir):
+    os.mkdir('sim')
+
+    action = SleepyTask().run_task({'profile': True, 'simtree': 'sim'})
+
+    path = action.stored_data['profile_SleepyTask']
+    assert os.path.dirname(path) == os.path.abspath('sim')
+    # profile is readable and contains our task
+    stats = pstats.Stats(path)
+    assert any(func[2] == 'run_task' for func in stats.stats)
+
+
+@pytest.mark.parametrize('setting,expected', [
+    (['SleepyTask'], True),
+    (['Analyse'], False),
+    (False, False),
+])
+def test_profile_selected_tasks(in_temp_dir, setting, expected):
+    action = SleepyTask().run_task({'profile': setting})
+
+    assert ('profile_SleepyTask' in action.stored_data) == expected
+
+
+@pytest.mark.skipif(not instrument._reset_peak(),
+                    reason='peak memory cannot be reset here')
+def test_peak_within_phase():
+    @xs
+    class HungryTask(fw.FiretaskBase):
+        @instrument.instrumented
+        def run_task(self, fw_spec):
+            with instrument.phase('big'):
+                block = bytearray(100 * 1024 ** 2)
+                del block
+            with instrument.phase('small'):
+                pass
+            return None
+
+    timings = HungryTask().run_task({}).stored_data['timings_HungryTask']
+
+    assert timings['big']['peak_rss_mb'] > 100
+    # the earlier allocation doesn't leak into later phases
+    assert timings['small']['peak_rss_mb'] < timings['big']['peak_rss_mb'] - 50
+    # but does count towards the enclosing phase
+    assert timings['total']['peak_rss_mb'] >= timings['big']['peak_rss_mb']
@@ -0,0 +1,270 @@
+"""Tests for querying the LaunchPad, using mongomock in place of MongoDB
+
+"""
+import datetime
+import fireworks as fw
+import pytest
+
+import gcmcworkflow as gcwf
+
+mongomock = pytest.importorskip('mongomock')
+
+
+T0 = datetime.datetime(2018, 1, 1)
+
+
+class FakeLaunchPad(object):
+    """Just enough of a LaunchPad to query"""
+    def __init__(self):
+        db = mongomock.MongoClient().db
+        self.workflows = db.workflows
+        self.fireworks = db.fireworks
+        self.launches = db.launches
+        self.lostrun_queries = []
+        self.lost_ids = []
+
+    def detect_lostruns(self, query=None):
+        self.lostrun_queries.append(query)
+        return [], self.lost_ids, []
+
+    def bulk_add_wfs(self, wfs):
+        self.workflows.insert_many(
+            {'name': wf.name, 'metadata': wf.metadata, 'nodes': []}
+            for wf in wfs)
+
+
+@pytest.fixture
+def lpad():
+    lp = FakeLaunchPad()
+    fws = [
+        # (fw_id, name, state)
+        (1, 'Template Init', 'COMPLETED'),
+        (2, 'Sim T=200.0 P=10.0 v0', 'COMPLETED'),
+        (3, 'Sim T=200.0 P=10.0 v1', 'COMPLETED'),
+        (4, 'Sim T=200.0 P=20.0 v0', 'RUNNING'),
+        (5, 'Sim T=200.0 P=20.0 v1', 'RUNNING'),
+        # restart of v0 at 10.0
+        (6, 'Sim T=200.0 P=10.0 v0', 'FIZZLED'),
+    ]
+    for fw_id, name, state in fws:
+        lp.fireworks.insert_one({'fw_id': fw_id, 'name': name, 'state': state,
+                                 'spec': {'_category': 'Hurley'},
+                                 'updated_on': T0})
+    # a Firework from another workflow
+    lp.fireworks.insert_one({'fw_id': 7, 'name': 'Sim T=200.0 P=10.0 v0',
+                             'state': 'READY', 'spec': {}})
+    lp.workflows.insert_one({'name': 'Hurley',
+                             'metadata': {'GCMCWorkflow': True},
+                             'nodes': [1, 2, 3, 4, 5, 6],
+                             'updated_on': T0})
+    return lp
+
+
+def test_report(lpad):
+    lpad.lost_ids = [5]
+
+    status = gcwf.launchpad_utils.get_workflow_report('Hurley', lp=lpad)
+
+    assert sorted(status[200.0, 10.0]) == ['COMPLETED', 'FIZZLED']
+    assert sorted(status[200.0, 20.0]) == ['LOST', 'RUNNING']
+    assert len(status) == 2
+
+
+def test_status_integer_conditions():
+    sims = [{'_id': 'Sim T=300 P=1000 v0', 'fw_id': 1, 'state': 'COMPLETED'},
+            {'_id': 'Sim T=300 P=1000 v1', 'fw_id': 2, 'state': 'RUNNING'}]
+
+    status = gcwf.launchpad_utils._build_status(sims, lost_ids=[2])
+
+    assert sorted(status[300.0, 1000.0]) == ['COMPLETED', 'LOST']
+
+
+def test_report_lostruns_restricted(lpad):
+    gcwf.launchpad_utils.get_workflow_report('Hurley', lp=lpad)
+
+    query, = lpad.lostrun_queries
+    assert sorted(query['fw_id']['$in']) == [4, 5]
+
+
+def test_report_lostruns_old_fireworks(lpad):
+    # detect_lostruns without the query keyword, as before Fireworks 1.8.0
+    def detect_lostruns(expiration_secs=None):
+        return [], [4, 99], []
+    lpad.detect_lostruns = detect_lostruns
+
+    status = gcwf.launchpad_utils.get_workflow_report('Hurley', lp=lpad)
+
+    assert sorted(status[200.0, 20.0]) == ['LOST', 'RUNNING']
+
+
+def make_wf(name):
+    return fw.Workflow([fw.Firework([gcwf.fw_utils.NothingTask()])],
+                       name=name, metadata={'GCMCWorkflow': True})
+
+
+def test_workflow_exists(lpad):
+    assert gcwf.launchpad_utils.workflow_exists('Hurley', lp=lpad)
+    assert not gcwf.launchpad_utils.workflow_exists('Ciaran', lp=lpad)
+
+
+def test_submit_workflows(lpad):
+    gcwf.launchpad_utils.submit_workflows(
+        [make_wf('A'), make_wf('B'), make_wf('C')], lp=lpad, batch_size=2)
+
+    assert sorted(gcwf.launchpad_utils.get_workflow_names(lp=lpad)) == [
+        'A', 'B', 'C', 'Hurley']
+
+
+@pytest.mark.parametrize('names', [['A', 'A'], ['A', 'Hurley']])
+def test_submit_duplicates(lpad, names):
+    with pytest.raises(ValueError):
+        gcwf.launchpad_utils.submit_workflows(
+            [make_wf(n) for n in names], lp=lpad)
+
+    # nothing was added
+    assert gcwf.launchpad_utils.get_workflow_names(lp=lpad) == ['Hurley']
+
+
+def test_unique_index(lpad):
+    gcwf.launchpad_utils.ensure_indexes(lpad)
+
+    with pytest.raises(Exception):
+        lpad.workflows.insert_one({'name': 'Hurley',
+                                   'metadata': {'GCMCWorkflow': True}})
+    # non GCMCWorkflows are unaffected
+    lpad.workflows.insert_one({'name': 'Hurley', 'metadata': {}})
+
+
+def test_follow_report(lpad):
+    reports = gcwf.launchpad_utils.follow_workflow_report(
+        'Hurley', lp=lpad, interval=0)
+
+    first = next(reports)
+    assert sorted(first[200.0, 20.0]) == ['RUNNING', 'RUNNING']
+
+    # one run finishes
+    lpad.fireworks.update_one(
+        {'fw_id': 4},
+        {'$set': {'state': 'COMPLETED',
+                  'updated_on': T0 + datetime.timedelta(seconds=5)}})
+    second = next(reports)
+    assert sorted(second[200.0, 20.0]) == ['COMPLETED', 'RUNNING']
+
+    # a restart is added to the workflow
+    later = T0 + datetime.timedelta(seconds=10)
+    lpad.fireworks.insert_one({'fw_id': 8, 'name': 'Sim T=200.0 P=20.0 v1',
+                               'state': 'READY', 'updated_on': later})
+    lpad.workflows.update_one({'name': 'Hurley'},
+                              {'$push': {'nodes': 8},
+                               '$set': {'updated_on': later}})
+    third = next(reports)
+    assert sorted(third[200.0, 20.0]) == ['COMPLETED', 'READY']
+    assert sorted(third[200.0, 10.0]) == ['COMPLETED', 'FIZZLED']
+
+
+@pytest.fixture
+def campaign():
+    lp = FakeLaunchPad()
+    fws = [
+        # (fw_id, wfname, name, state)
+        (1, 'Hurley', 'Sim T=200.0 P=10.0 v0', 'COMPLETED'),
+        (2, 'Hurley', 'PostProcess T=200.0 P=10.0 v0', 'COMPLETED'),
+        (3, 'Hurley', 'Analyse T=200.0 P=10.0', 'COMPLETED'),
+        (4, 'Hurley', 'Sim T=200.0 P=20.0 v0', 'RUNNING'),
+        (5, 'Hurley', 'PostProcess T=200.0 P=20.0 v0', 'WAITING'),
+        (6, 'Hurley', 'Analyse T=200.0 P=20.0', 'WAITING'),
+        (7, 'Hurley', 'Sim T=200.0 P=30.0 v0', 'COMPLETED'),
+        (8, 'Hurley', 'PostProcess T=200.0 P=30.0 v0', 'FIZZLED'),
+        (9, 'Hurley', 'Analyse T=200.0 P=30.0', 'WAITING'),
+        (10, 'Kate', 'Sim T=300.0 P=10.0 v0', 'COMPLETED'),
+        (11, 'Kate', 'PostProcess T=300.0 P=10.0 v0', 'COMPLETED'),
+        (12, 'Kate', 'Analyse T=300.0 P=10.0', 'COMPLETED'),
+        # restart of Kate's point, so no longer complete
+        (13, 'Kate', 'Sim T=300.0 P=10.0 v0', 'READY'),
+        (14, 'Kate', 'PostProcess T=300.0 P=10.0 v0', 'WAITING'),
+        (15, 'Kate', 'Analyse T=300.0 P=10.0', 'WAITING'),
+    ]
+    for fw_id, wfname, name, state in fws:
+        lp.fireworks.insert_one({'fw_id': fw_id, 'name': name, 'state': state,
+                                 'spec': {'_category': wfname}})
+    for fw_id, runtime in [(1, 3600.0), (4, 1800.0), (7, 1800.0),
+                           (10, 7200.0)]:
+        lp.launches.insert_one({'fw_id': fw_id, 'runtime_secs': runtime})
+    lp.workflows.insert_one({'name': 'Hurley',
+                             'metadata': {'GCMCWorkflow': True},
+                             'nodes': list(range(1, 10)),
+                             'created_on': T0})
+    lp.workflows.insert_one({'name': 'Kate',
+                             'metadata': {'GCMCWorkflow': True},
+                             'nodes': list(range(10, 16)),
+                             'created_on': T0})
+    return lp
+
+
+def test_campaign_summary(campaign):
+    now = T0 + datetime.timedelta(hours=4)
+
+    hurley, kate = gcwf.launchpad_utils.get_campaign_summary(
+        lp=campaign, now=now)
+
+    assert hurley['name'] == 'Hurley'
+    assert hurley['points'] == 3
+    assert hurley['completed'] == 1
+    assert hurley['running'] == 1
+    assert hurley['fizzled'] == 1
+    assert hurley['waiting'] == 0
+    assert hurley['cpu_hours'] == pytest.approx(2.0)
+    # 1 of 3 done in 4 hours
+    assert hurley['eta_hours'] == pytest.approx(8.0)
+
+    assert kate['waiting'] == 1
+    assert kate['completed'] == 0
+    assert kate['cpu_hours'] == pytest.approx(2.0)
+    assert kate['eta_hours'] is None
+
+
+def test_campaign_summary_no_fw_ids(campaign, monkeypatch):
+    # listing every fw_id in a query breaks on large campaigns
+    pipelines = []
+    for coll in (campaign.fireworks, campaign.launches):
+        def recorder(pipeline, _aggregate=coll.aggregate):
+            pipelines.append(pipeline)
+            return _aggregate(pipeline)
+        monkeypatch.setattr(coll, 'aggregate', recorder)
+
+    gcwf.launchpad_utils.get_campaign_summary(lp=campaign)
+
+    assert pipelines
+    for pipeline in pipelines:
+        assert 'fw_id' not in pipeline[0]['$match']
+
+
+def make_timings(wall):
+    return {'wall': wall, 'cpu': wall / 2., 'peak_rss_mb': wall,
+            'read_bytes': 10, 'written_bytes': 20, 'count': 1}
+
+
+def test_workflow_timings(lpad):
+    for fw_id in (2, 3):
+        lpad.launches.insert_one({'fw_id': fw_id, 'action': {'stored_data': {
+            'timings_RunSimulation': {'total': make_timings(10.0),
+                                      'simulate': make_timings(9.0)},
+            'timings_PostProcess': {'total': make_timings(1.0)},
+            'result': 'abc',
+        }}})
+    # from another workflow
+    lpad.launches.insert_one({'fw_id': 7, 'action': {'stored_data': {
+        'timings_RunSimulation': {'total': make_timings(100.0)}}}})
+
+    timings = gcwf.launchpad_utils.get_workflow_timings('Hurley', lp=lpad)
+
+    assert [(t['task'], t['phase']) for t in timings] == [
+        ('RunSimulation', 'total'),
+        ('RunSimulation', 'simulate'),
+        ('PostProcess', 'total'),
+    ]
+    assert timings[0]['count'] == 2
+    assert timings[0]['wall'] == pytest.approx(20.0)
+    assert timings[0]['cpu'] == pytest.approx(10.0)
+    assert timings[0]['peak_rss_mb'] == pytest.approx(10.0)
+    assert timings[0]['written_bytes'] == 40
@@ -0,0 +1,101 @@
+"""Tests for creating genetic algorithm Workflows
+
+"""
+import pytest
+
+import gcmcworkflow as gcwf
+
+
+def updater(simtree, candidate):
+    pass
+
+
+@pytest.fixture
+def ga_settings(sample_input):
+    return dict(
+        ngens=3,
+        ncandidates=4,
+        template='template',
+        initial_pop=[(1.0, 2.0), (1.5, 2.5), (2.0, 3.0), (2.5, 3.5)],
+        bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=((200.0, 10.0, 1.0), (200.0, 20.0, 2.0)),
+        ff_updater=updater,
+        wf_name='Hurley',
+    )
+
+
+def n_per_generation(settings):
+    # PreGA, Sims, PostSims, PostGA
+    nc = settings['ncandidates']
+    return 1 + nc * len(settings['conditions']) + nc + 1
+
+
+def test_eager_workflow(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(**ga_settings)
+
+    assert len(wf.fws) == (ga_settings['ngens'] + 1) * n_per_generation(
+        ga_settings)
+
+
+def test_lazy_workflow(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(lazy=True, **ga_settings)
+
+    assert len(wf.fws) == n_per_generation(ga_settings)
+    post = [f for f in wf.fws if f.name == 'PostGA G=0'][0]
+    assert isinstance(post.tasks[-1], gcwf.genetics.SpawnGeneration)
+
+
+def test_updater_pickled_once(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(**ga_settings)
+    pickled = gcwf.utils.pickle_func(updater)
+
+    pre, = [f for f in wf.fws if f.name == 'Firstgen PreGA']
+    assert list(pre.tasks[0]['updaters'].values()) == [{'updater': pickled}]
+    sims = [f for f in wf.fws if f.name.startswith('Sim')]
+    for sim in sims:
+        manip = [t for t in sim.tasks
+                 if isinstance(t, gcwf.genetics.ManipulateForcefield)][0]
+        assert manip['updater'].startswith('template:')
+    # as it appears within a printed Firework
+    shown = repr(pickled)[1:-1]
+    assert shown in str(pre.to_dict())
+    others = [f for f in wf.fws if f is not pre]
+    assert not any(shown in str(f.to_dict()) for f in others)
+
+
+def test_spawn_generation(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(lazy=True, **ga_settings)
+    spawn = [f for f in wf.fws if f.name == 'PostGA G=0'][0].tasks[-1]
+    parents = [((1.0, 2.0), 0.1), ((1.5, 2.5), 0.2)]
+
+    action = spawn.run_task({'parents': parents, 'template': '/template',
+                             'profile': True})
+
+    new_fws = action.additions[0].fws
+    assert len(new_fws) == n_per_generation(ga_settings)
+    pre = [f for f in new_fws if f.name == 'PreGA G=1'][0]
+    assert pre.spec['parents'] == parents
+    assert pre.spec['template'] == '/template'
+    assert pre.spec['fitness_cache'] == {}
+    assert all(f.spec['profile'] for f in new_fws)
+    post = [f for f in new_fws if f.name == 'PostGA G=1'][0]
+    assert post.tasks[-1]['generation_id'] == 2
+
+
+def test_spawn_stops(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(lazy=True, **ga_settings)
+    spawn = [f for f in wf.fws if f.name == 'PostGA G=0'][0].tasks[-1]
+    settings = dict(spawn)
+    settings['generation_id'] = ga_settings['ngens'] + 1
+
+    action = gcwf.genetics.SpawnGeneration(**settings).run_task({})
+
+    assert not action.additions
+
+
+def test_sims_check_cache(ga_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(**ga_settings)
+
+    sims = [f for f in wf.fws if f.name.startswith('Sim ')]
+    assert all(isinstance(f.tasks[0], gcwf.genetics.CheckFitnessCache)
+               for f in sims)
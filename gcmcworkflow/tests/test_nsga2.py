@@ -0,0 +1,156 @@
+"""Tests for multi-objective (NSGA-II) selection in the GA
+
+"""
+import numpy as np
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.genetics import (
+    AssignFitness,
+    Replacement,
+    Tournament,
+    crowded_key,
+    crowding_distance,
+    non_dominated_sort,
+    objective_values,
+)
+
+
+def updater(simtree, candidate):
+    pass
+
+
+def naive_ranks(fitness):
+    # repeatedly peel off the non-dominated individuals
+    fitness = [tuple(f) for f in fitness]
+    ranks = [None] * len(fitness)
+    remaining = set(range(len(fitness)))
+    rank = 0
+    while remaining:
+        def dominated(i):
+            return any(fitness[j] != fitness[i] and
+                       all(a <= b for a, b in zip(fitness[j], fitness[i]))
+                       for j in remaining)
+        front = [i for i in remaining if not dominated(i)]
+        for i in front:
+            ranks[i] = rank
+        remaining -= set(front)
+        rank += 1
+    return ranks
+
+
+def test_non_dominated_sort():
+    fitness = [
+        [1.0, 4.0],
+        [2.0, 2.0],
+        [4.0, 1.0],
+        [3.0, 3.0],
+        [5.0, 5.0],
+        [2.0, 2.0],
+    ]
+
+    ranks = non_dominated_sort(fitness)
+
+    assert ranks.tolist() == [0, 0, 0, 1, 2, 0]
+
+
+@pytest.mark.parametrize('nobj', [2, 3])
+def test_non_dominated_sort_random(nobj):
+    fitness = gcwf.genetics.make_rng(5).integers(0, 6, size=(40, nobj))
+
+    assert non_dominated_sort(fitness).tolist() == naive_ranks(fitness)
+
+
+def test_crowding_distance():
+    front = [[0.0, 4.0], [1.0, 2.0], [2.0, 1.5], [4.0, 0.0]]
+
+    distance = crowding_distance(front)
+
+    assert np.isinf(distance[0]) and np.isinf(distance[3])
+    assert distance[1] == pytest.approx(2.0 / 4 + 2.5 / 4)
+    assert distance[2] == pytest.approx(3.0 / 4 + 2.0 / 4)
+
+
+def test_crowded_key_orders_fronts():
+    fitness = [[3.0, 3.0], [1.0, 4.0], [2.0, 2.0], [4.0, 1.0],
+               [2.5, 2.1]]
+
+    key = crowded_key(fitness)
+
+    # first front beats second, boundary beats middle of front
+    assert key[0] > max(key[1], key[2], key[3], key[4])
+    assert key[1] < key[2]
+
+
+def test_crowded_key_single():
+    assert crowded_key([0.3, 0.1]).tolist() == [0.3, 0.1]
+
+
+def test_objective_values():
+    evaluations = [(200.0, 10.0, 0.1, 1.0), (300.0, 10.0, 0.2, 1.0),
+                   (200.0, 20.0, 0.3, 1.0)]
+    objectives = [(200.0, 10.0, 0), (200.0, 20.0, 0), (300.0, 10.0, 1)]
+
+    assert objective_values(evaluations, objectives) == pytest.approx(
+        [0.1 ** 2 + 0.3 ** 2, 0.2 ** 2])
+
+
+def test_assign_fitness_objectives():
+    task = AssignFitness(candidate_id=2,
+                         objectives=[(200.0, 10.0, 0), (300.0, 10.0, 1)])
+
+    action = task.run_task({
+        'error': [0.1, 0.2],
+        'evaluations': [(200.0, 10.0, 0.1, 1.0), (300.0, 10.0, 0.2, 1.0)],
+    })
+
+    cid, fitness = action.mod_spec[0]['_push']['fitness']
+    assert cid == 2
+    assert fitness == pytest.approx([0.01, 0.04])
+
+
+def test_replace_pareto():
+    parents = [((0.0,), [1.0, 1.0]), ((1.0,), [5.0, 5.0])]
+    children = [((2.0,), [0.5, 3.0]), ((3.0,), [3.0, 0.5])]
+
+    new = Replacement.replace(parents, children)
+
+    # all three are in the first front, but (0.0,) is the most crowded
+    assert sorted(c for c, _ in new) == [(2.0,), (3.0,)]
+
+
+def test_tournament_multiobjective():
+    parents = [((0.0,), [1.0, 1.0]), ((1.0,), [2.0, 2.0]),
+               ((2.0,), [5.0, 5.0])]
+
+    winners = Tournament.tournament(parents, k=2,
+                                    rng=gcwf.genetics.make_rng(0), n=300)
+
+    # the most dominated parent only wins against itself
+    assert winners.count((0.0,)) > winners.count((2.0,))
+
+
+def test_objective_settings():
+    conditions = ((300.0, 10.0, 1.0), (200.0, 10.0, 1.0), (300.0, 20.0, 1.0))
+
+    objectives = gcwf.make_genetics.objective_settings('temperature',
+                                                       conditions)
+
+    assert objectives == [(300.0, 10.0, 1), (200.0, 10.0, 0),
+                          (300.0, 20.0, 1)]
+    with pytest.raises(ValueError):
+        gcwf.make_genetics.objective_settings([0, 1], conditions)
+
+
+def test_workflow_objectives(sample_input):
+    wf = gcwf.make_genetics.make_genetic_workflow(
+        ngens=1, ncandidates=2, template='template',
+        initial_pop=[(1.0, 2.0), (1.5, 2.5)],
+        bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=((200.0, 10.0, 1.0), (300.0, 10.0, 1.0)),
+        ff_updater=updater, wf_name='Hurley', objectives='temperature',
+    )
+
+    post = [f for f in wf.fws if f.name == 'PostSim G=1 C=0'][0]
+    assert post.tasks[-1]['objectives'] == [(200.0, 10.0, 0),
+                                            (300.0, 10.0, 1)]
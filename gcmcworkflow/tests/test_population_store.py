@@ -0,0 +1,200 @@
+"""Tests for keeping GA populations in a store
+
+"""
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow import population_store
+from gcmcworkflow.genetics import (
+    CheckFitnessCache,
+    Replacement,
+    Tournament,
+    UpdateFitnessCache,
+    cache_index,
+)
+from gcmcworkflow.population_store import (
+    FilePopulationStore,
+    get_population_store,
+)
+
+
+@pytest.fixture
+def store_path(tmpdir):
+    return str(tmpdir.join('populations'))
+
+
+def test_get_store(store_path):
+    assert isinstance(get_population_store(store_path), FilePopulationStore)
+
+
+def test_population_roundtrip(store_path):
+    store = FilePopulationStore(store_path)
+    pop = [((1.0, 2.0), 0.1), ((3.0, 4.0), 0.2)]
+
+    store.put_population('Hurley', 2, pop)
+
+    assert store.get_population('Hurley', 2) == pop
+
+
+def test_population_missing(store_path):
+    with pytest.raises(KeyError):
+        FilePopulationStore(store_path).get_population('Hurley', 0)
+
+
+def test_history(store_path):
+    store = FilePopulationStore(store_path)
+    store.add_history('Hurley', 0, [((1.0,), 0.5), ((2.0,), 0.4)])
+    store.add_history('Hurley', 1, [((3.0,), 0.3)])
+
+    history = store.history('Hurley')
+
+    assert [(h['generation'], h['candidate_id']) for h in history] == [
+        (0, 0), (0, 1), (1, 0)]
+    assert history[2]['candidate'] == (3.0,)
+    assert len(store.history('Hurley', generation_id=0)) == 2
+    assert store.history('Locke') == []
+
+
+@pytest.fixture
+def mongo_store(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    import pymongo
+
+    monkeypatch.setattr(pymongo, 'MongoClient', mongomock.MongoClient)
+    monkeypatch.setattr(population_store, '_MONGO_STORES', {})
+
+    return 'mongodb://localhost:27017/fireworks'
+
+
+def test_mongo_store_reused(mongo_store):
+    assert get_population_store(mongo_store) is get_population_store(
+        mongo_store)
+
+
+def test_mongo_single_write(mongo_store, monkeypatch):
+    store = get_population_store(mongo_store)
+    writes = []
+    for coll in (store.individuals, store.evaluations):
+        monkeypatch.setattr(coll, 'bulk_write',
+                            lambda requests, **kwargs: writes.append(
+                                len(requests)))
+
+    store.add_history('Hurley', 0, [((1.0,), 0.5), ((2.0,), 0.4)])
+    store.add_evaluations('Hurley', 0, UpdateFitnessCache.update(
+        {}, [(1.0,), (2.0,)], [(0, [(200.0, 10.0, 0.1, 4.5)]),
+                               (1, [(200.0, 10.0, 0.3, 6.5)])]))
+
+    # one round trip for each, rather than one per individual
+    assert writes == [2, 2]
+
+
+def test_evaluations(store_path):
+    store = get_population_store(store_path)
+    first = UpdateFitnessCache.update(
+        {}, [(1.0, 2.0)], [(0, [(200.0, 10.0, 0.1, 4.5)])])
+    again = UpdateFitnessCache.update(
+        {}, [(1.0, 2.0), (3.0, 4.0)],
+        [(0, [(200.0, 10.0, 0.9, 9.9)]), (1, [(200.0, 10.0, 0.3, 6.5)])])
+
+    store.add_evaluations('Hurley', 0, first)
+    store.add_evaluations('Hurley', 1, again)
+
+    cache = store.fitness_cache('Hurley')
+    assert len(cache) == 2
+    # first evaluation is kept
+    index = cache_index((1.0, 2.0), 200.0, 10.0)
+    assert cache[index][3:] == [0.1, 4.5]
+    assert store.lookup('Hurley', index)[3:] == [0.1, 4.5]
+    assert store.lookup('Hurley', cache_index((5.0, 6.0), 200.0,
+                                              10.0)) is None
+    assert store.fitness_cache('Locke') == {}
+
+
+def test_fitness_cache_in_store(store_path):
+    update = UpdateFitnessCache(population_store=store_path,
+                                wf_name='Hurley', generation_id=0)
+    action = update.run_task({
+        'candidates': [(1.0, 2.0)],
+        'evaluations': [(0, [(200.0, 10.0, 0.1, 4.5)])],
+    })
+    assert not action.update_spec
+
+    check = CheckFitnessCache(candidate_id=0, temperature=200.0,
+                              pressure=10.0, population_store=store_path,
+                              wf_name='Hurley')
+    action = check.run_task({'candidates': [(1.0, 2.0)]})
+
+    assert action.exit
+    assert action.mod_spec[0]['_push']['evaluations'] == (200.0, 10.0,
+                                                          0.1, 4.5)
+
+
+@pytest.mark.parametrize('nparents', [0, 3, 10])
+def test_replace_matches_sort(nparents):
+    rng = gcwf.genetics.make_rng(4)
+    parents = [((float(i),), f) for i, f in
+               enumerate(rng.uniform(size=nparents))]
+    children = [((float(i),), f) for i, f in
+                enumerate(rng.uniform(size=6), start=100)]
+
+    new = Replacement.replace(parents, children)
+
+    assert new == sorted(parents + children, key=lambda x: x[1])[:6]
+
+
+def test_replacement_with_store(store_path):
+    task0 = Replacement(population_store=store_path, wf_name='Hurley',
+                        generation_id=0)
+    action = task0.run_task({
+        'candidates': [(1.0,), (2.0,)],
+        'fitness': [(1, 0.2), (0, 0.3)],
+        'parents': [],
+    })
+    assert action.update_spec == {'generation_id': 0}
+    assert 'parents' not in action.update_spec
+
+    task1 = Replacement(population_store=store_path, wf_name='Hurley',
+                        generation_id=1)
+    action = task1.run_task({
+        'candidates': [(3.0,), (4.0,)],
+        'fitness': [(0, 0.1), (1, 0.5)],
+        'generation_id': 0,
+    })
+
+    store = FilePopulationStore(store_path)
+    assert store.get_population('Hurley', 1) == [((3.0,), 0.1),
+                                                 ((2.0,), 0.2)]
+    assert len(store.history('Hurley')) == 4
+    assert action.stored_data['best'] == ((3.0,), 0.1)
+
+
+def test_tournament_from_store(store_path):
+    FilePopulationStore(store_path).put_population(
+        'Hurley', 3, [((1.0, 2.0), 0.1), ((3.0, 4.0), 0.2)])
+    task = Tournament(population_store=store_path, wf_name='Hurley', seed=1)
+
+    action = task.run_task({'generation_id': 3})
+
+    assert len(action.update_spec['candidates']) == 2
+
+
+def test_workflow_with_store(sample_input, store_path):
+    wf = gcwf.make_genetics.make_genetic_workflow(
+        ngens=1, ncandidates=2, template='template',
+        initial_pop=[(1.0, 2.0), (1.5, 2.5)],
+        bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=((200.0, 10.0, 1.0),),
+        ff_updater=[], wf_name='Hurley',
+        population_store=store_path,
+    )
+
+    pre = [f for f in wf.fws if f.name == 'PreGA G=1'][0]
+    # only the generation id is passed along
+    assert pre.tasks[-1]['keys'] == ['template', 'generation_id']
+    assert pre.tasks[0]['population_store'] == store_path
+    sim = [f for f in wf.fws if f.name.startswith('Sim')][0]
+    assert sim.tasks[0]['population_store'] == store_path
+    post = [f for f in wf.fws if f.name == 'PostGA G=1'][0]
+    assert post.tasks[0]['generation_id'] == 1
+    assert post.tasks[1]['population_store'] == store_path
+    assert post.tasks[-1]['keys'] == ['template']
@@ -0,0 +1,96 @@
+"""Tests for RunSimulation in scratch space
+
+"""
+import os
+import pytest
+import stat
+
+import gcmcworkflow as gcwf
+
+
+@pytest.fixture
+def fake_raspa(in_temp_dir, monkeypatch):
+    # 'simulate' which writes output, restart and some junk
+    os.mkdir('bin')
+    exe = os.path.join('bin', 'simulate')
+    with open(exe, 'w') as out:
+        out.write('#!/bin/sh\n'
+                  'mkdir -p Output/System_0 Restart Movies\n'
+                  'echo done > Output/System_0/output.data\n'
+                  'echo restart > Restart/restart.data\n'
+                  'echo junk > Movies/movie.pdb\n'
+                  'echo $PWD > rundir.txt\n')
+    os.chmod(exe, os.stat(exe).st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', os.path.abspath('bin') + os.pathsep +
+                       os.environ['PATH'])
+
+    os.mkdir('sim')
+    with open(os.path.join('sim', 'simulation.input'), 'w') as out:
+        out.write('SimulationType MonteCarlo\n')
+
+    return os.path.abspath('sim')
+
+
+def test_run_in_scratch(fake_raspa):
+    gcwf.firetasks.RunSimulation().run_task({
+        'simtree': fake_raspa,
+        'scratch': os.path.abspath('scratch'),
+    })
+
+    assert os.path.exists(os.path.join(fake_raspa, 'Output', 'System_0',
+                                       'output.data'))
+    assert os.path.exists(os.path.join(fake_raspa, 'Restart', 'restart.data'))
+    assert os.path.exists(os.path.join(fake_raspa, 'stdout'))
+    # not matched by the default patterns
+    assert not os.path.exists(os.path.join(fake_raspa, 'Movies'))
+    assert not os.path.exists(os.path.join(fake_raspa, 'rundir.txt'))
+    # scratch copy is cleaned up
+    assert os.listdir('scratch') == []
+
+
+def test_stage_patterns(fake_raspa):
+    gcwf.firetasks.RunSimulation().run_task({
+        'simtree': fake_raspa,
+        'scratch': os.path.abspath('scratch'),
+        'stage_patterns': ['Output', 'rundir.txt'],
+    })
+
+    assert not os.path.exists(os.path.join(fake_raspa, 'Restart'))
+    with open(os.path.join(fake_raspa, 'rundir.txt')) as inf:
+        assert inf.read().startswith(os.path.abspath('scratch'))
+
+
+def test_run_in_place(fake_raspa):
+    gcwf.firetasks.RunSimulation().run_task({'simtree': fake_raspa})
+
+    assert os.path.exists(os.path.join(fake_raspa, 'Movies'))
+
+
+def test_run_stats(fake_raspa):
+    action = gcwf.firetasks.RunSimulation().run_task({'simtree': fake_raspa})
+
+    run_stats = action.update_spec['run_stats']
+    assert run_stats['walltime'] > 0.0
+    assert run_stats['cputime'] >= 0.0
+    assert run_stats['host']
+
+
+@pytest.fixture
+def broken_raspa(fake_raspa):
+    with open(os.path.join('bin', 'simulate'), 'w') as out:
+        out.write('#!/bin/sh\n'
+                  'echo oops >&2\n'
+                  'exit 1\n')
+    return fake_raspa
+
+
+def test_failure_raises(broken_raspa):
+    with pytest.raises(ValueError):
+        gcwf.firetasks.RunSimulation().run_task({'simtree': broken_raspa})
+
+
+def test_allow_fail(broken_raspa):
+    task = gcwf.firetasks.RunSimulation(allow_fail=True)
+    action = task.run_task({'simtree': broken_raspa})
+
+    assert 'oops' in action.update_spec['run_stats']['error']
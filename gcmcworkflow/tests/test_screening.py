@@ -0,0 +1,123 @@
+"""Tests for successive halving evaluation of GA candidates
+
+"""
+import math
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.genetics import (
+    CheckFitnessCache,
+    CheckPromoted,
+    EvaluateResult,
+    Promote,
+)
+
+
+def updater(simtree, candidate):
+    pass
+
+
+@pytest.fixture
+def screened_settings(sample_input):
+    return dict(
+        ngens=1,
+        ncandidates=4,
+        template='template',
+        initial_pop=[(1.0, 2.0), (1.5, 2.5), (2.0, 3.0), (2.5, 3.5)],
+        bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=((200.0, 10.0, 1.0), (200.0, 20.0, 2.0)),
+        ff_updater=updater,
+        wf_name='Hurley',
+        screening={'conditions': ((200.0, 10.0, 1.0),), 'ncycles': 100},
+    )
+
+
+def test_promote_rank():
+    screening = [
+        (0, 200.0, 10.0, 0.3, 1.0),
+        (1, 200.0, 10.0, 0.1, 1.0),
+        (2, 200.0, 10.0, 0.4, 1.0),
+        (3, 200.0, 10.0, 0.2, 1.0),
+        (1, 200.0, 20.0, 0.3, 1.0),
+    ]
+
+    promoted, fitness = Promote.rank(screening, 0.5)
+
+    assert promoted == [0, 3]
+    assert fitness[1] == pytest.approx(0.1 ** 2 + 0.3 ** 2)
+
+
+def test_promote_at_least_one():
+    promoted, _ = Promote.rank([(0, 200.0, 10.0, 0.3, 1.0),
+                                (1, 200.0, 10.0, 0.1, 1.0)], 0.1)
+
+    assert promoted == [1]
+
+
+def test_promote_task():
+    action = Promote(fraction=0.5).run_task({'screening': [
+        (0, 200.0, 10.0, 0.3, 1.0),
+        (1, 200.0, 10.0, 0.1, 1.0),
+    ]})
+
+    assert action.update_spec['promoted'] == [1]
+    assert set(action.stored_data['screen_fitness']) == {'0', '1'}
+
+
+def test_check_promoted():
+    task = CheckPromoted(candidate_id=1, temperature=200.0, pressure=10.0)
+
+    action = task.run_task({'promoted': [1, 3]})
+
+    assert not action.exit
+
+
+def test_check_not_promoted():
+    task = CheckPromoted(candidate_id=2, temperature=200.0, pressure=10.0)
+
+    action = task.run_task({'promoted': [1, 3]})
+
+    assert action.exit
+    push = action.mod_spec[0]['_push']
+    assert math.isinf(push['error'])
+    assert 'evaluations' not in push
+
+
+def test_evaluate_screening(monkeypatch):
+    monkeypatch.setattr(EvaluateResult, 'grab_result',
+                        staticmethod(lambda loc: 1.5))
+    task = EvaluateResult(reference=1.0, temperature=200.0, pressure=10.0,
+                          candidate_id=3, screening=True)
+
+    action = task.run_task({'simtree': 'somewhere'})
+
+    push = action.mod_spec[0]['_push']
+    assert push == {'screening': (3, 200.0, 10.0, 0.5, 1.5)}
+
+
+def test_screened_workflow(screened_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(**screened_settings)
+
+    nc = screened_settings['ncandidates']
+    names = [f.name for f in wf.fws]
+    # one screening run per candidate and screened condition
+    assert sum(n.startswith('Screen') for n in names) == 2 * nc
+    assert names.count('Promote G=0') == 1
+    assert names.count('Promote G=1') == 1
+
+    screen = [f for f in wf.fws if f.name.startswith('Screen')][0]
+    assert isinstance(screen.tasks[0], CheckFitnessCache)
+    assert screen.tasks[0]['screening']
+    assert screen.tasks[1]['ncycles'] == 100
+    promote = [f for f in wf.fws if f.name == 'Promote G=0'][0]
+    sim = [f for f in wf.fws if f.name == 'Sim T=200.0 P=20.0 C=1'][0]
+    assert isinstance(sim.tasks[1], CheckPromoted)
+    assert promote.fw_id in wf.links.parent_links[sim.fw_id]
+
+
+def test_screened_lazy(screened_settings):
+    wf = gcwf.make_genetics.make_genetic_workflow(lazy=True,
+                                                  **screened_settings)
+    post = [f for f in wf.fws if f.name == 'PostGA G=0'][0]
+
+    assert post.tasks[-1]['screening']['ncycles'] == 100
@@ -0,0 +1,178 @@
+"""Tests for the asynchronous steady state GA
+
+"""
+import json
+import os
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.genetics import SteadyStateUpdate
+
+
+def updater(simtree, candidate):
+    pass
+
+
+@pytest.fixture
+def ss_settings(sample_input, tmpdir):
+    return dict(
+        template='template',
+        initial_pop=[(1.0, 2.0), (1.5, 2.5), (2.0, 3.0)],
+        bounds=((0.5, 3.0), (1.0, 4.0)),
+        conditions=((200.0, 10.0, 1.0), (200.0, 20.0, 2.0)),
+        ff_updater=updater,
+        wf_name='Hurley',
+        workdir=str(tmpdir),
+        max_evaluations=5,
+        seed=4,
+    )
+
+
+@pytest.fixture
+def population_file(ss_settings):
+    path = os.path.join(ss_settings['workdir'], 'Hurley_population.json')
+    init = gcwf.genetics.InitSteadyState(population_file=path, popsize=2,
+                                         nstarted=3)
+    init.run_task({})
+
+    return path
+
+
+def finished_spec(fitness):
+    # what a PostSim has after AssignFitness
+    return {
+        'template': '/template',
+        'evaluations': [(200.0, 10.0, 0.1, 1.1)],
+        'assigned': [(fitness, [(200.0, 10.0, 0.1, 1.1)])],
+    }
+
+
+def get_update(wf):
+    post = [f for f in wf.fws if f.name == 'PostSim G=0 C=1'][0]
+
+    return post.tasks[-1]
+
+
+def test_assigned_apart(ss_settings):
+    wf = gcwf.make_genetics.make_steady_state_workflow(**ss_settings)
+    post = [f for f in wf.fws if f.name == 'PostSim G=0 C=1'][0]
+    assign = [t for t in post.tasks
+              if isinstance(t, gcwf.genetics.AssignFitness)][0]
+    spec = {'error': [0.1], 'evaluations': [(200.0, 10.0, 0.1, 1.1)]}
+
+    push = assign.run_task(spec).mod_spec[0]['_push']
+
+    # the evaluations of each condition are left alone
+    assert set(push) == {'assigned'}
+    assert push['assigned'] == (pytest.approx(0.01),
+                                [(200.0, 10.0, 0.1, 1.1)])
+
+
+def test_workflow(ss_settings):
+    wf = gcwf.make_genetics.make_steady_state_workflow(**ss_settings)
+
+    # PreGA, Sims, PostSims, no PostGA
+    npop = len(ss_settings['initial_pop'])
+    assert len(wf.fws) == 1 + npop * len(ss_settings['conditions']) + npop
+    pre = [f for f in wf.fws if f.name == 'Firstgen PreGA'][0]
+    assert isinstance(pre.tasks[-1], gcwf.genetics.InitSteadyState)
+    update = get_update(wf)
+    assert isinstance(update, SteadyStateUpdate)
+    assert update['candidate'] == [1.5, 2.5]
+    # PostSim also needs the template from PreGA
+    assert pre.fw_id in wf.links.parent_links[
+        [f for f in wf.fws if f.name == 'PostSim G=0 C=1'][0].fw_id]
+
+
+def test_update_launches(ss_settings, population_file):
+    wf = gcwf.make_genetics.make_steady_state_workflow(**ss_settings)
+    update = get_update(wf)
+
+    action = update.run_task(finished_spec(0.5))
+
+    new_fws = action.additions[0].fws
+    assert len(new_fws) == len(ss_settings['conditions']) + 1
+    for f in new_fws:
+        assert f.spec['template'] == '/template'
+        assert len(f.spec['candidates']) == 1
+        # cache is read from the population file instead
+        assert 'fitness_cache' not in f.spec
+    sim = [f for f in new_fws if f.name.startswith('Sim')][0]
+    assert sim.tasks[0]['population_file'] == population_file
+    post = [f for f in new_fws if f.name.startswith('PostSim')][0]
+    assert post.name == 'PostSim G=3 C=0'
+    assert isinstance(post.tasks[-1], SteadyStateUpdate)
+    assert post.tasks[-1]['candidate'] == new_fws[0].spec['candidates'][0]
+
+    with open(population_file, 'r') as inf:
+        state = json.load(inf)
+    assert state['nstarted'] == 4
+    assert state['nfinished'] == 1
+    assert state['population'] == [[[1.5, 2.5], 0.5]]
+
+
+def test_update_stops(ss_settings, population_file):
+    wf = gcwf.make_genetics.make_steady_state_workflow(**ss_settings)
+    update = get_update(wf)
+
+    update.run_task(finished_spec(0.5))
+    update.run_task(finished_spec(0.4))
+    action = update.run_task(finished_spec(0.3))
+
+    assert not action.additions
+    assert action.stored_data['nfinished'] == 3
+
+
+def test_cache_from_population_file(ss_settings, population_file):
+    wf = gcwf.make_genetics.make_steady_state_workflow(**ss_settings)
+    get_update(wf).run_task(finished_spec(0.5))
+    check = gcwf.genetics.CheckFitnessCache(
+        candidate_id=0, temperature=200.0, pressure=10.0,
+        population_file=population_file)
+
+    action = check.run_task({'candidates': [(1.5, 2.5)]})
+
+    assert action.exit
+    assert action.mod_spec[0]['_push']['evaluations'] == (200.0, 10.0,
+                                                          0.1, 1.1)
+
+
+def test_insert_replaces_worst():
+    pop = [[[1.0], 0.1], [[2.0], 0.3]]
+
+    new = SteadyStateUpdate.insert(pop, 2, [3.0], 0.2)
+
+    assert new == [[[1.0], 0.1], [[3.0], 0.2]]
+
+
+def test_insert_keeps_fitter():
+    pop = [[[1.0], 0.1], [[2.0], 0.3]]
+
+    new = SteadyStateUpdate.insert(pop, 2, [3.0], 0.4)
+
+    assert new == pop
+
+
+@pytest.mark.parametrize('population', [
+    [],
+    [[[1.0, 2.0], 0.1]],
+    [[[1.0, 2.0], 0.1], [[2.0, 3.0], 0.2], [[1.5, 1.5], 0.3]],
+])
+def test_breed_in_bounds(population):
+    bounds = ((0.5, 3.0), (1.0, 4.0))
+    rng = gcwf.genetics.make_rng(1)
+
+    for _ in range(20):
+        child = SteadyStateUpdate.breed(population, bounds, rng)
+        assert len(child) == 2
+        assert 0.5 <= child[0] <= 3.0
+        assert 1.0 <= child[1] <= 4.0
+
+
+def test_tournament_n():
+    parents = [((1.0,), 0.3), ((2.0,), 0.1), ((3.0,), 0.2)]
+
+    winners = gcwf.genetics.Tournament.tournament(
+        parents, rng=gcwf.genetics.make_rng(2), n=2)
+
+    assert len(winners) == 2
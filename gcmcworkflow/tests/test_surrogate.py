@@ -0,0 +1,98 @@
+"""Tests for surrogate pre-screening of GA candidates
+
+"""
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.genetics import SurrogateScreen, cache_index, cache_key
+
+
+BOUNDS = ((0.0, 1.0), (0.0, 1.0))
+CONDITIONS = ((200.0, 10.0), (200.0, 20.0))
+
+
+def make_cache(candidates):
+    # error at each condition is distance from (0.3, 0.7)
+    cache = {}
+    for c in candidates:
+        error = abs(c[0] - 0.3) + abs(c[1] - 0.7)
+        for T, P in CONDITIONS:
+            cache[cache_index(c, T, P)] = [cache_key(c), T, P, error, 1.0]
+    return cache
+
+
+@pytest.fixture
+def evaluated():
+    rng = gcwf.genetics.make_rng(1)
+    return [tuple(c) for c in rng.uniform(0, 1, size=(30, 2)).tolist()]
+
+
+def test_training_data():
+    cache = make_cache([(0.3, 0.7), (0.5, 0.5)])
+    # only evaluated at one condition, so ignored
+    cache[cache_index((0.1, 0.1), 200.0, 10.0)] = [
+        cache_key((0.1, 0.1)), 200.0, 10.0, 0.8, 1.0]
+
+    X, y = SurrogateScreen.training_data(cache)
+
+    assert X.shape == (2, 2)
+    assert sorted(y) == pytest.approx([0.0, 2 * 0.4 ** 2])
+
+
+def test_training_data_empty():
+    X, y = SurrogateScreen.training_data({})
+
+    assert len(y) == 0
+
+
+@pytest.mark.parametrize('model', ['gp', 'forest'])
+def test_screen_picks_promising(model, evaluated):
+    cache = make_cache(evaluated)
+    candidates = [(0.9, 0.1), (0.31, 0.69), (0.1, 0.95), (0.28, 0.72),
+                  (0.95, 0.9), (0.6, 0.2)]
+
+    chosen = SurrogateScreen.screen(candidates, cache, 2, BOUNDS,
+                                    model=model, kappa=0.0, seed=3)
+
+    assert set(chosen) == {(0.31, 0.69), (0.28, 0.72)}
+
+
+def test_screen_too_little_data(evaluated):
+    cache = make_cache(evaluated[:2])
+    candidates = [(0.9, 0.1), (0.31, 0.69), (0.1, 0.95)]
+
+    chosen = SurrogateScreen.screen(candidates, cache, 2, BOUNDS)
+
+    assert chosen == candidates[:2]
+
+
+def test_screen_bad_model(evaluated):
+    with pytest.raises(ValueError):
+        SurrogateScreen.screen([(0.1, 0.1), (0.2, 0.2)],
+                               make_cache(evaluated), 1, BOUNDS,
+                               model='crystal ball')
+
+
+def test_run_task(evaluated):
+    task = SurrogateScreen(ncandidates=3, bounds=BOUNDS, model='forest',
+                           seed=[1, 2, 2])
+    candidates = [(0.1 * i, 0.1 * i) for i in range(10)]
+
+    action = task.run_task({'candidates': candidates,
+                            'fitness_cache': make_cache(evaluated)})
+
+    assert len(action.update_spec['candidates']) == 3
+    assert action.stored_data['screened'] == 10
+
+
+def test_prega_with_surrogate():
+    pre = gcwf.make_genetics.PreGA_FW(parent=None, idx=1, bounds=BOUNDS,
+                                      wf_name='Hurley', seed=1,
+                                      ncandidates=4, surrogate='gp',
+                                      oversample=3)
+
+    assert pre.tasks[0]['n'] == 12
+    screen = pre.tasks[2]
+    assert isinstance(screen, SurrogateScreen)
+    assert screen['ncandidates'] == 4
+    assert screen['model'] == 'gp'
@@ -0,0 +1,140 @@
+"""Tests for the content-addressed template store
+
+"""
+import os
+import pytest
+
+import gcmcworkflow as gcwf
+from gcmcworkflow.template_store import FileStore, TemplateCache, fetch_template
+
+
+@pytest.fixture
+def slurped(sample_input):
+    return gcwf.utils.slurp_directory('template')
+
+
+def test_roundtrip(in_temp_dir, slurped):
+    store = FileStore('store')
+
+    key = store.put(slurped)
+
+    assert key in store
+    assert store.get(key) == slurped
+
+
+def test_deduplicate(in_temp_dir, slurped):
+    store = FileStore('store')
+
+    key1 = store.put(slurped)
+    key2 = store.put(dict(slurped))
+
+    assert key1 == key2
+    assert len(os.listdir('store')) == 1
+
+
+def test_missing(in_temp_dir):
+    store = FileStore('store')
+
+    with pytest.raises(KeyError):
+        store.get('abc123')
+
+
+def test_fetch_caches(in_temp_dir, slurped):
+    key = FileStore('store').put(slurped)
+
+    first = fetch_template('store', key, cache_dir='cache')
+    # once fetched, the store is no longer required
+    os.remove(os.path.join('store', key + '.json'))
+    second = fetch_template('store', key, cache_dir='cache')
+
+    assert first == second == slurped
+
+
+def test_init_stage_uses_hash(sample_input):
+    init = gcwf.workflow_creator.make_init_stage(
+        workdir='',
+        wfname='Hurley',
+        template='template',
+        template_store='store',
+    )
+    task = init.tasks[0]
+
+    assert task.get('contents', None) is None
+    assert task['template_hash'] in FileStore('store')
+
+
+def make_populate(nbytes, calls):
+    def populate(target):
+        calls.append(target)
+        os.mkdir(target)
+        with open(os.path.join(target, 'data'), 'wb') as out:
+            out.write(b'x' * nbytes)
+    return populate
+
+
+def test_cache_populates_once(in_temp_dir):
+    cache = TemplateCache('cache')
+    calls = []
+
+    first = cache.get('abcdefg', make_populate(10, calls))
+    second = cache.get('abcdefg', make_populate(10, calls))
+
+    assert first == second
+    assert len(calls) == 1
+    assert os.path.exists(os.path.join(first, 'data'))
+
+
+def test_cache_evicts_lru(in_temp_dir):
+    cache = TemplateCache('cache', max_size=250)
+    calls = []
+
+    cache.get('aaaaaaa', make_populate(100, calls))
+    cache.get('bbbbbbb', make_populate(100, calls))
+    # age b, so that it is the least recently used
+    os.utime(os.path.join('cache', 'bbbbbbb'), (0, 0))
+    cache.get('ccccccc', make_populate(100, calls))
+
+    assert sorted(os.path.basename(e) for e in cache.entries()) == [
+        'aaaaaaa', 'ccccccc']
+
+
+def test_cache_keeps_checked_out(in_temp_dir):
+    cache = TemplateCache('cache', max_size=250)
+    calls = []
+
+    with cache.checkout('aaaaaaa', make_populate(100, calls)) as first:
+        os.utime(first, (0, 0))
+        cache.get('bbbbbbb', make_populate(100, calls))
+        cache.get('ccccccc', make_populate(100, calls))
+
+        # least recently used, but still being copied from
+        assert os.path.exists(os.path.join(first, 'data'))
+
+    cache.get('ddddddd', make_populate(100, calls))
+
+    assert not os.path.exists(first)
+
+
+def test_cache_expands_vars(in_temp_dir, monkeypatch):
+    monkeypatch.setenv('MYSCRATCH', os.path.abspath('scratch'))
+
+    cache = TemplateCache('$MYSCRATCH/templates')
+
+    assert cache.path == os.path.abspath(os.path.join('scratch', 'templates'))
+
+
+def test_copytemplate_cache_from_store(in_temp_dir, slurped, monkeypatch):
+    monkeypatch.setenv('GCMCWORKFLOW_CACHE', os.path.abspath('fetched'))
+    # template path isn't visible from this node, so use the store
+    key = FileStore('store').put(slurped)
+    fw_spec = {
+        'template': '/not/on/this/node/template',
+        'template_hash': key,
+        'template_store': 'store',
+        'template_cache': 'cache',
+    }
+
+    with gcwf.firetasks.CopyTemplate.cached_template(fw_spec,
+                                                     'abcdefg') as target:
+        assert target == os.path.abspath(os.path.join('cache', 'abcdefg'))
+        assert sorted(os.listdir(target)) == sorted(slurped)
@@ -0,0 +1,74 @@
+"""Tests for accounting of simulation throughput
+
+"""
+import os
+import pandas as pd
+import pytest
+
+import gcmcworkflow as gcwf
+
+
+def test_postprocess_throughput():
+    results = pd.Series([1.0, 2.0, 3.0], index=[0, 500, 1000])
+    run_stats = {'walltime': 50.0, 'cputime': 48.0, 'host': 'node1'}
+
+    throughput = gcwf.firetasks.PostProcess.throughput(results, run_stats)
+
+    assert throughput == {'cycles': 1000, 'walltime': 50.0,
+                          'cputime': 48.0, 'host': 'node1'}
+
+
+def test_postprocess_throughput_no_stats():
+    results = pd.Series([1.0, 2.0], index=[0, 100])
+
+    throughput = gcwf.firetasks.PostProcess.throughput(results, None)
+
+    assert throughput['cycles'] == 100
+    assert throughput['walltime'] is None
+
+
+def test_total_throughput():
+    throughput = [
+        {'cycles': 1000, 'walltime': 50.0, 'cputime': 48.0, 'host': 'node2'},
+        {'cycles': 1000, 'walltime': 100.0, 'cputime': 96.0, 'host': 'node1'},
+        # restart of the first, on the same node
+        {'cycles': 500, 'walltime': 25.0, 'cputime': 24.0, 'host': 'node2'},
+        {'cycles': 500, 'walltime': None, 'cputime': None, 'host': None},
+    ]
+
+    cycles, walltime, cputime, hosts = (
+        gcwf.firetasks.Analyse.total_throughput(throughput))
+
+    assert cycles == 3000
+    assert walltime == pytest.approx(175.0)
+    assert cputime == pytest.approx(168.0)
+    assert hosts == ['node1', 'node2']
+
+
+def test_efficiency_table(in_temp_dir):
+    task = gcwf.firetasks.IsothermCreate(workdir='')
+    action = task.run_task({
+        'results_array': [(200.0, 20.0, 2.0, 0.2, 6.0),
+                          (200.0, 10.0, 1.0, 0.1, 5.0)],
+        'throughput_array': [
+            (200.0, 20.0, 4000, 200.0, 190.0, 6.0, ['node1']),
+            (200.0, 10.0, 2000, 100.0, 100.0, 5.0, ['node1', 'node2']),
+        ],
+    })
+
+    eff = pd.read_csv('efficiency.csv')
+
+    assert list(eff['pressure']) == [10.0, 20.0]
+    assert list(eff['cycles_per_sec']) == pytest.approx([20.0, 20.0])
+    assert list(eff['cpu_per_g']) == pytest.approx([20.0, 190.0 / 6.0])
+    assert eff['hosts'][0] == 'node1;node2'
+
+
+def test_no_efficiency_without_throughput(in_temp_dir):
+    # eg GA workflows don't provide this
+    gcwf.firetasks.IsothermCreate(workdir='').run_task({
+        'results_array': [(200.0, 10.0, 1.0, 0.1, 5.0)],
+    })
+
+    assert os.path.exists('results.csv')
+    assert not os.path.exists('efficiency.csv')
@@ -1,40 +1,62 @@
 """Tests Tournament task"""
 
-from unittest import mock
 import pytest
-import random
 
-from gcmcworkflow.genetics import Tournament
+from gcmcworkflow.genetics import Tournament, make_rng
 
 
-def test_nonrepeating():
-    parents = [
-        (1, 11),
-        (2, 12),
-        (3, 13),
-        (4, 14),
+@pytest.fixture
+def parents():
+    return [
+        ((1.0, 1.0), 11.0),
+        ((2.0, 2.0), 12.0),
+        ((3.0, 3.0), 13.0),
+        ((4.0, 4.0), 14.0),
     ]
 
-    def sequence():
-        # first candidate [0]
-        yield parents[0], parents[1]
-        # rerolled
-        yield parents[0], parents[1]
-        # second candidate [2]
-        yield parents[2], parents[3]
-        # third candidate [0]
-        yield parents[0], parents[2]
-        # fourth [1]
-        yield parents[1], parents[3]
 
-    with mock.patch('random.sample') as rs:
-        rs.side_effect = sequence()
+def test_size(parents):
+    ret = Tournament.tournament(parents, rng=make_rng(42))
 
-        ret = Tournament.tournament(parents)
-
-    assert rs.call_count == 5
     assert len(ret) == len(parents)
-    assert ret[0] == parents[0][0]
-    assert ret[1] == parents[2][0]
-    assert ret[2] == parents[0][0]
-    assert ret[3] == parents[1][0]
+    assert all(c in [p[0] for p in parents] for c in ret)
+
+
+def test_reproducible(parents):
+    first = Tournament.tournament(parents, rng=make_rng(42))
+    second = Tournament.tournament(parents, rng=make_rng(42))
+
+    assert first == second
+
+
+def test_nonrepeating(parents):
+    for seed in range(50):
+        ret = Tournament.tournament(parents, n=20, rng=make_rng(seed))
+
+        assert all(a != b for a, b in zip(ret[:-1], ret[1:]))
+
+
+def test_fittest_wins(parents):
+    # with enough entrants the lowest fitness always wins, except when
+    # it won the previous tournament
+    ret = Tournament.tournament(parents, k=200, rng=make_rng(42))
+
+    assert ret == [parents[0][0], parents[1][0]] * 2
+
+
+def test_identical_parents():
+    # previously this could never finish
+    parents = [((1.0, 2.0), 5.0)] * 4
+
+    ret = Tournament.tournament(parents, rng=make_rng(0))
+
+    assert ret == [(1.0, 2.0)] * 4
+
+
+def test_run_task_seeded(parents):
+    task = Tournament(k=3, seed=[1, 2, 0])
+
+    first = task.run_task({'parents': parents}).update_spec['candidates']
+    second = task.run_task({'parents': parents}).update_spec['candidates']
+
+    assert first == second
@@ -67,6 +67,81 @@ def test_pickling_roundtrip():
 
     assert new(1, 2) == 12
 
+def importable_updater(simtree, candidate):
+    return 'updated'
+
+
+def test_register_import_path():
+    path = '{}:importable_updater'.format(__name__)
+
+    ref = gcwf.utils.register_updater(path)
+
+    assert ref == 'import:' + path
+    assert gcwf.utils.load_updater(ref) is importable_updater
+
+
+def test_register_importable_pickled():
+    # workers might not be able to import it, so it is still pickled
+    ref = gcwf.utils.register_updater(importable_updater)
+
+    assert not ref.startswith('import:')
+    assert gcwf.utils.load_updater(ref)(None, None) == 'updated'
+
+
+def test_register_in_store(tmpdir):
+    def magic(simtree, candidate):
+        return 'magic'
+
+    store = str(tmpdir.join('store'))
+    ref = gcwf.utils.register_updater(magic, store)
+
+    assert ref.startswith('store:')
+    # much smaller than the pickled function
+    assert len(ref) < len(gcwf.utils.pickle_func(magic))
+    assert gcwf.utils.load_updater(ref)(None, None) == 'magic'
+
+
+def test_register_with_template(tmpdir):
+    def magic(simtree, candidate):
+        return 'kept'
+
+    updaters = {}
+    ref = gcwf.utils.register_updater(magic, updaters=updaters)
+    assert ref.startswith('template:')
+    assert len(updaters) == 1
+
+    init = gcwf.firetasks.InitTemplate(contents={'simulation.input': 'x\n'},
+                                       workdir=str(tmpdir),
+                                       updaters=updaters)
+    template = init.run_task({}).update_spec['template']
+
+    assert gcwf.utils.load_updater(ref, template)(None, None) == 'kept'
+    located = gcwf.utils.locate_updater(ref, template)
+    assert located.startswith('store:')
+    assert gcwf.utils.load_updater(located)(None, None) == 'kept'
+
+
+def test_register_pickled():
+    def magic(simtree, candidate):
+        return 'magic'
+
+    ref = gcwf.utils.register_updater(magic)
+
+    assert gcwf.utils.load_updater(ref)(None, None) == 'magic'
+    # cached after first load
+    assert gcwf.utils.load_updater(ref) is gcwf.utils.load_updater(ref)
+
+
+@pytest.mark.parametrize('updater', [
+    importable_updater,
+    '{}:importable_updater'.format(__name__),
+])
+def test_register_idempotent(updater):
+    ref = gcwf.utils.register_updater(updater)
+
+    assert gcwf.utils.register_updater(ref) == ref
+
+
 def test_gen_sim_path():
     pth = gcwf.utils.gen_sim_path(
         'hash123', 123.0, 200.0, 1, 2)
@@ -87,3 +162,50 @@ def test_parse_sim_path(dirname):
     assert res.P == 24.0
     assert res.gen_id == 5
     assert res.parallel_id == 0
+
+
+@pytest.fixture
+def binary_tree(in_temp_dir):
+    # template with binary files, nested directories and clashing basenames
+    os.makedirs(os.path.join('tree', 'grids', 'CO2'))
+    with open(os.path.join('tree', 'simulation.input'), 'w') as out:
+        out.write('SimulationType MonteCarlo\n')
+    with open(os.path.join('tree', 'grids', 'CO2', 'simulation.input'), 'w') as out:
+        out.write('something else\n')
+    with open(os.path.join('tree', 'grids', 'CO2', 'grid.bin'), 'wb') as out:
+        out.write(bytes(range(256)) * 10)
+    return 'tree'
+
+
+def test_slurp_tree_roundtrip(binary_tree):
+    packed = gcwf.utils.slurp_tree(binary_tree)
+
+    assert len(packed) == 3
+    new = gcwf.utils.dump_tree('thisplace', packed)
+
+    assert os.path.isdir(new)
+    for relpath in ('simulation.input',
+                    os.path.join('grids', 'CO2', 'simulation.input'),
+                    os.path.join('grids', 'CO2', 'grid.bin')):
+        with open(os.path.join(binary_tree, relpath), 'rb') as original,\
+             open(os.path.join('thisplace', relpath), 'rb') as newone:
+            assert original.read() == newone.read()
+
+
+def test_slurp_tree_many_files(in_temp_dir):
+    for i in range(1200):
+        subdir = os.path.join('many', 'd{}'.format(i % 10))
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, 'f{}'.format(i)), 'wb') as out:
+            out.write(os.urandom(64))
+
+    packed = gcwf.utils.slurp_tree('many', nthreads=4)
+    gcwf.utils.dump_tree('copy', packed, nthreads=4)
+
+    assert len(packed) == 1200
+    assert gcwf.utils.slurp_tree('copy') == packed
+
+
+def test_dump_tree_outside(in_temp_dir):
+    with pytest.raises(ValueError):
+        gcwf.utils.dump_tree('thisplace', [['../evil', '']])
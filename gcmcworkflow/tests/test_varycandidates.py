@@ -0,0 +1,70 @@
+"""Tests for VaryCandidates task"""
+
+import numpy as np
+import pytest
+
+from gcmcworkflow.genetics import VaryCandidates, make_rng
+
+
+@pytest.fixture
+def population():
+    return np.array([[1.0, 10.0],
+                     [2.0, 20.0],
+                     [1.5, 12.0],
+                     [1.8, 18.0]])
+
+
+@pytest.fixture
+def bounds():
+    return np.array([[0.0, 2.1], [5.0, 25.0]])
+
+
+def test_crossover_within_range(population, bounds):
+    children = VaryCandidates.blend_crossover(
+        population, bounds, probability=1.0, alpha=0.0, rng=make_rng(1))
+
+    # with no extrapolation, children stay between their parents
+    for pair in (slice(0, 2), slice(2, 4)):
+        lo = population[pair].min(axis=0)
+        hi = population[pair].max(axis=0)
+        assert np.all(children[pair] >= lo)
+        assert np.all(children[pair] <= hi)
+
+
+def test_crossover_never(population, bounds):
+    children = VaryCandidates.blend_crossover(
+        population, bounds, probability=0.0, alpha=0.1, rng=make_rng(1))
+
+    assert np.array_equal(children, population)
+
+
+def test_crossover_odd_one_out(bounds):
+    population = np.array([[1.0, 10.0], [2.0, 20.0], [1.5, 15.0]])
+
+    children = VaryCandidates.blend_crossover(
+        population, bounds, probability=1.0, alpha=0.1, rng=make_rng(1))
+
+    assert children.shape == population.shape
+    assert np.array_equal(children[2], population[2])
+
+
+def test_mutation_clamped(population, bounds):
+    mutated = VaryCandidates.gaussian_mutation(
+        population, bounds, probability=1.0, sigma_factor=0.01,
+        rng=make_rng(3))
+
+    assert np.all(mutated >= bounds[:, 0])
+    assert np.all(mutated <= bounds[:, 1])
+    assert not np.array_equal(mutated, population)
+
+
+def test_reproducible(population):
+    settings = dict(VaryCandidates.default_params)
+    settings['bounds'] = ((0.0, 2.1), (5.0, 25.0))
+    task = VaryCandidates(seed=[7, 1, 1], **settings)
+
+    first = task.run_task({'candidates': population.tolist()})
+    second = task.run_task({'candidates': population.tolist()})
+
+    assert first.update_spec == second.update_spec
+    assert len(first.update_spec['candidates']) == len(population)
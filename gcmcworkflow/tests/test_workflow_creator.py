@@ -2,6 +2,7 @@
 
 
 """
+import fireworks as fw
 import pytest
 
 
@@ -116,3 +117,135 @@ def test_analyse_with_grid(grid_spec):
     assert ana_fw.tasks[0]['use_grid']
 
 
+
+
+def test_fused_workflow(dict_spec):
+    dict_spec['fused_runs'] = True
+    wf = gcwf.workflow_creator.make_workflow(dict_spec)
+
+    nconds = 6
+    # 1 init, one FW per run, nconditions Analyses and 1 isotherm create
+    assert len(wf.fws) == 1 + nconds * dict_spec['nparallel'] + nconds + 1
+
+    sims = [fw for fw in wf.fws
+            if any(isinstance(t, gcwf.firetasks.RunSimulation)
+                   for t in fw.tasks)]
+    assert len(sims) == nconds * dict_spec['nparallel']
+    for sim in sims:
+        copy, run, pp = sim.tasks
+        assert isinstance(copy, gcwf.firetasks.CopyTemplate)
+        assert isinstance(pp, gcwf.firetasks.PostProcess)
+        # PostProcess must still run if the simulation fails
+        assert run['allow_fail']
+        # restarts must also be fused
+        assert sim.spec['fused_runs']
+        assert sim.name.startswith('Sim ')
+
+
+def test_fused_runstage_restart(sample_input):
+    sim = gcwf.workflow_creator.make_fused_runstage(
+        parent_fw=None, temperature=200.0, pressure=10.0, ncycles=100,
+        parallel_id=1, wfname='Hurley', template='template', workdir='',
+        previous_simdir='sim_abcdefg_T200.0_P10.0_gen1_v1',
+        previous_result='0,1.0\n',
+    )
+
+    assert sim.tasks[0]['previous_simdir'].endswith('gen1_v1')
+    assert sim.tasks[2]['previous_result'] == '0,1.0\n'
+
+
+def test_lazy_workflow(dict_spec):
+    dict_spec['lazy'] = True
+    wf = gcwf.workflow_creator.make_workflow(dict_spec)
+
+    # just Init and the expansion
+    assert len(wf.fws) == 2
+    expand = [fw for fw in wf.fws if fw.name == 'Expand sampling'][0]
+    assert len(expand.parents) == 1
+
+
+def test_lazy_expansion(dict_spec):
+    dict_spec['lazy'] = True
+    dict_spec['fused_runs'] = True
+    wf = gcwf.workflow_creator.make_workflow(dict_spec)
+    expand = [fw for fw in wf.fws if fw.name == 'Expand sampling'][0]
+
+    action = expand.tasks[0].run_task({
+        'template': '/path/to/template',
+        'simhash': 'abcdefg',
+        'fused_runs': True,
+        '_category': 'Hurley',
+    })
+
+    new_fws = action.additions[0].fws
+    nconds = 6
+    # an expansion of each condition and isotherm create
+    assert len(new_fws) == nconds + 1
+    assert all(f.spec['template'] == '/path/to/template' for f in new_fws)
+    assert all(f.spec['simhash'] == 'abcdefg' for f in new_fws)
+    assert all(f.spec['fused_runs'] for f in new_fws)
+    create = [f for f in new_fws if f.name == 'Isotherm create'][0]
+    assert len(action.additions[0].links.parent_links[create.fw_id]) == nconds
+
+
+def test_lazy_point_expansion(dict_spec):
+    dict_spec['lazy'] = True
+    wf = gcwf.workflow_creator.make_workflow(dict_spec)
+    expand = [fw for fw in wf.fws if fw.name == 'Expand sampling'][0]
+    action = expand.tasks[0].run_task({
+        'template': '/path/to/template',
+        'simhash': 'abcdefg',
+        '_category': 'Hurley',
+    })
+    points = [f for f in action.additions[0].fws
+              if f.name.startswith('Expand T=')]
+    sampling = [f.spec['_priority'] for f in points]
+    # expanded only once no sampling is ready, highest pressure first
+    assert max(sampling) < 0
+
+    point = max(points, key=lambda f: f.spec['_priority'])
+    detour = point.tasks[0].run_task(dict(point.spec))
+
+    new_fws = detour.detours[0].fws
+    # copy, run and postprocess for each parallel run, then Analyse
+    assert len(new_fws) == 3 * dict_spec['nparallel'] + 1
+    assert new_fws[-1].name.startswith('Analyse')
+    assert all(f.spec['simhash'] == 'abcdefg' for f in new_fws)
+    # highest pressure has the highest rank
+    top = max(f.tasks[0]['priority'] for f in points)
+    assert all(f.spec['_priority'] == top for f in new_fws)
+
+
+def test_pressure_ranks():
+    ranks = gcwf.workflow_creator.pressure_ranks([
+        (200.0, [30.0, 10.0], 0),
+        (210.0, [20.0, 10.0], 0),
+    ])
+
+    assert ranks == {10.0: 1, 20.0: 2, 30.0: 3}
+
+
+def test_high_pressure_first(dict_spec):
+    wf = gcwf.workflow_creator.make_workflow(dict_spec)
+
+    for f in wf.fws:
+        if f.name.startswith(('Copy', 'Sim', 'PostProcess', 'Analyse')):
+            P = float(f.name.split('P=')[1].split()[0])
+            assert f.spec['_priority'] == {10.0: 1, 20.0: 2, 30.0: 3}[P]
+
+
+def test_priority_doesnt_compound(dict_spec):
+    wc = gcwf.workflow_creator
+    wf = wc.make_workflow(dict_spec)
+    run = [f for f in wf.fws if f.name.startswith('PostProcess')][0]
+    rank = run.spec['_priority']
+
+    spec = run.spec
+    # restart of a restart of a restart
+    for _ in range(3):
+        new = wc.set_priority([fw.Firework([])], wc.base_priority(spec),
+                              wc.PRIORITY_RESTART)[0]
+        spec = new.spec
+
+    assert spec['_priority'] == rank + wc.PRIORITY_RESTART
+    assert spec['base_priority'] == rank
@@ -1,12 +1,16 @@
+import base64
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import dill
 import glob
+import importlib
 import io
 import numpy as np
 import os
 import pandas as pd
 import re
 import subprocess
+import zlib
 
 
 def guess_format(stuff):
@@ -23,7 +27,7 @@ def guess_format(stuff):
 
 
 NAME_PATTERN = re.compile('^Sim')
-SIM_GRAB = re.compile('^Sim T=(\d+\.\d+) P=(\d+\.\d+) v(\d+)')
+SIM_GRAB = re.compile(r'^Sim T=(\d+(?:\.\d+)?) P=(\d+(?:\.\d+)?) v(\d+)')
 def gen_name(T, P, idx):
     """Generate a name for an individual simulation
 
@@ -208,6 +212,83 @@ def dump_directory(template_dir, stuff):
     return os.path.abspath(template_dir)
 
 
+def slurp_tree(path, nthreads=None):
+    """Slurp up contents of directory, including subdirectories and binary files
+
+    Opposite of dump_tree
+
+    Parameters
+    ----------
+    path : str
+      directory to read
+    nthreads : int, optional
+      number of threads used to read files
+
+    Returns
+    -------
+    list of [relative path, content] pairs
+      paths use '/' as separator, contents are the compressed and base64
+      encoded bytes of each file
+    """
+    relpaths = []
+    for root, subdirs, filenames in os.walk(path):
+        for fn in filenames:
+            relpaths.append(os.path.relpath(os.path.join(root, fn), path))
+
+    def read(relpath):
+        with open(os.path.join(path, relpath), 'rb') as fh:
+            data = zlib.compress(fh.read())
+        return [relpath.replace(os.sep, '/'),
+                base64.b64encode(data).decode('ascii')]
+
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        return sorted(pool.map(read, relpaths))
+
+
+def dump_tree(template_dir, packed, nthreads=None):
+    """Spit out contents of directory, writing files concurrently
+
+    Opposite of slurp_tree
+
+    Parameters
+    ----------
+    template_dir : str
+      path to write contents of packed to
+    packed : list
+      [relative path, content] pairs as given by slurp_tree
+    nthreads : int, optional
+      number of threads used to write files
+
+    Returns
+    -------
+    path : str
+      absolute path to the written template
+    """
+    relpaths = [relpath for relpath, _ in packed]
+    for relpath in relpaths:
+        parts = relpath.split('/')
+        if relpath.startswith('/') or '..' in parts:
+            raise ValueError("Refusing to write outside of template: '{}'"
+                             "".format(relpath))
+
+    os.mkdir(template_dir)
+    # create all subdirectories upfront so threads only write files
+    for subdir in sorted({os.path.dirname(p) for p in relpaths} - {''}):
+        os.makedirs(os.path.join(template_dir, *subdir.split('/')),
+                    exist_ok=True)
+
+    def write(item):
+        relpath, contents = item
+        with open(os.path.join(template_dir, *relpath.split('/')), 'wb') as out:
+            out.write(zlib.decompress(base64.b64decode(contents)))
+
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        # consume the iterator so any errors are raised here
+        list(pool.map(write, packed))
+
+    return os.path.abspath(template_dir)
+
+
 def pickle_func(func):
     """Serialise a Python function
 
@@ -236,6 +317,146 @@ def unpickle_func(picklestr):
     return dill.loads(bytes(picklestr, 'raw_unicode_escape'))
 
 
+# prefixes of updater references, see register_updater
+UPDATER_IMPORT = 'import:'
+UPDATER_STORE = 'store:'
+UPDATER_TEMPLATE = 'template:'
+# updaters already loaded in this process, by reference
+_UPDATERS = {}
+
+
+# 'package.module:function', an updater given by where to import it from
+UPDATER_PATH = re.compile(r'^[\w.]+:[\w.]+$')
+
+
+def template_updaters(template):
+    """Directory holding the updaters kept alongside *template*"""
+    return os.path.join(os.path.dirname(template.rstrip(os.path.sep)),
+                        'updaters')
+
+
+def register_updater(func, template_store=None, updaters=None):
+    """Create a reference to a forcefield updater, to put in Fireworks
+
+    Functions are pickled, and kept as either:
+     - the hash of the pickled function in *template_store*, so it is
+       stored only once
+     - the hash of the pickled function in *updaters*, which InitTemplate
+       writes alongside the template, so it is stored only once
+     - the pickled function itself
+
+    To avoid pickling, give the updater as a 'package.module:function'
+    string instead.  Only its path is kept, so this must be importable
+    on every worker.
+
+    Parameters
+    ----------
+    func : function, str or list
+      the updater, where to import it from, or an existing reference or
+      forcefield mapping (see forcefield module) which are returned
+      unchanged
+    template_store : str, optional
+      location of a template store to keep the pickled function in
+    updaters : dict, optional
+      if no *template_store*, the pickled function is added to this,
+      to be given to InitTemplate
+
+    Returns
+    -------
+    ref : str
+      reference which load_updater can turn back into a function
+    """
+    if isinstance(func, str):
+        if (not func.startswith((UPDATER_IMPORT, UPDATER_STORE,
+                                 UPDATER_TEMPLATE)) and
+                UPDATER_PATH.match(func)):
+            return UPDATER_IMPORT + func
+        return func
+    if isinstance(func, (list, tuple)):
+        return func
+
+    pickled = pickle_func(func)
+    from .template_store import get_store, hash_template
+
+    if template_store is not None:
+        key = get_store(template_store).put({'updater': pickled})
+
+        return '{}{}:{}'.format(UPDATER_STORE, key, template_store)
+    if updaters is not None:
+        key, _ = hash_template({'updater': pickled})
+        updaters[key] = {'updater': pickled}
+
+        return UPDATER_TEMPLATE + key
+
+    return pickled
+
+
+def locate_updater(ref, template):
+    """Make an updater reference independent of the template
+
+    Parameters
+    ----------
+    ref : str
+      reference from register_updater
+    template : str
+      path to the template the updater was kept alongside
+
+    Returns
+    -------
+    ref : str
+      a reference to the same updater, which doesn't need the template
+    """
+    if not ref.startswith(UPDATER_TEMPLATE):
+        return ref
+    key = ref[len(UPDATER_TEMPLATE):]
+
+    return '{}{}:{}'.format(UPDATER_STORE, key,
+                            os.path.abspath(template_updaters(template)))
+
+
+def load_updater(ref, template=None):
+    """Get the forcefield updater from a reference
+
+    Updaters are only loaded once in each process
+
+    Parameters
+    ----------
+    ref : str
+      reference from register_updater, or a function from pickle_func
+    template : str, optional
+      path to the template, required if the updater was kept with it
+
+    Returns
+    -------
+    func : function
+    """
+    try:
+        return _UPDATERS[ref]
+    except KeyError:
+        pass
+
+    if ref.startswith(UPDATER_IMPORT):
+        module, qualname = ref[len(UPDATER_IMPORT):].split(':')
+        func = importlib.import_module(module)
+        for attr in qualname.split('.'):
+            func = getattr(func, attr)
+    elif ref.startswith(UPDATER_STORE):
+        from .template_store import get_store
+
+        key, location = ref[len(UPDATER_STORE):].split(':', 1)
+        func = unpickle_func(get_store(location).get(key)['updater'])
+    elif ref.startswith(UPDATER_TEMPLATE):
+        if template is None:
+            raise ValueError("Updater '{}' is kept with the template, "
+                             "which wasn't given".format(ref))
+        func = load_updater(locate_updater(ref, template))
+    else:
+        func = unpickle_func(ref)
+    _UPDATERS[ref] = func
+
+    return func
+
+
 def make_series(ts):
     """Convert ascii representation of series to Pandas Series"""
     return pd.read_csv(
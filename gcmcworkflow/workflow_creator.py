@@ -10,6 +10,115 @@ from . import utils
 from . import firetasks
 from . import grids
 from . import hyd
+from .template_store import get_store
+
+
+# settings from the spec which are placed in every Firework's spec
+# and passed on to Fireworks created while the Workflow runs
+WORKFLOW_OPTIONS = (
+    'template_cache',
+    'template_cache_size',
+    'template_hash',
+    'template_store',
+    'scratch',
+    'stage_patterns',
+    'profile',
+    'fused_runs',
+)
+
+# Fireworks with higher _priority are run first.  Each sampling point
+# has its pressure rank as a base priority, as high pressure points are
+# slowest.  Restarts get PRIORITY_RESTART more than this base and
+# resampling gets up to PRIORITY_CONVERGENCE more, scaled by how close
+# to converged the point currently is.  Boosts are always added to the
+# base, so they don't build up over many restarts
+PRIORITY_RESTART = 100
+PRIORITY_CONVERGENCE = 50
+
+
+def apply_options(fws, options):
+    """Place Workflow-wide options into the spec of each Firework
+
+    Parameters
+    ----------
+    fws : list of fw.Firework
+      Fireworks to modify in place
+    options : dict
+      settings to add, keys should be from WORKFLOW_OPTIONS
+
+    Returns
+    -------
+    fws : list of fw.Firework
+    """
+    for firework in fws:
+        firework.spec.update(options)
+
+    return fws
+
+
+def inherit_options(fw_spec, fws):
+    """Pass Workflow-wide options from a running Firework to new Fireworks
+
+    Parameters
+    ----------
+    fw_spec : dict
+      spec of the Firework currently running
+    fws : list of fw.Firework
+      new Fireworks, eg a detour, to modify in place
+
+    Returns
+    -------
+    fws : list of fw.Firework
+    """
+    return apply_options(fws, {k: fw_spec[k] for k in WORKFLOW_OPTIONS
+                               if k in fw_spec})
+
+
+def set_priority(fws, priority, boost=0):
+    """Set the scheduling priority of Fireworks
+
+    Parameters
+    ----------
+    fws : list of fw.Firework
+      Fireworks to modify in place
+    priority : int
+      base priority, kept as "base_priority" in the spec for Fireworks
+      created later on to start from
+    boost : int, optional
+      added to the base priority for these Fireworks only
+
+    Returns
+    -------
+    fws : list of fw.Firework
+    """
+    for firework in fws:
+        firework.spec['base_priority'] = priority
+        firework.spec['_priority'] = priority + boost
+
+    return fws
+
+
+def base_priority(fw_spec):
+    """Base priority of the running Firework, see set_priority"""
+    return fw_spec.get('base_priority', fw_spec.get('_priority', 0))
+
+
+def pressure_ranks(conditions):
+    """Priority of each pressure, highest pressure has the highest rank
+
+    Parameters
+    ----------
+    conditions : list of tuples
+      (temperature, pressures, adaptive) for each temperature
+
+    Returns
+    -------
+    ranks : dict
+      mapping of pressure to rank, starting from 1
+    """
+    pressures = sorted(set(P for (_, Ps, _) in conditions for P in Ps))
+
+    return {P: i + 1 for i, P in enumerate(pressures)}
 
 
 def make_workflow(spec):
@@ -38,6 +147,7 @@ def make_workflow(spec):
         workdir=workdir,
         wfname=wfname,
         template=template,
+        template_store=spec.get('template_store', None),
     )
 
     if use_grid:
@@ -46,27 +156,133 @@ def make_workflow(spec):
     else:
         init_parent = [init]
 
+    settings = dict(
+        conditions=[(T, [float(P) for P in pressures], adaptive)
+                    for (T, pressures, adaptive) in spec['conditions']],
+        ncycles=ncycles,
+        nparallel=nparallel,
+        wfname=wfname,
+        workdir=workdir,
+        g_req=g_req,
+        max_iterations=max_iters,
+        use_grid=use_grid,
+        fused=spec.get('fused_runs', False),
+        archive=spec.get('archive', False),
+    )
+    if spec.get('lazy', False):
+        # sampling Fireworks are only made once the template is ready
+        sampling = [make_expansion_stage(parent_fw=init_parent, **settings)]
+    else:
+        sampling = make_isotherm_stages(parent_fw=init_parent,
+                                        template=template, **settings)
+
+    options = {k: spec[k] for k in WORKFLOW_OPTIONS if k in spec}
+    if 'template_hash' in init.tasks[0]:
+        # allows workers to go to the store if the template isn't visible
+        options['template_hash'] = init.tasks[0]['template_hash']
+    fws = apply_options(init_parent + sampling, options)
+
+    wf = fw.Workflow(
+        fws,
+        name=wfname,
+        metadata={'GCMCWorkflow': True},  # tag as GCMCWorkflow workflow
+    )
+
+    return wf
+
+
+def make_isotherm_stages(parent_fw, conditions, ncycles, nparallel, wfname,
+                         template, workdir, g_req, max_iterations,
+                         use_grid=False, fused=False, archive=False,
+                         lazy=False):
+    """Make sampling of every condition and the final IsothermCreate
+
+    Parameters
+    ----------
+    parent_fw : list of fw.Firework or None
+      Fireworks which prepare the template
+    conditions : list of tuples
+      (temperature, pressures, adaptive) for each temperature
+    ncycles : int
+      length of first simulation at each condition
+    nparallel : int
+      number of parallel runs at each condition
+    wfname : str
+      unique name for this workflow
+    template : str
+      location of the template files
+    workdir : str
+      path to where to store results
+    g_req : float
+      number of decorrelations to sample
+    max_iterations : int
+      maximum number of resampling iterations
+    use_grid : bool, optional
+      whether to use an energy grid
+    fused : bool, optional
+      use a single Firework for each run
+    archive : bool, optional
+      archive each condition once finished
+    lazy : bool, optional
+      rather than the sampling of each condition, make a Firework which
+      creates it when run, see make_point_expansion_stage
+
+    Returns
+    -------
+    fws : list of fw.Firework
+    """
     simulation_steps = []  # list of simulation fireworks
-    analysis_steps = []  # list of Analysis fireworks
+    analysis_steps = []  # list of Analysis (or expansion) fireworks
     adaptive_steps = []
-    for (T, pressures, adaptive) in spec['conditions']:
+    archive_steps = []
+    ranks = pressure_ranks(conditions)
+    for (T, pressures, adaptive) in conditions:
         for P in pressures:
-            this_condition, this_condition_analysis = make_sampling_point(
-                parent_fw=init_parent,
-                temperature=T,
-                pressure=P,
-                ncycles=ncycles,
-                nparallel=nparallel,
-                wfname=wfname,
-                template=template,
-                workdir=workdir,
-                g_req=g_req,
-                use_grid=use_grid,
-                iteration=0,
-                max_iterations=max_iters,
-            )
-            simulation_steps.extend(this_condition)
-            analysis_steps.append(this_condition_analysis)
+            if lazy:
+                analysis_steps.append(make_point_expansion_stage(
+                    parent_fw=parent_fw,
+                    temperature=T,
+                    pressure=P,
+                    ncycles=ncycles,
+                    nparallel=nparallel,
+                    wfname=wfname,
+                    workdir=workdir,
+                    g_req=g_req,
+                    max_iterations=max_iterations,
+                    use_grid=use_grid,
+                    fused=fused,
+                    priority=ranks[P],
+                    # only once nothing already expanded is ready
+                    expand_priority=ranks[P] - len(ranks) - 1,
+                ))
+            else:
+                this_condition, this_condition_analysis = make_sampling_point(
+                    parent_fw=parent_fw,
+                    temperature=T,
+                    pressure=P,
+                    ncycles=ncycles,
+                    nparallel=nparallel,
+                    wfname=wfname,
+                    template=template,
+                    workdir=workdir,
+                    g_req=g_req,
+                    use_grid=use_grid,
+                    iteration=0,
+                    max_iterations=max_iterations,
+                    fused=fused,
+                )
+                set_priority(this_condition + [this_condition_analysis],
+                             ranks[P])
+                simulation_steps.extend(this_condition)
+                analysis_steps.append(this_condition_analysis)
+            if archive:
+                archive_steps.append(make_archive_stage(
+                    parent_fw=analysis_steps[-1],
+                    temperature=T,
+                    pressure=P,
+                    wfname=wfname,
+                    workdir=workdir,
+                ))
             if adaptive:
                 pass
 
@@ -77,16 +293,88 @@ def make_workflow(spec):
         name='Isotherm create',
     )
 
-    wf = fw.Workflow(
-        init_parent + simulation_steps + analysis_steps + [iso_create],
-        name=wfname,
-        metadata={'GCMCWorkflow': True},  # tag as GCMCWorkflow workflow
+    return simulation_steps + analysis_steps + [iso_create] + archive_steps
+
+
+def make_expansion_stage(parent_fw, wfname, **settings):
+    """Make a Firework which creates the rest of the Workflow when run
+
+    Rather than every sampling Firework being made at submission, this
+    adds a Firework for each condition once the template has been
+    prepared, see make_point_expansion_stage
+
+    Parameters
+    ----------
+    parent_fw : list of fw.Firework
+      Fireworks which prepare the template
+    wfname : str
+      unique name for this workflow
+    settings
+      passed to make_isotherm_stages when run
+
+    Returns
+    -------
+    expand : fw.Firework
+    """
+    return fw.Firework(
+        [firetasks.ExpandIsotherm(wfname=wfname, **settings)],
+        parents=parent_fw,
+        spec={'_category': wfname},
+        name='Expand sampling',
     )
 
-    return wf
+
+def make_point_expansion_stage(parent_fw, temperature, pressure, ncycles,
+                               nparallel, wfname, workdir, g_req,
+                               max_iterations, priority, expand_priority,
+                               use_grid=False, fused=False):
+    """Make a Firework which creates the sampling of a condition when run
+
+    The sampling runs and Analyse are a detour of this Firework, so they
+    come before its children (IsothermCreate and any archive).  Each
+    further iteration is added by Analyse in turn.
+
+    Parameters
+    ----------
+    parent_fw : list of fw.Firework or None
+      Fireworks which prepare the template
+    temperature, pressure, ncycles, nparallel, wfname, workdir, g_req,
+    max_iterations, use_grid, fused
+      as per make_sampling_point
+    priority : int
+      priority of the sampling Fireworks
+    expand_priority : int
+      priority of this Firework, lower than any sampling so conditions
+      are only expanded once workers run out of other work
+
+    Returns
+    -------
+    expand : fw.Firework
+    """
+    return fw.Firework(
+        [firetasks.ExpandSamplingPoint(
+            temperature=temperature,
+            pressure=pressure,
+            ncycles=ncycles,
+            nparallel=nparallel,
+            wfname=wfname,
+            workdir=workdir,
+            g_req=g_req,
+            max_iterations=max_iterations,
+            use_grid=use_grid,
+            fused=fused,
+            priority=priority,
+        )],
+        parents=parent_fw,
+        spec={
+            '_category': wfname,
+            '_priority': expand_priority,
+        },
+        name='Expand T={} P={}'.format(temperature, pressure),
+    )
 
 
-def make_init_stage(workdir, wfname, template):
+def make_init_stage(workdir, wfname, template, template_store=None):
     """Make initialisation stage of Workflow
 
     Parameters
@@ -97,6 +385,10 @@ def make_init_stage(workdir, wfname, template):
       unique name for this Workflow
     template : dict or str
       template to use for simulation
+    template_store : str, optional
+      location of a template store (path or MongoDB uri), if given the
+      template is put into the store and only its hash is kept in the
+      Workflow
 
     Returns
     -------
@@ -109,6 +401,15 @@ def make_init_stage(workdir, wfname, template):
             workdir=workdir,
         )
         template = None
+    elif template_store is not None:
+        if not isinstance(template, dict):
+            template = utils.slurp_tree(template)
+        key = get_store(template_store).put(template)
+
+        first_task = firetasks.InitTemplate(template_hash=key,
+                                            template_store=template_store,
+                                            workdir=workdir)
+        template = None
     else:
         if not isinstance(template, dict):
             # Passed path to template
@@ -222,11 +523,62 @@ def make_runstage(parent_fw, temperature, pressure, ncycles, parallel_id,
     return copy, run, postprocess
 
 
+def make_fused_runstage(parent_fw, temperature, pressure, ncycles,
+                        parallel_id, wfname, template, workdir,
+                        previous_simdir=None, previous_result=None,
+                        use_grid=False):
+    """Make a single Run stage as one Firework
+
+    Equivalent to make_runstage, but Copy, Run and PostProcess are
+    sequential tasks within one Firework.  As with the separate
+    Fireworks, PostProcess still runs if the simulation fails, and will
+    restart it if it didn't finish.
+
+    Parameters are the same as make_runstage
+
+    Returns
+    -------
+    sim : fw.Firework
+    """
+    if ((previous_simdir is None and not previous_result is None) or
+        (not previous_simdir is None and previous_result is None)):
+        raise ValueError("Must supply *both* previous simdir and result")
+
+    return fw.Firework(
+        [
+            firetasks.CopyTemplate(
+                temperature=temperature,
+                pressure=pressure,
+                ncycles=ncycles,
+                parallel_id=parallel_id,
+                workdir=workdir,
+                previous_simdir=previous_simdir,
+                use_grid=use_grid,
+            ),
+            firetasks.RunSimulation(allow_fail=True),
+            firetasks.PostProcess(
+                temperature=temperature,
+                pressure=pressure,
+                parallel_id=parallel_id,
+                workdir=workdir,
+                previous_result=previous_result,
+                use_grid=use_grid,
+            ),
+        ],
+        parents=parent_fw,
+        spec={
+            'template': template,
+            '_category': wfname,
+        },
+        name=utils.gen_name(temperature, pressure, parallel_id),
+    )
+
+
 def make_sampling_point(parent_fw, temperature, pressure, ncycles, nparallel,
                         wfname, template, workdir, g_req,
                         iteration, max_iterations,
                         previous_results=None, previous_simdirs=None,
-                        use_grid=False):
+                        use_grid=False, fused=False):
     """Make many Simfireworks for a given conditions
 
     Parameters
@@ -258,6 +610,8 @@ def make_sampling_point(parent_fw, temperature, pressure, ncycles, nparallel,
     max_iterations : int
       maximum number of iterations to allow, defaults to
       DEFAULT_MAX_ITERATIONS
+    fused : bool, optional
+      use a single Firework for each run, see make_fused_runstage
 
     Returns
     -------
@@ -273,7 +627,7 @@ def make_sampling_point(parent_fw, temperature, pressure, ncycles, nparallel,
     postprocesses = []
 
     for i in range(nparallel):
-        copy, run, postprocess = make_runstage(
+        settings = dict(
             parent_fw=parent_fw,
             temperature=temperature,
             pressure=pressure,
@@ -286,9 +640,13 @@ def make_sampling_point(parent_fw, temperature, pressure, ncycles, nparallel,
             previous_result=previous_results.get(i, None),
             use_grid=use_grid,
         )
-        runs.append(copy)
-        runs.append(run)
-        postprocesses.append(postprocess)
+        if fused:
+            postprocesses.append(make_fused_runstage(**settings))
+        else:
+            copy, run, postprocess = make_runstage(**settings)
+            runs.append(copy)
+            runs.append(run)
+            postprocesses.append(postprocess)
 
     analysis = fw.Firework(
         [firetasks.Analyse(
@@ -306,3 +664,34 @@ def make_sampling_point(parent_fw, temperature, pressure, ncycles, nparallel,
     )
 
     return runs + postprocesses, analysis
+
+
+def make_archive_stage(parent_fw, temperature, pressure, wfname, workdir):
+    """Make a Firework which archives a finished sampling point
+
+    Parameters
+    ----------
+    parent_fw : fw.Firework
+      the Analyse Firework for this condition, any resampling is detoured
+      before this Firework, so it runs once the point is accepted
+    temperature, pressure : float
+      condition to archive
+    wfname : str
+      unique name for this workflow
+    workdir : str
+      where the simulations were stored
+
+    Returns
+    -------
+    archive : fw.Firework
+    """
+    return fw.Firework(
+        [firetasks.ArchiveSimulations(
+            temperature=temperature,
+            pressure=pressure,
+            workdir=workdir,
+        )],
+        spec={'_category': wfname},
+        parents=[parent_fw],
+        name='Archive T={} P={}'.format(temperature, pressure),
+    )
@@ -8,6 +8,8 @@ import glob
 import os
 import subprocess
 
+from .instrument import instrumented, phase
+
 
 @xs
 class PrepareStructure(fw.FiretaskBase):
@@ -15,6 +17,7 @@ class PrepareStructure(fw.FiretaskBase):
     # prequisite for any future ZeoPP calculation
     required_params = ['structure', 'name', 'workdir']
 
+    @instrumented
     def run_task(self, fw_spec):
         newdir = os.path.join(self['workdir'], self['name'])
         os.mkdir(newdir)
@@ -45,6 +48,7 @@ class ZeoPP(fw.FiretaskBase):
     required_params = ['calculations']
     optional_params = ['radius']
 
+    @instrumented
     def run_task(self, fw_spec):
         old_dir = os.getcwd()
         os.chdir(fw_spec['structure_dir'])
@@ -54,11 +58,12 @@ class ZeoPP(fw.FiretaskBase):
 
         try:
             for calc in self['calculations']:
-                p = subprocess.run(
-                    ZEO_PP_COMMANDS[calc].format(filename=fn, radius=rad),
-                    check=True, shell=True,
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                )
+                with phase(calc):
+                    p = subprocess.run(
+                        ZEO_PP_COMMANDS[calc].format(filename=fn, radius=rad),
+                        check=True, shell=True,
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    )
         except subprocess.CalledProcessError as e:
             # CPE has following attributes:
             # - returncode